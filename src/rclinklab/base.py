@@ -1,13 +1,19 @@
+import hashlib
 import time
 from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Sequence
 
 import attrs
 import numpy as np
 import numpy.typing as npt
-import pandas as pd
 import structlog
 from bitarray import bitarray
-from scipy.interpolate import interp1d
+
+from rclinklab.exceptions import LinkLabException  # noqa: F401
+
+# pandas and scipy are slow to import and only needed by some sources, so they are imported where they are used
+if TYPE_CHECKING:
+    import pandas as pd
 
 # TODO choose better names
 FD = npt.NDArray[np.float_]  # floats with range -1.0 - 1.0
@@ -16,6 +22,19 @@ ID = npt.NDArray[np.int_]  # ints with range 0 - 2^bits-1
 log = structlog.get_logger()
 
 
+def digest(*parts: bytes | str) -> str:
+    """A stable hash of the parts, used as cache keys.
+
+    >>> digest("a", b"b")[:16]
+    '8fb20ef63ced4145'
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode() if isinstance(part, str) else part)
+        h.update(b"\0")
+    return h.hexdigest()
+
+
 class TimeService(ABC):
     """Defines a start time and a way to wait for a timestamp.
 
@@ -29,20 +48,38 @@ class TimeService(ABC):
     def wait_until(self, ts: int):
         pass
 
+    async def wait_until_async(self, ts: int):
+        """Wait without blocking the event loop, so that other links run meanwhile."""
+        import asyncio
+
+        self.wait_until(ts)
+        await asyncio.sleep(0)
+
 
 class Realtime(TimeService):
     def __init__(self):
+        # Wall clock time, which input events are timestamped with, but waiting uses the monotonic clock
         self.start_ts = self._time_us()
+        self._start_ns = time.monotonic_ns()
 
     @staticmethod
     def _time_us() -> int:
         return round(time.time_ns() / 1000)
 
-    def wait_until(self, ts: int):
+    def _delay(self, ts: int) -> float:
+        """Seconds until ts, negative if it has passed"""
         # Make sure we are 50 ms after realtime to allow for hid events to arrive
-        diff = ts - (self._time_us() - self.start_ts - 50_000)
-        if diff > 0:
-            time.sleep(diff / 1_000_000)
+        elapsed = (time.monotonic_ns() - self._start_ns) / 1000
+        return (ts - (elapsed - 50_000)) / 1_000_000
+
+    def wait_until(self, ts: int):
+        if (delay := self._delay(ts)) > 0:
+            time.sleep(delay)
+
+    async def wait_until_async(self, ts: int):
+        import asyncio
+
+        await asyncio.sleep(max(self._delay(ts), 0))
 
 
 class SimulatedTime(TimeService):
@@ -52,7 +89,8 @@ class SimulatedTime(TimeService):
         pass
 
 
-@attrs.define
+# Default pickling like Codec below
+@attrs.define(getstate_setstate=False)
 class TxSource(ABC):
     """Calling this with a timestamp should produce axis data."""
 
@@ -62,10 +100,31 @@ class TxSource(ABC):
     def __call__(self, time: int) -> FD:
         pass
 
+    def sample(self, times: ID) -> FD:
+        """Get the data for several timestamps at once, one row per timestamp."""
+        return np.array([self(t) for t in times.tolist()], dtype=np.float_).reshape(len(times), self.channels)
+
+    def ages(self, times: ID) -> ID:
+        """How old the newest input that the data at each timestamp is based on is, in µs.
+
+        Sources that are defined at every timestamp are always fresh.
+        """
+        return np.zeros(len(times), dtype=np.int_)
+
+    def age(self, time: int) -> int:
+        return int(self.ages(np.array([time]))[0])
+
     @abstractmethod
     def start(self, time_service: TimeService) -> "TxSource":
         pass
 
+    async def read_async(self):
+        """Read input in the background while the asyncio engine runs, until cancelled.
+
+        Sources that don't wait for input have nothing to do.
+        """
+        pass
+
     @abstractmethod
     def __enter__(self):
         pass
@@ -74,22 +133,32 @@ class TxSource(ABC):
     def __exit__(self, exc_type, exc_val, exc_tb):
         pass
 
+    def fingerprint(self) -> str | None:
+        """A stable digest of everything that determines the output, None if the output can't be reproduced."""
+        return digest(type(self).__qualname__, repr(attrs.asdict(self)))
+
     def multi_index(self):
+        import pandas as pd
+
         return pd.MultiIndex.from_tuples(
             [("tx_ts", "tx_ts"), *[("tx_fd", f"tx_fd[{i}]") for i in range(self.channels)]]
         )
 
     def series(self, ts):
+        import pandas as pd
+
         return pd.Series([ts] + list(self(ts)))
 
-    def data_frame(self, ts: pd.Series) -> pd.DataFrame:
+    def data_frame(self, ts: "pd.Series") -> "pd.DataFrame":
         df = ts.apply(self.series)
         df.columns = self.multi_index()
         return df
 
 
 class InterpolatedTxSource(TxSource):
-    def __init__(self, data: pd.DataFrame):
+    def __init__(self, data: "pd.DataFrame"):
+        from scipy.interpolate import interp1d
+
         super().__init__(channels=len(data.columns) - 1)
         data.columns = self.multi_index()
         self._data = data
@@ -104,19 +173,34 @@ class InterpolatedTxSource(TxSource):
     def __exit__(self, exc_type, exc_val, exc_tb):
         pass
 
+    def fingerprint(self) -> str | None:
+        return digest(type(self).__qualname__, str(self._data.shape), self._data.to_numpy().tobytes())
+
     def __call__(self, time: int) -> FD:
         if time > self.interpolator.x[-1]:
             return np.array([0.0 for _ in range(self.channels)])
         return self.interpolator(time)
 
-    def raw_data(self, duration: int) -> pd.DataFrame:
+    def ages(self, times: ID) -> ID:
+        """The time since the latest logged sample"""
+        x = self.interpolator.x
+        return (times - x[np.maximum(np.searchsorted(x, times, side="right") - 1, 0)]).astype(np.int_)
+
+    def sample(self, times: ID) -> FD:
+        after_end = times > self.interpolator.x[-1]
+        result = self.interpolator(np.where(after_end, self.interpolator.x[-1], times))
+        result[after_end] = 0.0
+        return result
+
+    def raw_data(self, duration: int) -> "pd.DataFrame":
         """Create a dataframe with the raw data up to a specific duration"""
         # TODO add zeros or loop if duration is larger than data
         d = self._data
         return d[d["tx_ts", "tx_ts"] <= duration]
 
 
-@attrs.define
+# Use default pickling, the attrs version would skip the state that subclasses keep in __dict__
+@attrs.define(getstate_setstate=False)
 class Codec(ABC):
 
     channels: int
@@ -130,8 +214,24 @@ class Codec(ABC):
     def receive(self, data: bitarray) -> np.ndarray:
         pass
 
+    def quantize(self, data: FD) -> ID:
+        """The ints the codec transmits for the axis data, codecs with several bit depths override this"""
+        from rclinklab.converters import f2i_s
+
+        return f2i_s(data, self.bits)
+
+    def dequantize(self, data: ID) -> FD:
+        from rclinklab.converters import i2f_s
+
+        return i2f_s(data, self.bits)
+
+    def transmit_batch(self, data: ID) -> list[bitarray]:
+        """Transmit several packets at once, one row of data per packet.
 
-class LinkLabException(Exception):
-    """Just to gather exceptions explicitly thrown in this package"""
+        Must give the same result as calling transmit for each row, codecs can override this with a faster version.
+        """
+        return [self.transmit(row) for row in data]
 
-    pass
+    def receive_batch(self, data: Sequence[bitarray]) -> ID:
+        """Receive several packets at once, returns one row per packet."""
+        return np.array([self.receive(d) for d in data], dtype=np.int_).reshape(len(data), self.channels)
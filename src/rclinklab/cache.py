@@ -0,0 +1,140 @@
+"""Persistent cache of simulation runs, keyed by the source, codecs, bitrate and duration.
+
+A run is only cached if it is deterministic, which means simulated time, a fixed duration, a source with a
+fingerprint and no measured decode times. The codec state is part of the key, since codecs can be reused between
+runs, and the state after the run is restored on a hit. Listeners get the cached packets replayed in the original
+order.
+"""
+
+import copy
+import os
+import pickle
+import zlib
+from pathlib import Path
+
+import attrs
+
+from rclinklab.base import Codec, SimulatedTime, digest
+from rclinklab.columns import Columns, from_columns, select, to_columns, to_data_frame
+from rclinklab.schedule import BackToBack
+from rclinklab.simulate import LinkPacket, PacketListener, Setup, Simulator
+from rclinklab.stats import Stats, calculate
+
+# Change this when the simulation results change, to not use stale results
+CACHE_VERSION = 3
+
+DEFAULT_MAX_SIZE = 1 << 30
+
+
+def default_path() -> Path:
+    return Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "rclinklab" / "runs"
+
+
+@attrs.define
+class RunResult:
+    columns: Columns  # All packets in the order they were received, with a codec_id column
+    stats: dict[int, Stats]
+    codecs: list[Codec]  # The codecs as they were after the run
+
+    def packets(self) -> list[tuple[int, LinkPacket]]:
+        return list(zip(self.columns["codec_id"].tolist(), from_columns(self.columns)))
+
+    def codec_columns(self, codec_id: int) -> Columns:
+        return select(self.columns, codec_id)
+
+
+class Recorder(PacketListener):
+    def __init__(self):
+        self.packets: list[LinkPacket] = []
+        self.codec_ids: list[int] = []
+
+    def add(self, codec_id: int, packet: LinkPacket):
+        self.codec_ids.append(codec_id)
+        self.packets.append(packet)
+
+    def result(self, codecs: list[Codec]) -> RunResult:
+        columns = to_columns(self.packets, self.codec_ids)
+        stats = {i: calculate(to_data_frame(select(columns, i))) for i in sorted(set(self.codec_ids))}
+        return RunResult(columns, stats, copy.deepcopy(codecs))
+
+
+class RunCache:
+    def __init__(self, path: Path | None = None, max_size: int = DEFAULT_MAX_SIZE):
+        """
+        Args:
+            path: Directory for the cache files, defaults to the user cache directory.
+            max_size: Least recently used runs are removed when the files use more bytes than this.
+        """
+        self.path = path or default_path()
+        self.max_size = max_size
+
+    @staticmethod
+    def key(setup: Setup) -> str | None:
+        if not isinstance(setup.time_service, SimulatedTime) or setup.duration is None or setup.measure_decode:
+            return None
+        source = setup.source.fingerprint()
+        if source is None:
+            return None
+        codecs = [digest(pickle.dumps(c)) for c in setup.codecs]
+        parts = [str(CACHE_VERSION), source, *codecs, str(setup.bitrate), str(setup.duration)]
+        if setup.schedule != BackToBack():
+            parts.append(repr(setup.schedule))
+        if setup.convergence is not None:
+            parts.append(repr(setup.convergence))
+        if setup.smoothing is not None:
+            parts.append(repr(setup.smoothing))
+        if setup.impairment is not None:
+            parts += [digest(pickle.dumps(setup.impairment)), str(setup.seed)]
+        return digest(*parts)
+
+    def _file(self, key: str) -> Path:
+        return self.path / f"{key}.run"
+
+    def load(self, key: str) -> RunResult | None:
+        file = self._file(key)
+        try:
+            result = pickle.loads(zlib.decompress(file.read_bytes()))
+        except (OSError, zlib.error, pickle.UnpicklingError, EOFError):
+            return None
+        os.utime(file)  # Mark as recently used
+        return result
+
+    def store(self, key: str, result: RunResult):
+        self.path.mkdir(parents=True, exist_ok=True)
+        temporary = self._file(key).with_suffix(".tmp")
+        temporary.write_bytes(zlib.compress(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), 1))
+        os.replace(temporary, self._file(key))
+        self.evict()
+
+    def evict(self):
+        files = sorted(self.path.glob("*.run"), key=lambda f: f.stat().st_mtime)
+        size = sum(f.stat().st_size for f in files)
+        while files and size > self.max_size:
+            file = files.pop(0)
+            size -= file.stat().st_size
+            file.unlink()
+
+    def run(self, setup: Setup) -> RunResult:
+        """Run the setup, or replay a cached result of the same run to the listeners."""
+        key = self.key(setup)
+        result = self.load(key) if key is not None else None
+        if result is None:
+            listeners = setup.listeners
+            recorder = Recorder()
+            setup.listeners = [*(listeners or []), recorder]
+            try:
+                Simulator.simulate(setup)
+            finally:
+                setup.listeners = listeners
+            result = recorder.result(setup.codecs)
+            if key is not None:
+                self.store(key, result)
+        else:
+            for codec, cached in zip(setup.codecs, copy.deepcopy(result.codecs)):
+                for name, value in vars(cached).items():
+                    setattr(codec, name, value)
+            for codec_id, packet in result.packets():
+                if setup.convergence is not None:
+                    setup.convergence.add(codec_id, packet)
+                Simulator._notify_listeners(codec_id, packet, setup)
+        return result
@@ -0,0 +1,79 @@
+"""Snapshots of a running simulation, to resume a long run after it was interrupted.
+
+A snapshot holds the state of the Link: the bit position, the packets in the air, the codecs, the started source,
+the listeners, the impairment models with their random generator, the smoothers and the convergence. It is written
+every so often in simulated time as a compressed pickle, replacing the previous one, and removed when the run
+completes. Running the same setup again with the checkpoint continues from the snapshot, and the listeners end up
+with the same state as after an uninterrupted run.
+
+Only deterministic runs can be resumed, which are the ones the RunCache can cache. The snapshot stores the cache key
+of the setup, so a snapshot of another run is never resumed. Listeners that write to files need to pickle their
+state, like SpillingCollector does.
+"""
+
+import os
+import pickle
+import zlib
+from pathlib import Path
+
+import attrs
+
+from rclinklab import base
+from rclinklab.base import LinkLabException
+from rclinklab.simulate import Link, bits_to_ts
+
+# Change this when the content of snapshots changes
+SNAPSHOT_VERSION = 1
+
+
+@attrs.define
+class Checkpoint:
+    path: Path  # the snapshot file
+    every: int = 60_000_000  # µs of simulated time between snapshots
+    _key: str | None = attrs.field(init=False, default=None, repr=False)
+    _next: int = attrs.field(init=False, default=0, repr=False)
+
+    def resume(self, link: Link):
+        """Restore the link from the snapshot, if there is one"""
+        from rclinklab.cache import RunCache
+
+        self._key = RunCache.key(link.setup)
+        if self._key is None:
+            raise LinkLabException("Only deterministic runs in simulated time with a fixed duration can be resumed")
+        self._next = self.every
+        try:
+            data = self.path.read_bytes()
+        except FileNotFoundError:
+            return
+        try:
+            version, key, state = pickle.loads(zlib.decompress(data))
+        except (zlib.error, pickle.UnpicklingError, EOFError, ValueError) as e:
+            raise LinkLabException(f"Can't read the snapshot {self.path}") from e
+        if (version, key) != (SNAPSHOT_VERSION, self._key):
+            raise LinkLabException(f"The snapshot {self.path} is of another run, remove it to start over")
+        link.restore(state)
+        now = bits_to_ts(link.position, link.setup.bitrate)
+        self._next = (now // self.every + 1) * self.every
+        base.log.info(f"Resumed from {self.path} at {now} µs")
+
+    def step(self, link: Link):
+        """Write a snapshot if it is time for one"""
+        now = bits_to_ts(link.position, link.setup.bitrate)
+        if link.done or now < self._next:
+            return
+        self._next = (now // self.every + 1) * self.every
+        self.write(link)
+
+    def write(self, link: Link):
+        try:
+            data = pickle.dumps((SNAPSHOT_VERSION, self._key, link.snapshot()), protocol=pickle.HIGHEST_PROTOCOL)
+        except (TypeError, AttributeError, pickle.PicklingError) as e:
+            raise LinkLabException(f"The state of the run can't be saved: {e}") from e
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_name(f".{self.path.name}.tmp")
+        temporary.write_bytes(zlib.compress(data, 1))
+        os.replace(temporary, self.path)
+
+    def finish(self):
+        """The run completed, the snapshot is not needed anymore"""
+        self.path.unlink(missing_ok=True)
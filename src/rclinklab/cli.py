@@ -1,229 +1,305 @@
-from enum import Enum
-from typing import Protocol
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
 
-import psutil
 import typer
-from humanize import naturalsize
-from rich import box
-from rich.bar import Bar
-from rich.console import Group
-from rich.live import Live
-from rich.panel import Panel
-from rich.table import Table
-from rich.text import Text
-
-from rclinklab.base import FD, Codec, Realtime, TxSource
-from rclinklab.codecs.delta import DeltaCodec
-from rclinklab.codecs.raw import RawCodec
-from rclinklab.simulate import LinkPacket, PacketListener, RollingStatsCollector, Setup
-from rclinklab.sources.functions import SineSource
-from rclinklab.sources.joystick import JoystickTxSource
-from rclinklab.stats import Stats
+
+from rclinklab import registry
+from rclinklab.exceptions import LinkLabException
+
+# Everything else is imported in the commands, to keep the startup fast
+if TYPE_CHECKING:
+    from rclinklab.base import Codec, TxSource
+    from rclinklab.schedule import Schedule
+    from rclinklab.smoothing import Smoothing
 
 RATE_CHANNELS = 20
 RATE_CODECS = 5
 RATE_CPU = 2
 
+CHANNELS = 4
+CHANNELS_HELP = "Number of channels of sources that take it, like sine. Blackbox logs have as many as their columns."
+
+DEFAULT_CODECS = ["raw:bits=8", "raw:bits=9", "raw:bits=10", "delta:bits=10,delta_bits=5", "rice:bits=10"]
+
+SOURCE_HELP = (
+    f"One of {', '.join(registry.sources.builtins)} or a plugin, optionally with arguments like sine:frequency=2 "
+    "or blackbox:path=log.csv, or blackbox:path=log.bbl,index=0 for a binary log. Other blackbox fields can be "
+    "mapped to channels like blackbox:path=log.csv,columns=rcCommand[0-3] debug[0-3]."
+)
+CODEC_HELP = (
+    f"One of {', '.join(registry.codecs.builtins)} or a plugin with arguments like delta:bits=10,delta_bits=5, "
+    "can be given several times."
+)
+
+TRANSFORM_HELP = (
+    f"Wrap the source in one of {', '.join(registry.transforms.builtins)} or a plugin, like lowpass:cutoff=10 or "
+    "noise:std=0.01. Can be given several times, the first one wraps the source."
+)
+
+SMOOTHING_HELP = (
+    f"Smooth the received values like a flight controller, with one of {', '.join(registry.smoothing.builtins)} "
+    "or a plugin, like pt3:cutoff=30 or feed_forward:cutoff=30,lead=5000."
+)
+
 app = typer.Typer()
 
 
-class Source(str, Enum):
-    joystick = "joystick"
-    sine = "sine"
+def _create(entries: registry.Registry, spec: str, param_hint: str, **defaults):
+    try:
+        return entries.create(spec, **defaults)
+    except LinkLabException as e:
+        raise typer.BadParameter(str(e), param_hint=param_hint) from e
 
 
-def _resolve_source(source):
-    match source:
-        case Source.joystick:
-            return JoystickTxSource(channels=4)
-        case Source.sine:
-            return SineSource(frequency=0.5, channels=4)
+def _source(spec: str, transforms: Optional[list[str]] = None, channels: int = CHANNELS) -> "TxSource":
+    source = _create(registry.sources, spec, "source", channels=channels)
+    for transform in transforms or []:
+        source = _create(registry.transforms, transform, "transform", source=source)
+    return source
 
 
 @app.command()
-def cli(source: Source):
-    go(_resolve_source(source))
+def cli(
+    source: str = typer.Argument(..., help=SOURCE_HELP),
+    channels: int = typer.Option(CHANNELS, help=CHANNELS_HELP),
+    codec: list[str] = typer.Option(DEFAULT_CODECS, help=CODEC_HELP),
+    feed: Optional[str] = typer.Option(None, help="Also publish the packets in shared memory with this name."),
+    transform: Optional[list[str]] = typer.Option(None, help=TRANSFORM_HELP, show_default=False),
+    smoothing: Optional[str] = typer.Option(None, help=SMOOTHING_HELP, show_default=False),
+    schedule: str = typer.Option(
+        "back_to_back",
+        help=(
+            "When packets are sent, like fixed_rate:rate=500,max_payload=32 or "
+            "rate_with_deadline:rate=500,deadline=200."
+        ),
+    ),
+    compact: Optional[bool] = typer.Option(
+        None,
+        "--compact/--no-compact",
+        help="Show the channels in several columns with short bars, by default with more than 8 channels.",
+        show_default=False,
+    ),
+):
+    """Run the codecs on the source in realtime, with a live view of the stats."""
+    tx_source = _source(source, transform, channels)
+    codecs = [_create(registry.codecs, c, "codec", channels=tx_source.channels) for c in codec]
+    go(
+        tx_source,
+        codecs,
+        feed,
+        _create(registry.schedules, schedule, "schedule"),
+        _create(registry.smoothing, smoothing, "smoothing") if smoothing else None,
+        compact,
+    )
 
 
-def go(source: TxSource):
+@app.command()
+def optimize(
+    source: str = typer.Argument("sine", help=SOURCE_HELP),
+    channels: int = typer.Option(CHANNELS, help=CHANNELS_HELP),
+    bitrate: Optional[list[int]] = typer.Option(
+        None,
+        help="Bitrates to search, can be given several times. Defaults to the simulator bitrate.",
+        show_default=False,
+    ),
+    duration: int = typer.Option(3_000_000, help="Duration of the longest simulations in µs."),
+    transform: Optional[list[str]] = typer.Option(None, help=TRANSFORM_HELP, show_default=False),
+    smoothing: Optional[str] = typer.Option(None, help=SMOOTHING_HELP, show_default=False),
+    cache: bool = typer.Option(True, help="Reuse simulation results from earlier runs."),
+    rtol: Optional[float] = typer.Option(
+        None, help="Stop simulations when the 95 % confidence intervals of the means are within this fraction."
+    ),
+):
+    """Search codec parameters for the Pareto front of mean latency and mean error.
+
+    With smoothing these are the effective latency and error of the smoothed values against the source.
+    """
+    from rich import box
+    from rich.console import Console
+    from rich.table import Table
+
+    from rclinklab.cache import RunCache
+    from rclinklab.optimize import Optimizer, default_candidates
+    from rclinklab.simulate import DEFAULT_BITRATE
+
+    tx_source = _source(source, transform, channels)
+    if tx_source.fingerprint() is None:
+        raise typer.BadParameter("The source must be able to run in simulated time", param_hint="source")
+    optimizer = Optimizer(
+        tx_source,
+        max_duration=duration,
+        cache=RunCache() if cache else None,
+        rtol=rtol,
+        smoothing=_create(registry.smoothing, smoothing, "smoothing") if smoothing else None,
+    )
+    front = optimizer.search(default_candidates(bitrate or [DEFAULT_BITRATE]))
+    table = Table(box=box.SIMPLE_HEAD)
+    table.add_column(header="Codec", width=40)
+    table.add_column(header="Mean latency")
+    table.add_column(header="Mean error")
+    table.add_column(header="Duration")
+    for e in front:
+        table.add_row(
+            str(e.candidate),
+            f"{e.latency:.2f}",
+            f"{e.error:.6f}",
+            f"{(e.effective_duration or e.duration) / 1e6:.2f} s",
+        )
+    Console().print(table)
 
-    codecs = [
-        RawCodec(channels=source.channels, bits=8),
-        RawCodec(channels=source.channels, bits=9),
-        RawCodec(channels=source.channels, bits=10),
-        DeltaCodec(channels=source.channels, bits=10, delta_bits=5),
-    ]
-    setup = Setup(source=source, time_service=Realtime(), codecs=codecs)
-    view = View(setup)
+
+@app.command()
+def corpus(
+    directory: Path = typer.Argument(
+        ..., help="Directory with blackbox logs, csv exports or binary, also in subdirectories."
+    ),
+    codec: list[str] = typer.Option(DEFAULT_CODECS, help=CODEC_HELP),
+    bitrate: Optional[int] = typer.Option(None, help="Defaults to the simulator bitrate.", show_default=False),
+    duration: Optional[int] = typer.Option(
+        None, help="Simulate at most this many µs of each log.", show_default=False
+    ),
+    workers: Optional[int] = typer.Option(
+        None, help="Worker processes, defaults to the number of CPUs.", show_default=False
+    ),
+    cache: bool = typer.Option(True, help="Reuse parsed logs and simulation results from earlier runs."),
+):
+    """Run the codecs on every log of a corpus, with the stats per log and pooled over all logs.
+
+    Latencies are in µs, the pooled means are weighted by the flight time of the logs.
+    """
+    from rich import box
+    from rich.console import Console
+    from rich.table import Table
+
+    from rclinklab.cache import RunCache
+    from rclinklab.corpus import find_logs, pooled, run
+    from rclinklab.simulate import DEFAULT_BITRATE
+
+    logs = find_logs(directory)
+    if not logs:
+        raise typer.BadParameter("No .csv, .bbl or .bfl logs found", param_hint="directory")
+    codecs = [_create(registry.codecs, c, "codec", channels=CHANNELS) for c in codec]
+    table = Table(box=box.SIMPLE_HEAD)
+    for header in ["Log", "Codec"]:
+        table.add_column(header=header, no_wrap=True)
+    for header in ["Flight time", "Latency", "Max", "Error", "Max"]:
+        table.add_column(header=header, justify="right")
+
+    def add_rows(name: str, flight_time: int, stats):
+        for spec, s in zip(codec, stats):
+            table.add_row(
+                name,
+                spec,
+                f"{flight_time / 1e6:.1f} s",
+                f"{s.latency:.0f}",
+                f"{s.max_latency:.0f}",
+                f"{s.error:.5f}",
+                f"{s.max_error:.5f}",
+            )
+            name = ""
+
+    console = Console()
+    results = []
+    with console.status(f"Evaluating {len(logs)} logs"):
+        for result in run(logs, codecs, bitrate or DEFAULT_BITRATE, duration, RunCache() if cache else None, workers):
+            results.append(result)
+            if result.failed:
+                table.add_row(result.log.name(directory), "[red]failed")
+            else:
+                add_rows(result.log.name(directory), result.flight_time, result.codecs)
+    if not all(r.failed for r in results):
+        table.add_section()
+        add_rows("All", sum(r.flight_time for r in results if not r.failed), pooled(results))
+    console.print(table)
+    for result in results:
+        if result.failed:
+            console.print(f"[red]{result.log.name(directory)}[/]: {result.error}", highlight=False)
+    if all(r.failed for r in results):
+        raise typer.Exit(1)
+
+
+@app.command()
+def loopback(
+    source: str = typer.Argument("sine", help=SOURCE_HELP),
+    channels: int = typer.Option(CHANNELS, help=CHANNELS_HELP),
+    codec: list[str] = typer.Option(DEFAULT_CODECS, help=CODEC_HELP),
+    transform: Optional[list[str]] = typer.Option(None, help=TRANSFORM_HELP, show_default=False),
+    transport: str = typer.Option("udp", help="udp, unix or pty."),
+    duration: int = typer.Option(1_000_000, help="Duration of the simulation in µs."),
+    paced: bool = typer.Option(True, help="Send at the modeled transmit times, otherwise as fast as possible."),
+):
+    """Send the packets over a local transport to a receiver process, and compare the latency with the model.
+
+    Latencies and the encode and decode times are in µs, the measured ones are means and max from the start of
+    encoding to decoded in the receiver.
+    """
+    from rich import box
+    from rich.console import Console
+    from rich.table import Table
+
+    from rclinklab.transport import measure
+
+    tx_source = _source(source, transform, channels)
+    table = Table(box=box.SIMPLE_HEAD)
+    table.add_column(header="Codec")
+    for header in ["Modeled", "Measured", "Max", "Encode", "Decode", "Packets/s", "Lost", "Mismatches"]:
+        table.add_column(header=header, justify="right")
+    for spec in codec:
+        try:
+            result = measure(
+                tx_source,
+                _create(registry.codecs, spec, "codec", channels=tx_source.channels),
+                transport,
+                duration=duration,
+                paced=paced,
+            )
+        except LinkLabException as e:
+            raise typer.BadParameter(str(e), param_hint="transport") from e
+        table.add_row(
+            result.codec,
+            f"{result.modeled_latency:.0f}",
+            f"{result.measured_latency:.0f}",
+            f"{result.max_measured_latency:.0f}",
+            f"{result.encode_time:.1f}",
+            f"{result.decode_time:.1f}",
+            f"{result.throughput:.0f}",
+            str(result.lost),
+            str(result.mismatches),
+        )
+    Console().print(table)
+
+
+def go(
+    source: "TxSource",
+    codecs: "list[Codec]",
+    feed: str | None = None,
+    schedule: "Schedule | None" = None,
+    smoothing: "Smoothing | None" = None,
+    compact: bool | None = None,
+):
+    from contextlib import ExitStack
+
+    from rich.live import Live
+
+    from rclinklab.base import Realtime
+    from rclinklab.feed import FeedWriter
+    from rclinklab.simulate import Setup
+    from rclinklab.view import View, ViewPacketListener
+
+    setup = Setup(source=source, time_service=Realtime(), codecs=codecs, smoothing=smoothing, measure_decode=True)
+    if schedule is not None:
+        setup.schedule = schedule
+    view = View(setup, compact)
     live = Live(view.renderable, auto_refresh=False)
 
     listener = ViewPacketListener(view, live, rate_channels=RATE_CHANNELS, rate_codecs=RATE_CODECS, rate_cpu=RATE_CPU)
     setup.listeners = [listener]
 
-    with live:
+    with live, ExitStack() as stack:
+        if feed is not None:
+            setup.listeners.append(stack.enter_context(FeedWriter(source.channels, feed)))
         setup.run()
 
 
-class CliRepr(Protocol):
-    def cli_repr(self) -> str:
-        pass
-
-
-class ChannelView:
-    """Composes a text label, bar and numeric view of a channel."""
-
-    def __init__(self, number):
-        self.name = Text(f"CH{number}")
-        self.bar = ChannelBar()
-        self.data = Text()
-        self.update(0)
-
-    @property
-    def renderables(self):
-        return [self.name, self.bar, self.data]
-
-    def update(self, value):
-        self.bar.update(value)
-        self.data.plain = f"{value:.3f}"
-
-
-class ChannelBar(Bar):
-    """Adapt a Bar to display values between -1.0 and 1.0."""
-
-    def __init__(self):
-        super().__init__(size=2, begin=1, end=1, width=50, color="deep_sky_blue4")
-
-    def update(self, value):
-        if value > 0:
-            self.begin = 1
-            self.end = value + 1
-        else:
-            self.begin = value + 1
-            self.end = 1
-
-
-class CodecRow:
-    def __init__(self, codec: Codec):
-        self.name = Text(repr(codec))
-        self.mean_latency = Text()
-        self.max_latency = Text()
-        self.mean_error = Text()
-        self.max_error = Text()
-
-    @property
-    def renderables(self):
-        return [self.name, self.mean_latency, self.max_latency, self.mean_error, self.max_error]
-
-    def update(self, stats: Stats):
-        self.mean_latency.plain = f"{stats.latency.mean:.2f}"
-        self.max_latency.plain = f"{stats.latency.max:.2f}"
-        self.mean_error.plain = f"{stats.fd_error.mean:.6f}"
-        self.max_error.plain = f"{stats.fd_error.max:.6f}"
-
-
-class View:
-    def __init__(self, setup: Setup):
-        self.setup = setup
-        self.channel_views = [ChannelView(i) for i in range(setup.source.channels)]
-        self.bitrate = Text(str(setup.bitrate))
-        self.packet_counter = Text()
-        self.elapsed_time = Text()
-        self.cpu_usage = Text()
-        self.mem_usage = Text()
-        self.codec_rows = [CodecRow(c) for c in self.setup.codecs]
-        self.process = psutil.Process()
-
-        grid = Table.grid()
-        grid.add_row(self._channel_panel(), self._stats_panel())
-        codec_table = self._codec_table(self.codec_rows)
-        self.renderable = Group(grid, codec_table)
-
-    def _channel_panel(self):
-        grid = Table.grid()
-        grid.add_column(width=3)
-        grid.add_column()
-        grid.add_column(width=6, justify="right")
-        for cv in self.channel_views:
-            grid.add_row(*cv.renderables)
-        return Panel.fit(grid, title=repr(self.setup.source), title_align="left", box=box.SQUARE)
-
-    def _stats_panel(self):
-        grid = Table.grid()
-        grid.add_column(width=12)
-        grid.add_column(width=12, justify="right")
-        grid.add_row("Bitrate", self.bitrate)
-        grid.add_row("Elapsed time", self.elapsed_time)
-        grid.add_row("Packet count", self.packet_counter)
-        grid.add_row("CPU usage", self.cpu_usage)
-        grid.add_row("Mem usage", self.mem_usage)
-        return Panel.fit(grid, title="Stats", title_align="left", box=box.SQUARE)
-
-    @staticmethod
-    def _codec_table(rows):
-        t = Table(box=box.SIMPLE_HEAD)
-        t.add_column(header="Codec", width=60)
-        t.add_column(header="Mean latency")
-        t.add_column(header="Max latency")
-        t.add_column(header="Mean error")
-        t.add_column(header="Max error")
-        for row in rows:
-            t.add_row(*row.renderables)
-        return t
-
-    def update_stats(self, time, packets):
-        seconds = time / 1_000_000
-        self.elapsed_time.plain = f"{seconds:.3f}"
-        self.packet_counter.plain = str(packets)
-
-    def update_cpu(self):
-        self.cpu_usage.plain = str(f"{self.process.cpu_percent():.0f} %")
-        self.mem_usage.plain = naturalsize(self.process.memory_info().rss)
-
-    def update_channels(self, data: FD):
-        for cv, value in zip(self.channel_views, data):
-            cv.update(value)
-
-    def update_codec(self, codec_id, stats: Stats):
-        self.codec_rows[codec_id].update(stats)
-
-
-class ViewPacketListener(PacketListener):
-    def __init__(self, view: View, live: Live, rate_channels, rate_codecs, rate_cpu):
-        self.view = view
-        self.live = live
-        self.collector = RollingStatsCollector(time_limit=1_000_000)
-        if not (rate_channels >= rate_codecs >= rate_cpu):
-            raise ValueError()
-        self.period_channels = self._rate_to_period(rate_channels)
-        self.period_codecs = self._rate_to_period(rate_codecs)
-        self.period_cpu = self._rate_to_period(rate_cpu)
-        self.last_update_channels = 0
-        self.last_update_codecs = 0
-        self.last_update_cpu = 0
-        self.packet_count = 0
-
-    @staticmethod
-    def _rate_to_period(rate):
-        return round(1_000_000 / rate)
-
-    def add(self, codec_id, packet: LinkPacket):
-        current_time = packet.rx_ts
-        self.collector.add(codec_id, packet)
-        self.packet_count += 1
-        if (current_time - self.last_update_channels) >= self.period_channels:
-            self.view.update_channels(packet.tx_fd)
-            self.view.update_stats(time=current_time, packets=self.packet_count)
-            self.last_update_channels = current_time
-            if (current_time - self.last_update_codecs) >= self.period_codecs:
-                for codec_id, _ in enumerate(self.view.setup.codecs):
-                    stats = self.collector.stats(codec_id)
-                    self.view.update_codec(codec_id, stats)
-                self.last_update_codecs = current_time
-            if (current_time - self.last_update_cpu) >= self.period_cpu:
-                self.view.update_cpu()
-                self.last_update_cpu = current_time
-            self.live.refresh()
-
-
 if __name__ == "__main__":
     app()
@@ -1,38 +1,121 @@
+from math import comb
+from typing import Sequence
+
 import attrs
 import numpy as np
 from bitarray import bitarray
 
 from rclinklab.base import ID, Codec
-from rclinklab.converters import b2i_s, i2b_s, join, split
+from rclinklab.converters import b2i_batch, i2b_batch
 
 
 class State:
-    def __init__(self, channels):
-        self.last: ID = np.zeros(channels, dtype=np.int_)
+    def __init__(self, channels, depth=1):
+        # The latest values, newest first
+        self.history: ID = np.zeros((depth, channels), dtype=np.int_)
+
+    @property
+    def last(self) -> ID:
+        return self.history[0]
+
+    def update(self, value: ID):
+        self.history[1:] = self.history[:-1]
+        self.history[0] = value
 
 
 def fit(value, bits):
     """If the value is outside the range of an unisgned int of size bits, adjust it to min/max."""
-    return min(max(value, -(2 ** (bits - 1))), 2 ** (bits - 1) - 1)
+    return np.clip(value, -(2 ** (bits - 1)), 2 ** (bits - 1) - 1)
 
 
 @attrs.define(slots=False)
 class DeltaCodec(Codec):
+    """Send the difference between the value and a prediction made by the receiver, clamped to delta_bits.
+
+    The prediction extrapolates a polynomial of degree ORDER through the latest received values, for plain delta
+    coding that is just the last value.
+    """
 
     delta_bits: int
 
+    ORDER = 0
+
+    # If the delta saturates, drop the highest order term from the history to avoid overshooting
+    DAMPING = False
+
+    # Max number of packets integrated at once in receive_batch
+    BATCH_CHUNK = 1024
+
     def __attrs_post_init__(self):
-        self.tx_state = State(self.channels)
-        self.rx_state = State(self.channels)
+        depth = self.ORDER + 1
+        self.coefficients = np.array([(-1) ** j * comb(depth, j + 1) for j in range(depth)])
+        self.highest_difference = np.array([(-1) ** j * comb(self.ORDER, j) for j in range(depth)])
+        self.tx_state = State(self.channels, depth)
+        self.rx_state = State(self.channels, depth)
+
+    def predict(self, state: State) -> ID:
+        return np.clip(self.coefficients @ state.history, 0, 2**self.bits - 1)
+
+    def saturated(self, delta: ID):
+        return (delta == -(2 ** (self.delta_bits - 1))) | (delta == 2 ** (self.delta_bits - 1) - 1)
+
+    def update(self, state: State, value: ID, delta: ID):
+        state.update(value)
+        if self.DAMPING:
+            # Adjust the oldest value so that the highest order difference of saturated channels becomes 0
+            difference = self.highest_difference @ state.history
+            state.history[-1] -= np.where(self.saturated(delta), self.highest_difference[-1] * difference, 0)
+
+    def _encode(self, data: ID) -> ID:
+        prediction = self.predict(self.tx_state)
+        delta = fit(data - prediction, self.delta_bits)
+        self.update(self.tx_state, prediction + delta, delta)
+        return delta
+
+    def _decode(self, delta: ID) -> ID:
+        new = self.predict(self.rx_state) + delta
+        self.update(self.rx_state, new, delta)
+        return new
 
     def transmit(self, data: ID) -> bitarray:
-        delta = data - self.tx_state.last
-        delta = np.array([fit(v, self.delta_bits) for v in delta])
-        self.tx_state.last += delta
-        return join(i2b_s(delta, self.delta_bits, signed=True))
+        return i2b_batch(self._encode(data)[np.newaxis], self.delta_bits, signed=True)[0]
 
     def receive(self, data: bitarray) -> ID:
-        delta = b2i_s(split(data, self.delta_bits), signed=True)
-        new = self.rx_state.last + delta
-        self.rx_state.last = new
-        return new
+        return self._decode(b2i_batch([data], self.delta_bits, signed=True)[0])
+
+    def transmit_batch(self, data: ID) -> list[bitarray]:
+        deltas = np.array([self._encode(row) for row in data], dtype=np.int_).reshape(len(data), self.channels)
+        return i2b_batch(deltas, self.delta_bits, signed=True)
+
+    def receive_batch(self, data: Sequence[bitarray]) -> ID:
+        """Without clamping the predictor is linear, so the values are the deltas integrated ORDER + 1 times.
+
+        This is done in chunks with numpy, falling back to single packets where clamping or damping kicks in.
+        """
+        deltas = b2i_batch(data, self.delta_bits, signed=True)
+        result = np.empty((len(data), self.channels), dtype=np.int_)
+        i = 0
+        while i < len(data):
+            chunk = deltas[i : i + self.BATCH_CHUNK]
+            values = self._integrate(self.rx_state.history, chunk)
+            predictions = values - chunk
+            valid = ((predictions >= 0) & (predictions <= 2**self.bits - 1)).all(axis=1)
+            if self.DAMPING:
+                valid &= ~self.saturated(chunk).any(axis=1)
+            accepted = len(chunk) if valid.all() else int(np.argmin(valid))
+            result[i : i + accepted] = values[:accepted]
+            for value in values[max(0, accepted - len(self.coefficients)) : accepted]:
+                self.rx_state.update(value)
+            i += accepted
+            if accepted < len(chunk):
+                result[i] = self._decode(deltas[i])
+                i += 1
+        return result
+
+    @staticmethod
+    def _integrate(history: ID, deltas: ID) -> ID:
+        oldest_first = history[::-1]
+        values = deltas
+        for level in reversed(range(len(history))):
+            values = np.diff(oldest_first, n=level, axis=0)[-1] + np.cumsum(values, axis=0)
+        return values
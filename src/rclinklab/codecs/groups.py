@@ -0,0 +1,147 @@
+"""Send groups of channels at their own bit depth and rate, like sticks in every packet and switches round-robin.
+
+A group is sent in the packets where the slot, which counts packets modulo the least common multiple of the
+periods, is phase modulo the period of the group. Every packet starts with the slot, so the receiver knows which
+groups follow even after lost packets, and holds the latest received values of the groups that are not in it. The
+header is left out when all groups are sent in every packet.
+"""
+
+import math
+from typing import Iterable, Sequence
+
+import attrs
+import numpy as np
+from bitarray import bitarray
+from bitarray.util import int2ba
+
+from rclinklab.base import FD, ID, Codec, LinkLabException
+from rclinklab.converters import b2i_batch, f2i_s, i2b_batch, i2f_s
+
+
+@attrs.frozen
+class Group:
+    channels: int
+    bits: int
+    period: int = 1  # sent in one of every period packets
+    phase: int = 0  # the slot modulo the period it is sent in
+
+    def __attrs_post_init__(self):
+        if not 0 <= self.phase < self.period:
+            raise LinkLabException(f"The phase must be between 0 and {self.period - 1}, got {self.phase}")
+
+
+def _to_tuple(groups: Iterable[Group]) -> tuple[Group, ...]:
+    return tuple(groups)
+
+
+@attrs.define(slots=False)
+class GroupCodec(Codec):
+    """Raw values of the groups in the slot, after a header with the slot number"""
+
+    channels: int = attrs.field(init=False)
+    bits: int = attrs.field(init=False)
+    groups: tuple[Group, ...] = attrs.field(converter=_to_tuple)
+
+    def __attrs_post_init__(self):
+        if not self.groups:
+            raise LinkLabException("A group codec needs at least one group")
+        self.channels = sum(g.channels for g in self.groups)
+        self.bits = max(g.bits for g in self.groups)
+        self.slots = math.lcm(*(g.period for g in self.groups))
+        self.header_bits = (self.slots - 1).bit_length()
+        ends = np.cumsum([g.channels for g in self.groups]).tolist()
+        self.bounds = list(zip([0, *ends[:-1]], ends))
+        self.tx_slot = 0
+        self.rx_values: ID = np.zeros(self.channels, dtype=np.int_)
+
+    def included(self, slot: int) -> list[bool]:
+        return [slot % g.period == g.phase for g in self.groups]
+
+    def slot_of(self, data: Sequence[bitarray]) -> ID:
+        """The slot of each packet, from its header"""
+        if not self.header_bits:
+            return np.zeros(len(data), dtype=np.int_)
+        return b2i_batch([d[: self.header_bits] for d in data], self.header_bits).reshape(len(data))
+
+    def groups_of(self, data: Sequence[bitarray]) -> np.ndarray:
+        """Which groups each packet carries, one row of booleans per packet"""
+        table = np.array([self.included(s) for s in range(self.slots)], dtype=np.bool_)
+        return table[self.slot_of(data)]
+
+    def quantize(self, data: FD) -> ID:
+        """The channels are on the last axis, so this works on a packet or on an array of packets"""
+        return np.concatenate([f2i_s(data[..., a:b], g.bits) for g, (a, b) in zip(self.groups, self.bounds)], axis=-1)
+
+    def dequantize(self, data: ID) -> FD:
+        return np.concatenate([i2f_s(data[..., a:b], g.bits) for g, (a, b) in zip(self.groups, self.bounds)], axis=-1)
+
+    def _header(self, slot: int) -> bitarray:
+        return int2ba(slot, self.header_bits) if self.header_bits else bitarray()
+
+    def transmit(self, data: ID) -> bitarray:
+        return self.transmit_batch(data[np.newaxis])[0]
+
+    def receive(self, data: bitarray) -> ID:
+        return self.receive_batch([data])[0]
+
+    def transmit_batch(self, data: ID) -> list[bitarray]:
+        """The packets with the same slot are packed together, one group at a time"""
+        slots = (self.tx_slot + np.arange(len(data))) % self.slots
+        self.tx_slot = (self.tx_slot + len(data)) % self.slots
+        result: list[bitarray] = [bitarray()] * len(data)
+        for slot in np.unique(slots).tolist():
+            rows = np.flatnonzero(slots == slot)
+            packets = [self._header(slot) for _ in rows]
+            for group, (a, b), included in zip(self.groups, self.bounds, self.included(slot)):
+                if included:
+                    for packet, bits in zip(packets, i2b_batch(data[rows, a:b], group.bits)):
+                        packet.extend(bits)
+            for row, packet in zip(rows.tolist(), packets):
+                result[row] = packet
+        return result
+
+    def _length(self, slot: int, before: int | None = None) -> int:
+        """The length of the packets of a slot, or the position of the group with index before in them"""
+        groups = zip(self.groups[:before], self.included(slot))
+        return self.header_bits + sum(g.channels * g.bits for g, included in groups if included)
+
+    def receive_batch(self, data: Sequence[bitarray]) -> ID:
+        """Each group is held from the latest packet that carried it, also across batches"""
+        if any(len(d) < self.header_bits for d in data):
+            raise LinkLabException("Packet shorter than the header")
+        slots = self.slot_of(data)
+        for i, slot in enumerate(slots.tolist()):
+            if slot >= self.slots or len(data[i]) != self._length(slot):
+                raise LinkLabException(f"Packet length {len(data[i])} does not match slot {slot}")
+        result = np.empty((len(data), self.channels), dtype=np.int_)
+        carried = self.groups_of(data)
+        for g, (group, (a, b)) in enumerate(zip(self.groups, self.bounds)):
+            rows = np.flatnonzero(carried[:, g])
+            # The values are in every packet of a slot at the same position
+            values = np.empty((len(rows), group.channels), dtype=np.int_)
+            for slot in np.unique(slots[rows]).tolist():
+                offset = self._length(slot, before=g)
+                same = slots[rows] == slot
+                packets = [data[i][offset : offset + group.channels * group.bits] for i in rows[same].tolist()]
+                values[same] = b2i_batch(packets, group.bits)
+            # Forward fill from the latest packet with the group, or the values before this batch
+            latest = np.maximum.accumulate(np.where(carried[:, g], np.arange(len(data)), -1))
+            held = np.vstack([self.rx_values[np.newaxis, a:b], np.zeros((len(data), b - a), dtype=np.int_)])
+            held[rows + 1] = values
+            result[:, a:b] = held[latest + 1]
+        if len(data):
+            self.rx_values = result[-1].copy()
+        return result
+
+
+def round_robin(channels: int, bits: int = 10, sticks: int = 4, aux_bits: int = 2, aux_period: int = 4) -> GroupCodec:
+    """The sticks at bits in every packet, the rest of the channels split into aux_period groups of aux_bits.
+
+    One aux group is sent per packet, in turn, so every aux channel is sent once every aux_period packets.
+    """
+    if channels <= sticks:
+        return GroupCodec([Group(channels, bits)])
+    aux = channels - sticks
+    periods = min(aux_period, aux)
+    sizes = [aux // periods + (i < aux % periods) for i in range(periods)]
+    return GroupCodec([Group(sticks, bits), *(Group(size, aux_bits, periods, i) for i, size in enumerate(sizes))])
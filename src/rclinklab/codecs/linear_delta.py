@@ -0,0 +1,10 @@
+import attrs
+
+from rclinklab.codecs.delta import DeltaCodec
+
+
+@attrs.define(slots=False)
+class LinearDeltaCodec(DeltaCodec):
+    """Predict the next value by extrapolating a line through the last two values."""
+
+    ORDER = 1
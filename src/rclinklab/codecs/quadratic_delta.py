@@ -0,0 +1,14 @@
+import attrs
+
+from rclinklab.codecs.delta import DeltaCodec
+
+
+@attrs.define(slots=False)
+class QuadraticDeltaCodec(DeltaCodec):
+    """Predict the next value by extrapolating a parabola through the last three values.
+
+    Without damping the prediction keeps overshooting after large steps, and never converges.
+    """
+
+    ORDER = 2
+    DAMPING = True
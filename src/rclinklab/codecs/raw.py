@@ -1,13 +1,27 @@
+from typing import Sequence
+
+import numpy as np
 from bitarray import bitarray
 
-from rclinklab.converters import b2i_s, i2b_s, join, split
+from rclinklab.converters import b2i_batch, i2b_batch
 
 from ..base import ID, Codec
 
 
 class RawCodec(Codec):
+    """All channels at bits each, packed with numpy so that the cost hardly grows with the number of channels"""
+
     def transmit(self, data: ID) -> bitarray:
-        return join(i2b_s(data, self.bits))
+        return i2b_batch(data[np.newaxis], self.bits)[0]
 
     def receive(self, data: bitarray) -> ID:
-        return b2i_s(split(data, self.bits))
+        # Bits after the last whole value are ignored
+        return b2i_batch([data[: len(data) - len(data) % self.bits]], self.bits)[0]
+
+    def transmit_batch(self, data: ID) -> list[bitarray]:
+        return i2b_batch(data, self.bits)
+
+    def receive_batch(self, data: Sequence[bitarray]) -> ID:
+        if len({len(d) for d in data}) > 1:
+            return super().receive_batch(data)
+        return b2i_batch([d[: len(d) - len(d) % self.bits] for d in data], self.bits).reshape(len(data), self.channels)
@@ -0,0 +1,128 @@
+"""Lossless delta coding with adaptive Rice codes, small stick movements only need a few bits per channel.
+
+Each residual is zigzag mapped to an unsigned value z and sent as q = z >> k in unary (q ones and a zero) followed by
+the k low bits of z. The parameter k is adapted per channel from the mean of previous values, the same way on both
+sides, like in LOCO-I. Values with q >= ESCAPE are sent as the escape prefix followed by z in bits + 1 bits.
+"""
+
+from functools import lru_cache
+
+import attrs
+import numpy as np
+from bitarray import bitarray
+from bitarray.util import ba2int, int2ba
+
+from rclinklab.base import ID, Codec, LinkLabException
+
+# Number of bits looked up at once when decoding
+WINDOW = 16
+MASK = (1 << WINDOW) - 1
+
+ESCAPE = 8
+
+# Halve the adaptive statistics when this many values have been seen, to follow changes in the signal
+RESET = 8
+
+
+def _leading_ones() -> np.ndarray:
+    return WINDOW - np.frexp(~np.arange(1 << WINDOW) & MASK)[1]
+
+
+@lru_cache(maxsize=None)
+def decode_table(k: int) -> tuple[list[int], list[int]]:
+    """Lengths and values of the codewords starting each possible window.
+
+    The length is 0 for escaped values and for codewords that are longer than the window.
+    """
+    ones = _leading_ones()
+    length = ones + 1 + k
+    values = (ones << k) | ((np.arange(1 << WINDOW) >> np.maximum(WINDOW - length, 0)) & ((1 << k) - 1))
+    lengths = np.where((ones < ESCAPE) & (length <= WINDOW), length, 0)
+    return lengths.tolist(), values.tolist()
+
+
+def zigzag(values: ID) -> ID:
+    return np.where(values >= 0, values * 2, -values * 2 - 1)
+
+
+def unzigzag(values: ID) -> ID:
+    return np.where(values % 2 == 0, values // 2, -(values + 1) // 2)
+
+
+class State:
+    def __init__(self, channels):
+        self.last: ID = np.zeros(channels, dtype=np.int_)
+        self.total: ID = np.full(channels, 4, dtype=np.int_)
+        self.count: ID = np.ones(channels, dtype=np.int_)
+
+    def parameters(self, bits) -> ID:
+        """The smallest k where count * 2^k >= total."""
+        mean = -(-self.total // self.count)
+        return np.minimum(np.frexp(np.maximum(mean - 1, 0))[1], bits)
+
+    def update(self, value: ID, z: ID):
+        self.last = value
+        self.total += z
+        self.count += 1
+        if self.count[0] == RESET:
+            self.total >>= 1
+            self.count >>= 1
+
+
+@attrs.define(slots=False)
+class RiceCodec(Codec):
+    def __attrs_post_init__(self):
+        self.tx_state = State(self.channels)
+        self.rx_state = State(self.channels)
+
+    def transmit(self, data: ID) -> bitarray:
+        z = zigzag(data - self.tx_state.last)
+        packet = size = 0
+        for value, k in zip(z.tolist(), self.tx_state.parameters(self.bits).tolist()):
+            q = value >> k
+            if q < ESCAPE:
+                code, length = (((1 << q) - 1) << (k + 1)) | (value & ((1 << k) - 1)), q + 1 + k
+            else:
+                code, length = (((1 << ESCAPE) - 1) << (self.bits + 1)) | value, ESCAPE + self.bits + 1
+            packet = (packet << length) | code
+            size += length
+        self.tx_state.update(data.copy(), z)
+        return int2ba(packet, size)
+
+    def receive(self, data: bitarray) -> ID:
+        """Look up each codeword from the next WINDOW bits, only long codewords are decoded bit by bit."""
+        size = len(data)
+        packet = (ba2int(data) if size else 0) << WINDOW  # pad so there is always a full window left
+        z = []
+        position = 0
+        for k in self.rx_state.parameters(self.bits).tolist():
+            lengths, values = decode_table(k)
+            window = (packet >> (size - position)) & MASK
+            if length := lengths[window]:
+                z.append(values[window])
+                position += length
+            elif window >> (WINDOW - ESCAPE) == (1 << ESCAPE) - 1:
+                position += ESCAPE + self.bits + 1
+                z.append(self._bits(packet, size, position, self.bits + 1))
+            else:
+                try:
+                    q = data.index(0, position) - position
+                except ValueError:
+                    raise LinkLabException("Truncated Rice code") from None
+                position += q + 1 + k
+                z.append((q << k) | self._bits(packet, size, position, k))
+            if position > size:
+                raise LinkLabException("Truncated Rice code")
+        if position != size:
+            raise LinkLabException(f"Packet length {size} does not match decoded length {position}")
+        zz = np.array(z, dtype=np.int_)
+        value = self.rx_state.last + unzigzag(zz)
+        self.rx_state.update(value, zz)
+        return value
+
+    @staticmethod
+    def _bits(packet: int, size: int, end: int, bits: int) -> int:
+        """Extract the bits ending at position end from the padded packet."""
+        if end > size:
+            raise LinkLabException("Truncated Rice code")
+        return (packet >> (size + WINDOW - end)) & ((1 << bits) - 1)
@@ -0,0 +1,97 @@
+"""Convert between sequences of LinkPackets and columns of numpy arrays, for compact storage of whole runs.
+
+Scalar fields become 1d arrays and channel fields 2d arrays with one row per packet. The variable length ota_data
+is stored as the lengths in bits and the concatenated bytes of each packet.
+"""
+
+from typing import TYPE_CHECKING, Sequence
+
+import attrs
+import numpy as np
+from bitarray import bitarray
+
+from rclinklab.simulate import LinkPacket
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+Columns = dict[str, np.ndarray]
+
+
+def to_columns(packets: Sequence[LinkPacket], codec_ids: Sequence[int] | None = None) -> Columns:
+    """Make columns of the packet fields, optionally with a codec_id column.
+
+    >>> from rclinklab.simulate import TxData
+    >>> tx_data = TxData(0, 0, 10, np.array([0.5]), np.array([3]), bitarray("011"))
+    >>> columns = to_columns([LinkPacket(tx_data, rx_ts=20, rx_id=np.array([3]), rx_fd=np.array([0.5]))])
+    >>> columns["rx_ts"], columns["ota_data_bits"]
+    (array([20]), array([3]))
+    >>> from_columns(columns)[0].ota_data
+    bitarray('011')
+    """
+    result = {}
+    for field in attrs.fields(LinkPacket):
+        values = [getattr(p, field.name) for p in packets]
+        if field.name == "ota_data":
+            result["ota_data_bits"] = np.array([len(v) for v in values], dtype=np.int_)
+            result["ota_data"] = np.frombuffer(b"".join(v.tobytes() for v in values), dtype=np.uint8)
+        else:
+            result[field.name] = np.array(values)
+    if codec_ids is not None:
+        result["codec_id"] = np.array(codec_ids, dtype=np.int_)
+    return result
+
+
+def select(columns: Columns, codec_id: int) -> Columns:
+    """Get the columns of packets for one codec, without the codec_id column"""
+    mask = columns["codec_id"] == codec_id
+    result = {k: v[mask] for k, v in columns.items() if k not in ("ota_data", "codec_id")}
+    result["ota_data"] = columns["ota_data"][np.repeat(mask, (columns["ota_data_bits"] + 7) // 8)]
+    return result
+
+
+def concatenate(parts: Sequence[Columns]) -> Columns:
+    """Join the columns of consecutive runs of packets"""
+    return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+
+def _ota_data(columns: Columns) -> list[bitarray]:
+    ends = np.cumsum((columns["ota_data_bits"] + 7) // 8)
+    data = columns["ota_data"].tobytes()
+    result = []
+    for bits, end in zip(columns["ota_data_bits"].tolist(), ends.tolist()):
+        ota_data = bitarray(endian="big")
+        ota_data.frombytes(data[end - (bits + 7) // 8 : end])
+        del ota_data[bits:]
+        result.append(ota_data)
+    return result
+
+
+def to_data_frame(columns: Columns) -> "pd.DataFrame":
+    """Create the same multilevel dataframe as attrs_to_data_frame does from the packets."""
+    import pandas as pd
+
+    frames = []
+    for field in attrs.fields(LinkPacket):
+        name = field.name
+        if name == "ota_data":
+            frame = pd.DataFrame({(name, name): pd.Series(_ota_data(columns), dtype=object)})
+        elif columns[name].ndim == 1:
+            frame = pd.DataFrame({(name, name): columns[name]})
+        else:
+            frame = pd.DataFrame({(name, f"{name}[{i}]"): c for i, c in enumerate(columns[name].T)})
+        frames.append(frame)
+    return pd.concat(frames, axis=1)
+
+
+def from_columns(columns: Columns) -> list[LinkPacket]:
+    # Rows of channel data become arrays, everything else python values
+    values = {
+        f.name: list(columns[f.name]) if columns[f.name].ndim > 1 else columns[f.name].tolist()
+        for f in attrs.fields(LinkPacket)
+        if f.name != "ota_data"
+    }
+    return [
+        LinkPacket.from_fields(ota_data=ota_data, **{name: v[i] for name, v in values.items()})
+        for i, ota_data in enumerate(_ota_data(columns))
+    ]
@@ -0,0 +1,113 @@
+"""Stop a simulation when the mean latency and error are known well enough.
+
+The metrics of consecutive packets are correlated, so the confidence interval of the mean is estimated with batch
+means: the packets are grouped in batches of batch_size, and the means of the batches are treated as independent
+samples, accumulated with Welford's algorithm.
+"""
+
+import math
+from collections import defaultdict
+from typing import Sequence
+
+import attrs
+
+from rclinklab.base import LinkLabException
+from rclinklab.simulate import LinkPacket, PacketListener
+
+METRICS = ("latency", "error")
+
+# Quantile of the normal distribution for a two sided 95 % confidence interval
+Z_95 = 1.959964
+
+
+@attrs.define
+class BatchMeans:
+    batch_size: int
+    batch_sum: float = 0.0
+    batch_count: int = 0
+    # Welford's running mean and sum of squared differences of the batch means
+    batches: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+
+    def add(self, value: float) -> bool:
+        """Returns True when this completed a batch"""
+        self.batch_sum += value
+        self.batch_count += 1
+        if self.batch_count < self.batch_size:
+            return False
+        batch_mean = self.batch_sum / self.batch_size
+        self.batch_sum, self.batch_count = 0.0, 0
+        self.batches += 1
+        delta = batch_mean - self.mean
+        self.mean += delta / self.batches
+        self.m2 += delta * (batch_mean - self.mean)
+        return True
+
+    def half_width(self, z: float = Z_95) -> float:
+        """Half the width of the confidence interval of the mean, infinite until there are two batches"""
+        if self.batches < 2:
+            return math.inf
+        return z * math.sqrt(self.m2 / (self.batches - 1) / self.batches)
+
+
+class Convergence(PacketListener):
+    def __init__(
+        self,
+        rtol: float = 0.01,
+        atol: float = 0.0,
+        metrics: Sequence[str] = METRICS,
+        min_duration: int = 500_000,
+        batch_size: int = 64,
+        min_batches: int = 10,
+    ):
+        """
+        Args:
+            rtol: The run can stop when the confidence intervals of the metrics are within the mean times rtol...
+            atol: ...or within atol.
+            metrics: Any of latency, in µs, and error, the mean absolute error of a packet.
+            min_duration: Never stop before this, in µs.
+            batch_size: Packets per batch, the batches should be long enough to be almost independent.
+            min_batches: Never stop before every metric has this many batches.
+        """
+        if unknown := set(metrics) - set(METRICS):
+            raise LinkLabException(f"Unknown metrics {', '.join(sorted(unknown))}, choose from {', '.join(METRICS)}")
+        self.rtol = rtol
+        self.atol = atol
+        self.metrics = metrics
+        self.min_duration = min_duration
+        self.batch_size = batch_size
+        self.min_batches = min_batches
+        self.reset()
+
+    def reset(self):
+        """Forget the packets of an earlier run, Setup.run calls this so the same instance can be reused"""
+        self.stats: dict[int, dict[str, BatchMeans]] = defaultdict(
+            lambda: {m: BatchMeans(self.batch_size) for m in self.metrics}
+        )
+        self.converged = False
+        self.last_rx_ts = 0
+
+    def __repr__(self):
+        return (
+            f"Convergence(rtol={self.rtol}, atol={self.atol}, metrics={tuple(self.metrics)}, "
+            f"min_duration={self.min_duration}, batch_size={self.batch_size}, min_batches={self.min_batches})"
+        )
+
+    @property
+    def effective_duration(self) -> int:
+        """How long the run was, in µs"""
+        return self.last_rx_ts
+
+    def add(self, codec_id: int, packet: LinkPacket):
+        self.last_rx_ts = packet.rx_ts
+        values = {"latency": packet.rx_ts - packet.tx_ts, "error": float(abs(packet.rx_fd - packet.tx_fd).mean())}
+        completed = False
+        for metric, batch_means in self.stats[codec_id].items():
+            completed |= batch_means.add(values[metric])
+        if completed and packet.rx_ts >= self.min_duration:
+            self.converged = all(self._converged(m) for codec in self.stats.values() for m in codec.values())
+
+    def _converged(self, batch_means: BatchMeans) -> bool:
+        tolerance = max(self.rtol * abs(batch_means.mean), self.atol)
+        return batch_means.batches >= self.min_batches and batch_means.half_width() <= tolerance
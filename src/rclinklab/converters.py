@@ -6,15 +6,22 @@ a = np.ndarray
 """
 
 import operator
-from functools import reduce
+from functools import lru_cache, reduce
 from typing import Sequence
 
+import attrs
 import numpy as np
 from bitarray import bitarray
 from bitarray.util import ba2int, int2ba
 
 from rclinklab.base import FD, ID
 
+# Dequantization tables are only built up to this bit depth, larger depths use the formula
+MAX_TABLE_BITS = 16
+
+# Above this bit depth the integers no longer convert exactly to floats, use the scalar functions
+MAX_VECTOR_BITS = 52
+
 # TODO remove _s-variants, merge with the single-value-variant, maybe using decorator?
 
 
@@ -68,12 +75,53 @@ def b2f(value: bitarray) -> float:
     return i2f(ba2int(value), len(value))
 
 
+@attrs.frozen
+class Quantizer:
+    """Precomputed constants for converting between floats and ints of a specific bit depth.
+
+    Gives bit-identical results to f2i/i2f (including round half to even), but works on whole arrays.
+
+    >>> q = quantizer(2)
+    >>> q.i2f(iarray([0, 1, 2, 3]))
+    array([-1.        , -0.33333333,  0.33333333,  1.        ])
+    >>> q.f2i(farray([-1.0, -0.5, 0.0, 1.0]))
+    array([0, 1, 2, 3])
+    """
+
+    bits: int
+    max_value: int
+    table: FD | None
+
+    def f2i(self, values: FD) -> ID:
+        if self.bits > MAX_VECTOR_BITS:
+            return iarray(f2i(v, self.bits) for v in values.tolist())
+        return np.rint(((values + 1) / 2) * self.max_value).astype(np.int_)
+
+    def i2f(self, values: ID) -> FD:
+        if self.table is not None and values.size and values.min() >= 0 and values.max() <= self.max_value:
+            return self.table[values]
+        if self.bits > MAX_VECTOR_BITS:
+            return farray(i2f(v, self.bits) for v in values.tolist())
+        return ((values / self.max_value) * 2) - 1
+
+
+@lru_cache(maxsize=32)
+def quantizer(bits: int) -> Quantizer:
+    """Get the shared quantizer for a bit depth, the tables are only computed once per process."""
+    max_value = 2**bits - 1
+    table = None
+    if bits <= MAX_TABLE_BITS:
+        table = ((np.arange(max_value + 1) / max_value) * 2) - 1
+        table.flags.writeable = False
+    return Quantizer(bits=bits, max_value=max_value, table=table)
+
+
 def i2f_s(values: ID, bits: int) -> FD:
-    return farray(i2f(v, bits) for v in values.tolist())
+    return quantizer(bits).i2f(values)
 
 
 def f2i_s(values: FD, bits: int) -> ID:
-    return iarray(f2i(v, bits) for v in values)
+    return quantizer(bits).f2i(values)
 
 
 def i2b_s(values: ID, bits: int, signed=False) -> Sequence[bitarray]:
@@ -84,6 +132,46 @@ def b2i_s(values: Sequence[bitarray], signed=False) -> ID:
     return iarray(b2i(v, signed=signed) for v in values)
 
 
+def i2b_batch(values: ID, bits: int, signed=False) -> list[bitarray]:
+    """Pack each row of a 2d array into one bitarray, the same as join(i2b_s(row, bits)) for every row.
+
+    >>> i2b_batch(iarray([1, 2, -1, -2]).reshape(2, 2), 3, signed=True)
+    [bitarray('001010'), bitarray('111110')]
+    """
+    values = np.asarray(values, dtype=np.int_)
+    low, high = (-(2 ** (bits - 1)), 2 ** (bits - 1) - 1) if signed else (0, 2**bits - 1)
+    if values.size and (values.min() < low or values.max() > high):
+        raise OverflowError(f"Values do not fit in {bits} bits")
+    rows = values.shape[0]
+    bit_matrix = ((values[..., None] >> np.arange(bits - 1, -1, -1)) & 1).astype(np.uint8).reshape(rows, -1)
+    length = bit_matrix.shape[1]
+    result = []
+    for row in np.packbits(bit_matrix, axis=1):
+        ba = bitarray(endian="big")
+        ba.frombytes(row.tobytes())
+        del ba[length:]
+        result.append(ba)
+    return result
+
+
+def b2i_batch(values: Sequence[bitarray], bits: int, signed=False) -> ID:
+    """Unpack bitarrays of equal length into the rows of a 2d array, the inverse of i2b_batch.
+
+    >>> b2i_batch([bitarray('001010'), bitarray('111110')], 3, signed=True)
+    array([[ 1,  2],
+           [-1, -2]])
+    """
+    if len({len(v) for v in values}) > 1:
+        raise ValueError("All bitarrays must have the same length")
+    if not values:
+        return np.zeros((0, 0), dtype=np.int_)
+    bit_matrix = np.frombuffer(b"".join(v.unpack() for v in values), dtype=np.uint8)
+    result = bit_matrix.reshape(len(values), -1, bits) @ (1 << np.arange(bits - 1, -1, -1))
+    if signed:
+        result = np.where(result >= 2 ** (bits - 1), result - 2**bits, result)
+    return result
+
+
 def join(values: Sequence[bitarray]) -> bitarray:
     return reduce(operator.add, values)
 
@@ -0,0 +1,216 @@
+"""Evaluate codecs on a corpus of blackbox logs, a directory tree of csv exports and binary logs.
+
+Every log is parsed, simulated and reduced to stats in a worker process, which only holds one log at a time, so the
+memory use is bounded by the number of workers whatever the size of the corpus. The adapted logs are cached as
+arrays next to the run cache, keyed by the path, size and modification time of the file and the version of the
+decoder, since decoding a binary log takes much longer than simulating it. Only the stats are sent back. The pooled
+stats weight each log by its flight time, so that short logs don't count as much as long flights.
+
+Empty files are skipped. A log that can't be read, like an old data version or a csv export without the rcCommand
+columns, gives a failed result with the error instead of stopping the whole corpus.
+"""
+
+import copy
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Iterator, Sequence
+
+import attrs
+import numpy as np
+
+from rclinklab.base import Codec, InterpolatedTxSource, LinkLabException, digest
+from rclinklab.cache import RunCache
+from rclinklab.simulate import DEFAULT_BITRATE, LinkPacket, PacketListener, Setup
+from rclinklab.sources import bbl
+from rclinklab.sources.blackbox import COLUMNS, adapt, adapted, read_csv
+
+BINARY_SUFFIXES = {".bbl", ".bfl"}
+
+# Change this when reading or adapting logs gives other arrays, to not use stale logs from the cache
+LOG_VERSION = 2
+
+
+@attrs.frozen
+class Log:
+    path: Path
+    index: int = 0  # of the log in a binary file with several
+
+    def name(self, root: Path | None = None) -> str:
+        """The path relative to root, with the index for binary logs"""
+        name = str(self.path.relative_to(root) if root is not None else self.path)
+        return f"{name}#{self.index}" if self.path.suffix.lower() in BINARY_SUFFIXES else name
+
+    def __str__(self):
+        return self.name()
+
+
+@attrs.frozen
+class CodecStats:
+    packets: int
+    latency: float  # mean, in µs
+    max_latency: float
+    error: float  # mean absolute error
+    max_error: float
+
+
+@attrs.frozen
+class LogResult:
+    log: Log
+    flight_time: int  # simulated duration, in µs
+    codecs: list[CodecStats]
+    error: str | None = None  # why the log could not be evaluated, then there are no stats
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+
+def find_logs(directory: Path) -> list[Log]:
+    """All logs in the directory and its subdirectories, one per log in binary files"""
+    logs = []
+    for path in sorted(Path(directory).rglob("*")):
+        suffix = path.suffix.lower()
+        if suffix not in BINARY_SUFFIXES | {".csv"} or not path.is_file() or path.stat().st_size == 0:
+            continue
+        if suffix == ".csv":
+            logs.append(Log(path))
+        else:
+            logs += [Log(path, i) for i in range(bbl.count_logs(path))]
+    return logs
+
+
+def _read(log: Log) -> np.ndarray:
+    if log.path.suffix.lower() == ".csv":
+        return adapt(read_csv(log.path)).to_numpy()
+    chunks = list(adapted(log.path, log.index))
+    if not chunks:
+        raise LinkLabException(f"No frames in {log}")
+    return np.concatenate(chunks)
+
+
+def load(log: Log, cache: Path | None = None) -> np.ndarray:
+    """The adapted log, with the columns of blackbox.COLUMNS, from the cache directory if it's there"""
+    if cache is None:
+        return _read(log)
+    stat = log.path.stat()
+    parts = [str(LOG_VERSION), str(log.path.resolve()), str(stat.st_size), str(stat.st_mtime_ns), str(log.index)]
+    file = cache / f"{digest(*parts)}.npy"
+    try:
+        return np.load(file)
+    except (OSError, ValueError):
+        pass
+    data = _read(log)
+    cache.mkdir(parents=True, exist_ok=True)
+    temporary = file.with_suffix(".tmp")
+    with open(temporary, "wb") as f:
+        np.save(f, data)
+    os.replace(temporary, file)
+    return data
+
+
+class Accumulator(PacketListener):
+    """Running sums and maxima per codec, without keeping the packets"""
+
+    def __init__(self, codecs: int):
+        self.packets = [0] * codecs
+        self.latency = [0] * codecs
+        self.max_latency = [0] * codecs
+        self.error = [0.0] * codecs
+        self.max_error = [0.0] * codecs
+
+    def add(self, codec_id: int, packet: LinkPacket):
+        errors = np.abs(packet.rx_fd - packet.tx_fd)
+        latency = packet.rx_ts - packet.tx_ts
+        self.packets[codec_id] += 1
+        self.latency[codec_id] += latency
+        self.max_latency[codec_id] = max(self.max_latency[codec_id], latency)
+        self.error[codec_id] += float(errors.mean())
+        self.max_error[codec_id] = max(self.max_error[codec_id], float(errors.max()))
+
+    def stats(self, codec_id: int) -> CodecStats:
+        count = max(self.packets[codec_id], 1)
+        return CodecStats(
+            packets=self.packets[codec_id],
+            latency=self.latency[codec_id] / count,
+            max_latency=self.max_latency[codec_id],
+            error=self.error[codec_id] / count,
+            max_error=self.max_error[codec_id],
+        )
+
+
+def evaluate(
+    log: Log,
+    codecs: Sequence[Codec],
+    bitrate: int = DEFAULT_BITRATE,
+    duration: int | None = None,
+    cache: RunCache | None = None,
+    log_cache: Path | None = None,
+) -> LogResult:
+    """Simulate the codecs on one log, at most duration µs of it"""
+    import pandas as pd
+
+    data = load(log, log_cache)
+    flight_time = int(data[-1, 0]) if duration is None else min(int(data[-1, 0]), duration)
+    source = InterpolatedTxSource(pd.DataFrame(data, columns=COLUMNS))
+    accumulator = Accumulator(len(codecs))
+    # Every log starts with the codecs in their initial state
+    Setup(source, copy.deepcopy(list(codecs)), [accumulator], bitrate, flight_time, cache=cache).run()
+    return LogResult(log, flight_time, [accumulator.stats(i) for i in range(len(codecs))])
+
+
+def _evaluate(log: Log, **kwargs) -> LogResult:
+    try:
+        return evaluate(log, **kwargs)
+    except (LinkLabException, ValueError, OSError) as e:
+        return LogResult(log, 0, [], error=str(e) or type(e).__name__)
+
+
+def run(
+    logs: Sequence[Log],
+    codecs: Sequence[Codec],
+    bitrate: int = DEFAULT_BITRATE,
+    duration: int | None = None,
+    cache: RunCache | None = None,
+    workers: int | None = None,
+) -> Iterator[LogResult]:
+    """Evaluate the codecs on every log, in worker processes unless workers is 1. The results are in log order,
+    the logs that can't be read give failed results.
+
+    Args:
+        duration: Simulate at most this many µs of each log.
+        cache: Reuse runs and parsed logs from earlier evaluations.
+        workers: Defaults to the number of CPUs.
+    """
+    log_cache = cache.path.parent / "logs" if cache is not None else None
+    function = partial(_evaluate, codecs=codecs, bitrate=bitrate, duration=duration, cache=cache, log_cache=log_cache)
+    if workers == 1:
+        yield from map(function, logs)
+        return
+    # Spawn like transport, forking a process with threads can deadlock
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        yield from executor.map(function, logs)
+
+
+def pooled(results: Sequence[LogResult]) -> list[CodecStats]:
+    """The stats of each codec over all logs that didn't fail, the means weighted by the flight time of the logs"""
+    results = [r for r in results if not r.failed]
+    if not results:
+        raise LinkLabException("No results to pool")
+    weights = np.array([r.flight_time for r in results], dtype=np.float64)
+    weights /= weights.sum() or 1.0
+    pool = []
+    for codec_id in range(len(results[0].codecs)):
+        stats = [r.codecs[codec_id] for r in results]
+        pool.append(
+            CodecStats(
+                packets=sum(s.packets for s in stats),
+                latency=float(np.dot(weights, [s.latency for s in stats])),
+                max_latency=max(s.max_latency for s in stats),
+                error=float(np.dot(weights, [s.error for s in stats])),
+                max_error=max(s.max_error for s in stats),
+            )
+        )
+    return pool
@@ -0,0 +1,4 @@
+class LinkLabException(Exception):
+    """Just to gather exceptions explicitly thrown in this package"""
+
+    pass
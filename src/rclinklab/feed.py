@@ -0,0 +1,181 @@
+"""Publish the packets of a running simulation in shared memory, for other local processes to consume.
+
+The shared memory block starts with a header followed by a ring buffer of records, all little endian:
+
+    header, HEADER_SIZE bytes
+        magic       8 bytes  b"RCLFEED1"
+        version     uint32   FEED_VERSION
+        channels    uint32
+        capacity    uint32   number of records in the ring
+        record_size uint32   bytes per record
+        written     uint64   number of records written so far
+    record n is at HEADER_SIZE + (n % capacity) * record_size
+        seq         uint64   n + 1
+        codec_id    uint32
+        ota_bits    uint32   length of the packet
+        tx_ts       int64    µs
+        rx_ts       int64    µs
+        latency     int64    µs, rx_ts - tx_ts
+        max_error   float64  over the channels
+        mean_error  float64
+        tx_fd       float64 * channels
+        rx_fd       float64 * channels
+        seq_end     uint64   n + 1, written last
+
+The writer invalidates seq_end, writes seq and the data, then seq_end and finally the written counter. A record is
+consistent if a copy of it has seq == seq_end == n + 1, otherwise the writer was busy with it or has wrapped around.
+There are no locks, so the simulation never waits for readers, and readers that fall behind lose records.
+"""
+
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from rclinklab.base import LinkLabException
+from rclinklab.simulate import LinkPacket, PacketListener
+
+MAGIC = b"RCLFEED1"
+FEED_VERSION = 1
+
+HEADER_SIZE = 64
+HEADER = np.dtype(
+    [
+        ("magic", "S8"),
+        ("version", "<u4"),
+        ("channels", "<u4"),
+        ("capacity", "<u4"),
+        ("record_size", "<u4"),
+        ("written", "<u8"),
+    ]
+)
+
+DEFAULT_CAPACITY = 4096
+
+
+def record_dtype(channels: int) -> np.dtype:
+    return np.dtype(
+        [
+            ("seq", "<u8"),
+            ("codec_id", "<u4"),
+            ("ota_bits", "<u4"),
+            ("tx_ts", "<i8"),
+            ("rx_ts", "<i8"),
+            ("latency", "<i8"),
+            ("max_error", "<f8"),
+            ("mean_error", "<f8"),
+            ("tx_fd", "<f8", (channels,)),
+            ("rx_fd", "<f8", (channels,)),
+            ("seq_end", "<u8"),
+        ]
+    )
+
+
+def _views(buffer: memoryview, channels: int, capacity: int) -> tuple[np.ndarray, np.ndarray]:
+    header: np.ndarray = np.ndarray((), dtype=HEADER, buffer=buffer)
+    records: np.ndarray = np.ndarray((capacity,), dtype=record_dtype(channels), buffer=buffer, offset=HEADER_SIZE)
+    return header, records
+
+
+class FeedWriter(PacketListener):
+    """Publishes every packet it gets, the name is generated if not given."""
+
+    def __init__(self, channels: int, name: str | None = None, capacity: int = DEFAULT_CAPACITY):
+        size = HEADER_SIZE + capacity * record_dtype(channels).itemsize
+        self.shm = SharedMemory(name=name, create=True, size=size)
+        self.name = self.shm.name
+        self.header, self.records = _views(self.shm.buf, channels, capacity)
+        self.header[()] = (MAGIC, FEED_VERSION, channels, capacity, self.records.itemsize, 0)
+        self.capacity = capacity
+        self.written = 0
+
+    def add(self, codec_id: int, packet: LinkPacket):
+        index = self.written % self.capacity
+        seq = self.written + 1
+        errors = np.abs(packet.rx_fd - packet.tx_fd)
+        self.records["seq_end"][index] = 0
+        # Everything but seq_end in one assignment, it is set when the rest is in place
+        self.records[index] = (
+            seq,
+            codec_id,
+            len(packet.ota_data),
+            packet.tx_ts,
+            packet.rx_ts,
+            packet.rx_ts - packet.tx_ts,
+            errors.max(),
+            errors.mean(),
+            packet.tx_fd,
+            packet.rx_fd,
+            0,
+        )
+        self.records["seq_end"][index] = seq
+        self.written = seq
+        self.header["written"] = seq
+
+    def close(self):
+        """Stop publishing and remove the shared memory, readers that are attached can still read it."""
+        del self.header, self.records
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class FeedReader:
+    """Follows a feed from another process.
+
+    >>> with FeedWriter(channels=2) as writer, FeedReader(writer.name) as reader:
+    ...     len(reader.read()), reader.channels
+    (0, 2)
+    """
+
+    def __init__(self, name: str):
+        self.shm = SharedMemory(name=name)
+        # Only the writer should remove the memory, but attaching registers it for removal at exit too
+        resource_tracker.unregister(self.shm._name, "shared_memory")  # type: ignore[attr-defined]
+        header: np.ndarray = np.ndarray((), dtype=HEADER, buffer=self.shm.buf)
+        if header["magic"] != MAGIC or header["version"] != FEED_VERSION:
+            # The view has to go before the memory can be closed
+            del header
+            self.shm.close()
+            raise LinkLabException(f"{name} is not a version {FEED_VERSION} feed")
+        self.channels = int(header["channels"])
+        self.capacity = int(header["capacity"])
+        self.header, self.records = _views(self.shm.buf, self.channels, self.capacity)
+        self.position = int(self.header["written"])  # start with new records
+        self.lost = 0
+
+    @property
+    def written(self) -> int:
+        return int(self.header["written"])
+
+    def read(self) -> np.ndarray:
+        """Copy the records written since the last read, as a structured array.
+
+        If the writer has overwritten records that were not read, they are counted in lost.
+        """
+        written = self.written
+        if written - self.position > self.capacity:
+            self.lost += written - self.capacity - self.position
+            self.position = written - self.capacity
+        positions = np.arange(self.position, written)
+        result = self.records[positions % self.capacity]  # fancy indexing copies
+        valid = (result["seq"] == positions + 1) & (result["seq_end"] == positions + 1)
+        # The oldest records can have been overwritten while copying, they are lost as well
+        self.lost += len(valid) - int(valid.sum())
+        self.position = written
+        return result[valid]
+
+    def close(self):
+        del self.header, self.records
+        self.shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,282 @@
+"""Models of what happens to packets on the air: loss, bit errors and bursts of them.
+
+The models decide the fate of a batch of packets for several independent runs, one per seed, at once, with
+vectorized draws from a numpy Generator. A Setup with an impairment uses them one packet at a time, monte_carlo
+simulates the transmitting side once and then lets each seed receive what got through, and smooth it if the setup
+does. With a CRC corrupted packets are dropped, otherwise they are delivered with the flipped bits.
+"""
+
+import copy
+from abc import ABC, abstractmethod
+from typing import Sequence
+
+import attrs
+import numpy as np
+from bitarray import bitarray
+
+from rclinklab.base import FD, ID, Codec, LinkLabException
+from rclinklab.simulate import Collector, LinkPacket, Setup
+
+# Number of packets decided at once by monte_carlo
+BATCH = 1 << 16
+
+
+def _no_flips() -> tuple[ID, ID, ID]:
+    return np.empty(0, dtype=np.int_), np.empty(0, dtype=np.int_), np.empty(0, dtype=np.int_)
+
+
+@attrs.define
+class Fate:
+    lost: np.ndarray  # bool, one row per seed and one column per packet
+    flips: tuple[ID, ID, ID] = attrs.field(factory=_no_flips)  # seed, packet and bit of every flipped bit
+
+
+class Impairment(ABC):
+    @abstractmethod
+    def apply(self, rng: np.random.Generator, lengths: ID, seeds: int) -> Fate:
+        """Decide the fate of packets with these lengths in bits, for each seed.
+
+        Consecutive calls continue where the previous left off, for models with state.
+        """
+
+
+def _bit_errors(rng: np.random.Generator, lengths: ID, counts: ID, crc: bool, contiguous: int | None = None) -> Fate:
+    """Flip counts[seed, packet] random bits, or with contiguous a burst of bits at a random position."""
+    seeds, packets = np.nonzero(counts)
+    if contiguous is None:
+        repeats = counts[seeds, packets]
+        seeds, packets = np.repeat(seeds, repeats), np.repeat(packets, repeats)
+        bits = (rng.random(len(packets)) * lengths[packets]).astype(np.int_)
+    else:
+        starts = (rng.random(len(packets)) * lengths[packets]).astype(np.int_)
+        seeds, packets = np.repeat(seeds, contiguous), np.repeat(packets, contiguous)
+        bits = np.repeat(starts, contiguous) + np.tile(np.arange(contiguous), len(starts))
+        # Each bit in the burst is random, so about half of them are flipped
+        keep = (bits < lengths[packets]) & (rng.random(len(bits)) < 0.5)
+        seeds, packets, bits = seeds[keep], packets[keep], bits[keep]
+    lost = np.zeros(counts.shape, dtype=np.bool_)
+    if crc:
+        lost[seeds, packets] = True
+        return Fate(lost)
+    return Fate(lost, (seeds, packets, bits))
+
+
+@attrs.define
+class Bernoulli(Impairment):
+    """Every packet is lost with the same probability"""
+
+    loss: float
+
+    def apply(self, rng: np.random.Generator, lengths: ID, seeds: int) -> Fate:
+        return Fate(rng.random((seeds, len(lengths))) < self.loss)
+
+
+@attrs.define
+class GilbertElliott(Impairment):
+    """Bursty loss, the link switches between a good and a bad state with different loss probabilities.
+
+    The states last a geometrically distributed number of packets, with the mean 1 / to_bad in the good state and
+    1 / to_good in the bad state.
+    """
+
+    to_bad: float
+    to_good: float
+    loss_good: float = 0.0
+    loss_bad: float = 1.0
+    bad: np.ndarray | None = attrs.field(default=None, eq=False, repr=False)  # the current state of each seed
+
+    def states(self, rng: np.random.Generator, seeds: int, packets: int) -> np.ndarray:
+        if self.bad is None or len(self.bad) != seeds:
+            self.bad = rng.random(seeds) < self.to_bad / (self.to_bad + self.to_good)
+        # Alternating runs of states, the first one continues the current state from before the first packet
+        runs = np.empty((seeds, 0), dtype=np.int_)
+        ends = np.full(seeds, -1)
+        while (ends < packets - 1).any():
+            count = int(packets * max(self.to_bad, self.to_good)) + 16
+            first = runs.shape[1]
+            parity = (np.arange(first, first + count) % 2).astype(np.bool_)
+            leave = np.where(self.bad[:, np.newaxis] ^ parity, self.to_good, self.to_bad)
+            runs = np.hstack([runs, rng.geometric(leave)])
+            ends = runs.sum(axis=1) - 1
+        # The packet where each run after the first starts
+        starts = np.cumsum(runs, axis=1) - 1
+        changes = np.zeros((seeds, packets + 1), dtype=np.int_)
+        rows = np.broadcast_to(np.arange(seeds)[:, np.newaxis], starts.shape)
+        inside = starts < packets
+        changes[rows[inside], starts[inside]] = 1
+        bad = self.bad[:, np.newaxis] ^ (np.cumsum(changes[:, :packets], axis=1) % 2 == 1)
+        self.bad = bad[:, -1] if packets else self.bad
+        return bad
+
+    def apply(self, rng: np.random.Generator, lengths: ID, seeds: int) -> Fate:
+        bad = self.states(rng, seeds, len(lengths))
+        return Fate(rng.random(bad.shape) < np.where(bad, self.loss_bad, self.loss_good))
+
+
+@attrs.define
+class BitErrors(Impairment):
+    """Independent bit flips with the bit error rate ber"""
+
+    ber: float
+    crc: bool = True
+
+    def apply(self, rng: np.random.Generator, lengths: ID, seeds: int) -> Fate:
+        return _bit_errors(rng, lengths, rng.binomial(lengths, self.ber, size=(seeds, len(lengths))), self.crc)
+
+    def __attrs_post_init__(self):
+        if not 0 <= self.ber <= 1:
+            raise LinkLabException(f"The bit error rate must be between 0 and 1, got {self.ber}")
+
+
+@attrs.define
+class Bursts(Impairment):
+    """A packet is hit by a burst of errors with some probability, randomizing length consecutive bits."""
+
+    probability: float
+    length: int
+    crc: bool = True
+
+    def apply(self, rng: np.random.Generator, lengths: ID, seeds: int) -> Fate:
+        hit = (rng.random((seeds, len(lengths))) < self.probability).astype(np.int_)
+        return _bit_errors(rng, lengths, hit, self.crc, contiguous=self.length)
+
+
+@attrs.define
+class Combined(Impairment):
+    """Several impairments at once, a packet is lost if any of them loses it"""
+
+    impairments: Sequence[Impairment]
+
+    def apply(self, rng: np.random.Generator, lengths: ID, seeds: int) -> Fate:
+        fates = [i.apply(rng, lengths, seeds) for i in self.impairments]
+        flips = tuple(np.concatenate([f.flips[i] for f in fates]) for i in range(3))
+        return Fate(np.logical_or.reduce([f.lost for f in fates]), flips)  # type: ignore[arg-type]
+
+
+def flip(ota_data: bitarray, bits: ID) -> bitarray:
+    """A copy with the bits inverted, a bit flipped twice is unchanged."""
+    result = ota_data.copy()
+    for bit in bits.tolist():
+        result.invert(bit)
+    return result
+
+
+def receive(codec: Codec, ota_data: bitarray) -> ID | None:
+    """Receive a packet that can have bit errors, None if the codec can't decode it."""
+    try:
+        return codec.receive(ota_data)
+    except LinkLabException:
+        return None
+
+
+@attrs.frozen
+class SeedStats:
+    """Errors and ages are sampled every time a packet would have arrived, the age is how long ago the data that
+    the receiver holds was sampled, in µs."""
+
+    seed: int
+    lost: int
+    corrupted: int  # delivered with bit errors
+    undecodable: int  # packets the codec couldn't decode, these are also counted as lost
+    mean_error: float
+    max_error: float
+    mean_age: float
+    max_age: float
+
+
+def _seed_stats(seed, lost, corrupted, undecodable, rx_fd: FD, tx_fd: FD, rx_ts: ID, tx_ts: ID) -> SeedStats:
+    # The receiver holds the latest delivered value, zeros before anything arrived
+    delivered = ~lost
+    latest = np.maximum.accumulate(np.where(delivered, np.arange(len(delivered)), -1))
+    held = np.vstack([np.zeros((1, tx_fd.shape[1])), rx_fd])[np.cumsum(delivered)]
+    errors = np.abs(held - tx_fd)
+    ages = np.where(latest >= 0, rx_ts - tx_ts[latest], rx_ts)
+    return SeedStats(
+        seed=seed,
+        lost=int(lost.sum()),
+        corrupted=corrupted,
+        undecodable=undecodable,
+        mean_error=float(errors.mean()),
+        max_error=float(errors.max()),
+        mean_age=float(ages.mean()),
+        max_age=float(ages.max()),
+    )
+
+
+def _receive_seed(codec: Codec, ota_data: list[bitarray], lost: np.ndarray, flips: dict[int, ID]):
+    """Receive the packets that are not lost, in batches between the corrupted ones."""
+    rx_id = np.zeros((len(ota_data), codec.channels), dtype=np.int_)
+    lost = lost.copy()
+    undecodable = 0
+    delivered = np.flatnonzero(~lost)
+    start = 0
+    for i in [*sorted(p for p in flips if not lost[p]), None]:
+        end = int(np.searchsorted(delivered, i)) if i is not None else len(delivered)
+        batch = delivered[start:end].tolist()
+        if batch:
+            # After a loss a codec can fail on intact packets too, then they are received one by one
+            snapshot = copy.deepcopy(codec)
+            try:
+                rx_id[batch] = codec.receive_batch([ota_data[p] for p in batch])
+            except LinkLabException:
+                codec = snapshot
+                for p in batch:
+                    value = receive(codec, ota_data[p])
+                    if value is None:
+                        lost[p] = True
+                        undecodable += 1
+                    else:
+                        rx_id[p] = value
+        if i is not None:
+            value = receive(codec, flip(ota_data[i], flips[i]))
+            if value is None:
+                lost[i] = True
+                undecodable += 1
+            else:
+                rx_id[i] = value
+        start = end + 1
+    return rx_id[~lost], lost, undecodable
+
+
+def monte_carlo(setup: Setup, impairment: Impairment, seeds: int = 100, seed: int = 0) -> dict[int, list[SeedStats]]:
+    """Simulate the setup once and receive it over the impaired link for each seed, returns stats per codec.
+
+    The results are reproducible for the same seed and number of seeds. The codecs of the setup are left as they
+    are after the simulation with a perfect link.
+    """
+    initial = copy.deepcopy(setup.codecs)
+    collector = Collector()
+    perfect = copy.copy(setup)
+    perfect.listeners = [collector]
+    perfect.impairment = None
+    perfect.run()
+
+    rng = np.random.default_rng(seed)
+    result = {}
+    for codec_id, codec in enumerate(initial):
+        packets: list[LinkPacket] = list(collector.packets[codec_id])
+        ota_data = [p.ota_data for p in packets]
+        lengths = np.array([len(d) for d in ota_data], dtype=np.int_)
+        model = copy.deepcopy(impairment)
+        fates = [model.apply(rng, lengths[i : i + BATCH], seeds) for i in range(0, len(lengths), BATCH)]
+        lost = np.hstack([f.lost for f in fates]) if fates else np.zeros((seeds, 0), dtype=np.bool_)
+        # All flips sorted by seed and packet
+        flipped = [np.concatenate([f.flips[i] + (i == 1) * BATCH * b for b, f in enumerate(fates)]) for i in range(3)]
+        order = np.lexsort((flipped[1], flipped[0]))
+        flip_seeds, flip_packets, flip_bits = (f[order] for f in flipped)
+        bounds = np.searchsorted(flip_seeds, np.arange(seeds + 1))
+        tx_fd = np.array([p.tx_fd for p in packets])
+        tx_ts = np.array([p.tx_ts for p in packets])
+        rx_ts = np.array([p.rx_ts for p in packets])
+        stats = []
+        for s in range(seeds):
+            packet_of, bit_of = flip_packets[bounds[s] : bounds[s + 1]], flip_bits[bounds[s] : bounds[s + 1]]
+            flips = {p: bit_of[packet_of == p] for p in np.unique(packet_of).tolist()}
+            rx_id, seed_lost, undecodable = _receive_seed(copy.deepcopy(codec), ota_data, lost[s], flips)
+            corrupted = sum(1 for p in flips if not seed_lost[p])
+            rx_fd = codec.dequantize(rx_id)
+            if setup.smoothing is not None:
+                rx_fd = setup.smoothing.apply(rx_ts[~seed_lost], rx_fd)
+            stats.append(_seed_stats(s, seed_lost, corrupted, undecodable, rx_fd, tx_fd, rx_ts, tx_ts))
+        result[codec_id] = stats
+    return result
@@ -0,0 +1,80 @@
+"""Run several links at once in realtime, for example a primary and a backup link at different bitrates.
+
+Every setup is a link with its own bit clock, run as an asyncio task. The tasks wait for their packets on a
+shared clock, so the links stay in step with each other. Sources used by several links are started once, and can
+read their input in the background. Listeners can be async, plain PacketListeners are adapted.
+"""
+
+import asyncio
+import contextlib
+from abc import ABC, abstractmethod
+from typing import Sequence
+
+from rclinklab import base
+from rclinklab.base import Realtime, TimeService, TxSource
+from rclinklab.simulate import Link, LinkPacket, PacketListener, Setup
+
+
+class AsyncPacketListener(ABC):
+    @abstractmethod
+    async def add(self, codec_id: int, packet: LinkPacket):
+        pass
+
+
+class ListenerAdapter(AsyncPacketListener):
+    def __init__(self, listener: PacketListener):
+        self.listener = listener
+
+    async def add(self, codec_id: int, packet: LinkPacket):
+        self.listener.add(codec_id, packet)
+
+
+def as_async(listener: PacketListener | AsyncPacketListener) -> AsyncPacketListener:
+    return listener if isinstance(listener, AsyncPacketListener) else ListenerAdapter(listener)
+
+
+class AsyncSimulator:
+    def __init__(self, setups: Sequence[Setup], time_service: TimeService | None = None):
+        """
+        Args:
+            setups: One per link, their own time services are not used.
+            time_service: The shared clock, realtime by default. In simulated time the links don't wait, so their
+                packets are interleaved but not in time order.
+        """
+        self.setups = setups
+        self.time_service = time_service or Realtime()
+
+    async def run(self):
+        with contextlib.ExitStack() as stack:
+            sources: dict[int, TxSource] = {}
+            for setup in self.setups:
+                if id(setup.source) not in sources:
+                    base.log.info(f"Starting link source {repr(setup.source)}")
+                    sources[id(setup.source)] = stack.enter_context(setup.source.start(self.time_service))
+            readers = [asyncio.ensure_future(s.read_async()) for s in sources.values()]
+            links = asyncio.gather(*(self._run_link(s, sources[id(s.source)]) for s in self.setups))
+            pending = {links, *readers}
+            try:
+                while not links.done():
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()  # raise the first error, readers that have nothing to do just finish
+            finally:
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _run_link(self, setup: Setup, source: TxSource):
+        listeners = [as_async(listener) for listener in setup.listeners or []]
+        link = Link(setup, source)
+        while not link.done:
+            await self.time_service.wait_until_async(link.next_rx_ts)
+            if received := link.step():
+                for listener in listeners:
+                    await listener.add(*received)
+        link.drain()
+
+
+def simulate(setups: Sequence[Setup], time_service: TimeService | None = None):
+    """Run the links until all of them reach their duration."""
+    asyncio.run(AsyncSimulator(setups, time_service).run())
@@ -0,0 +1,187 @@
+"""Search codec parameters for the best trade-off between latency and error on a source.
+
+Candidates are evaluated with successive halving: all of them are simulated for a short duration, the best
+1/eta by Pareto rank are simulated eta times longer, and so on until max_duration. Every evaluation is memoized, so
+repeated searches with the same optimizer only simulate new configurations. With a RunCache the simulations are
+also reused between processes. With rtol the simulations stop as soon as the means are known well enough. With
+smoothing the candidates are compared by the effective latency and error of what the flight controller uses. The
+source is resampled once per bitrate into a Timeline shared by all candidates.
+"""
+
+import itertools
+import math
+from typing import Any, Sequence
+
+import attrs
+
+from rclinklab.base import Codec, TxSource
+from rclinklab.cache import RunCache
+from rclinklab.codecs.delta import DeltaCodec
+from rclinklab.codecs.linear_delta import LinearDeltaCodec
+from rclinklab.codecs.raw import RawCodec
+from rclinklab.codecs.rice import RiceCodec
+from rclinklab.columns import to_columns
+from rclinklab.convergence import Convergence
+from rclinklab.simulate import DEFAULT_BITRATE, Collector, RollingStatsCollector, Setup
+from rclinklab.smoothing import Smoothing, effective
+from rclinklab.timeline import Timeline
+
+
+@attrs.frozen
+class Candidate:
+    codec: type[Codec]
+    params: tuple[tuple[str, Any], ...]
+    bitrate: int = DEFAULT_BITRATE
+
+    def create(self, channels: int) -> Codec:
+        return self.codec(channels=channels, **dict(self.params))  # type: ignore[call-arg]
+
+    def __str__(self):
+        params = ", ".join(f"{k}={v}" for k, v in self.params)
+        return f"{self.codec.__name__}({params}) @ {self.bitrate} bit/s"
+
+
+@attrs.frozen
+class Evaluation:
+    candidate: Candidate
+    duration: int
+    latency: float
+    error: float
+    effective_duration: int | None = None  # shorter than duration if the stats converged
+
+    def dominates(self, other: "Evaluation") -> bool:
+        not_worse = self.latency <= other.latency and self.error <= other.error
+        return not_worse and (self.latency < other.latency or self.error < other.error)
+
+
+def grid(codec: type[Codec], bitrates: Sequence[int] = (DEFAULT_BITRATE,), **params: Sequence) -> list[Candidate]:
+    """Create candidates for all combinations of the parameter values.
+
+    >>> from rclinklab.codecs.raw import RawCodec
+    >>> [str(c) for c in grid(RawCodec, bits=[8, 10])]
+    ['RawCodec(bits=8) @ 20000 bit/s', 'RawCodec(bits=10) @ 20000 bit/s']
+    """
+    names = sorted(params)
+    return [
+        Candidate(codec=codec, params=tuple(zip(names, values)), bitrate=bitrate)
+        for bitrate in bitrates
+        for values in itertools.product(*(params[n] for n in names))
+    ]
+
+
+def default_candidates(bitrates: Sequence[int] = (DEFAULT_BITRATE,)) -> list[Candidate]:
+    return [
+        *grid(RawCodec, bitrates, bits=range(6, 13)),
+        *grid(DeltaCodec, bitrates, bits=[8, 10, 12], delta_bits=range(3, 9)),
+        *grid(LinearDeltaCodec, bitrates, bits=[8, 10, 12], delta_bits=range(3, 9)),
+        *grid(RiceCodec, bitrates, bits=[8, 10, 12]),
+    ]
+
+
+def pareto_ranks(evaluations: Sequence[Evaluation]) -> list[int]:
+    """Rank by non-dominated sorting, 0 is the Pareto front, 1 is the front when that is removed and so on."""
+    ranks = [-1] * len(evaluations)
+    rank = 0
+    while -1 in ranks:
+        remaining = [i for i, r in enumerate(ranks) if r == -1]
+        for i in remaining:
+            if not any(evaluations[j].dominates(evaluations[i]) for j in remaining):
+                ranks[i] = rank
+        rank += 1
+    return ranks
+
+
+def pareto_front(evaluations: Sequence[Evaluation]) -> list[Evaluation]:
+    front = [e for e, rank in zip(evaluations, pareto_ranks(evaluations)) if rank == 0]
+    return sorted(front, key=lambda e: e.latency)
+
+
+def best(evaluations: Sequence[Evaluation], count: int) -> list[Evaluation]:
+    """Select by Pareto rank, breaking ties by the sum of the latency and error ranks."""
+    ranks = pareto_ranks(evaluations)
+    by_latency = sorted(range(len(evaluations)), key=lambda i: evaluations[i].latency)
+    by_error = sorted(range(len(evaluations)), key=lambda i: evaluations[i].error)
+    score = {i: by_latency.index(i) + by_error.index(i) for i in range(len(evaluations))}
+    order = sorted(range(len(evaluations)), key=lambda i: (ranks[i], score[i]))
+    return [evaluations[i] for i in order[:count]]
+
+
+class Optimizer:
+    def __init__(
+        self,
+        source: TxSource,
+        min_duration: int = 250_000,
+        max_duration: int = 3_000_000,
+        eta: int = 3,
+        cache: RunCache | None = None,
+        rtol: float | None = None,
+        smoothing: Smoothing | None = None,
+    ):
+        """
+        Args:
+            rtol: Stop simulations early when the confidence intervals of the means are within this fraction.
+            smoothing: Smooth the received values, the candidates are then compared by the effective latency and
+                error.
+        """
+        self.source = source
+        self.min_duration = min_duration
+        self.max_duration = max_duration
+        self.eta = eta
+        self.cache = cache
+        self.rtol = rtol
+        self.smoothing = smoothing
+        self.memo: dict[tuple[Candidate, int], Evaluation] = {}
+        self.timelines: dict[int, Timeline] = {}
+
+    def durations(self) -> list[int]:
+        rungs = max(1, math.ceil(math.log(self.max_duration / self.min_duration, self.eta)) + 1)
+        return [min(self.min_duration * self.eta**i, self.max_duration) for i in range(rungs)]
+
+    def timeline(self, bitrate: int) -> Timeline:
+        if bitrate not in self.timelines:
+            self.timelines[bitrate] = Timeline.create(self.source, bitrate, self.max_duration)
+        return self.timelines[bitrate]
+
+    def evaluate(self, candidate: Candidate, duration: int) -> Evaluation:
+        key = (candidate, duration)
+        if key not in self.memo:
+            collector = RollingStatsCollector(time_limit=duration)
+            packets = Collector()  # the effective metrics need all packets
+            convergence = None
+            if self.rtol is not None:
+                convergence = Convergence(rtol=self.rtol, min_duration=min(self.min_duration, duration))
+            setup = Setup(
+                source=self.timeline(candidate.bitrate),
+                codecs=[candidate.create(self.source.channels)],
+                listeners=[collector] if self.smoothing is None else [packets],
+                bitrate=candidate.bitrate,
+                duration=duration,
+                cache=self.cache,
+                convergence=convergence,
+                smoothing=self.smoothing,
+            )
+            setup.run()
+            if self.smoothing is None:
+                stats = collector.stats(0)
+                latency, error = stats.latency.mean, stats.fd_error.mean
+            else:
+                columns = to_columns(packets.packets[0])
+                result = effective(columns["tx_ts"], columns["tx_fd"], columns["rx_ts"], columns["rx_fd"])
+                latency, error = result.latency, result.error
+            self.memo[key] = Evaluation(
+                candidate,
+                duration,
+                latency=latency,
+                error=error,
+                effective_duration=duration if convergence is None else convergence.effective_duration,
+            )
+        return self.memo[key]
+
+    def search(self, candidates: Sequence[Candidate]) -> list[Evaluation]:
+        """Successive halving, returns the Pareto front of the candidates that made it to max_duration."""
+        survivors = list(candidates)
+        evaluations: list[Evaluation] = []
+        for duration in self.durations():
+            evaluations = [self.evaluate(c, duration) for c in survivors]
+            survivors = [e.candidate for e in best(evaluations, max(1, math.ceil(len(survivors) / self.eta)))]
+        return pareto_front(evaluations)
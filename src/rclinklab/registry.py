@@ -0,0 +1,140 @@
+"""Codecs and sources by name, so that the CLI only imports the modules that are actually used.
+
+Entries are "module:attribute" references, resolved on first use. Other packages can add codecs and sources by
+declaring entry points in the groups "rclinklab.codecs", "rclinklab.sources", "rclinklab.schedules",
+"rclinklab.transforms" and "rclinklab.smoothing", for example in pyproject.toml:
+
+    [tool.poetry.plugins."rclinklab.codecs"]
+    mycodec = "mypackage.codecs:MyCodec"
+
+On the command line they are selected with a spec, the name optionally followed by keyword arguments, like
+"delta:bits=10,delta_bits=5".
+"""
+
+import ast
+import importlib
+import inspect
+from importlib.metadata import entry_points
+from typing import Any, Callable
+
+from rclinklab.exceptions import LinkLabException
+
+CODEC_GROUP = "rclinklab.codecs"
+SOURCE_GROUP = "rclinklab.sources"
+SCHEDULE_GROUP = "rclinklab.schedules"
+TRANSFORM_GROUP = "rclinklab.transforms"
+SMOOTHING_GROUP = "rclinklab.smoothing"
+
+
+def parse_spec(spec: str) -> tuple[str, dict[str, Any]]:
+    """Split a spec into the name and the keyword arguments, values are python literals or else strings.
+
+    >>> parse_spec("delta:bits=10,delta_bits=5")
+    ('delta', {'bits': 10, 'delta_bits': 5})
+    >>> parse_spec("blackbox:path=logs/flight.csv")
+    ('blackbox', {'path': 'logs/flight.csv'})
+    >>> parse_spec("raw")
+    ('raw', {})
+    """
+    name, _, arguments = spec.partition(":")
+    params: dict[str, Any] = {}
+    for argument in filter(None, arguments.split(",")):
+        key, separator, value = argument.partition("=")
+        if not separator or not key.strip().isidentifier():
+            raise LinkLabException(f"Expected key=value in {spec!r}, got {argument!r}")
+        try:
+            params[key.strip()] = ast.literal_eval(value.strip())
+        except (ValueError, SyntaxError):
+            params[key.strip()] = value.strip()
+    return name.strip(), params
+
+
+class Registry:
+    def __init__(self, group: str, builtins: dict[str, str]):
+        self.group = group
+        self.builtins = builtins
+
+    def _references(self) -> dict[str, str]:
+        # Reading entry points only looks at package metadata, nothing is imported
+        plugins = {e.name: e.value for e in entry_points(group=self.group)}
+        return {**plugins, **self.builtins}
+
+    def names(self) -> list[str]:
+        return sorted(self._references())
+
+    def load(self, name: str) -> Callable[..., Any]:
+        references = self._references()
+        if name not in references:
+            raise LinkLabException(
+                f"Unknown name {name!r} in {self.group}, choose from {', '.join(sorted(references))}"
+            )
+        module_name, _, attribute = references[name].partition(":")
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError as e:
+            raise LinkLabException(f"{name!r} in {self.group} needs {e.name}, which could not be imported") from e
+        return getattr(module, attribute)
+
+    def create(self, spec: str, **defaults: Any) -> Any:
+        """Create an instance from a spec. Defaults are only passed on if the factory takes them."""
+        name, params = parse_spec(spec)
+        factory = self.load(name)
+        accepted = inspect.signature(factory).parameters
+        params = {**{k: v for k, v in defaults.items() if k in accepted}, **params}
+        try:
+            return factory(**params)
+        except TypeError as e:
+            raise LinkLabException(f"Can't create {spec!r}: {e}") from e
+
+
+codecs = Registry(
+    CODEC_GROUP,
+    {
+        "raw": "rclinklab.codecs.raw:RawCodec",
+        "delta": "rclinklab.codecs.delta:DeltaCodec",
+        "linear_delta": "rclinklab.codecs.linear_delta:LinearDeltaCodec",
+        "quadratic_delta": "rclinklab.codecs.quadratic_delta:QuadraticDeltaCodec",
+        "rice": "rclinklab.codecs.rice:RiceCodec",
+        "round_robin": "rclinklab.codecs.groups:round_robin",
+    },
+)
+
+sources = Registry(
+    SOURCE_GROUP,
+    {
+        "sine": "rclinklab.sources.functions:SineSource",
+        "joystick": "rclinklab.sources.joystick:JoystickTxSource",
+        "blackbox": "rclinklab.sources.blackbox:parse",
+    },
+)
+
+schedules = Registry(
+    SCHEDULE_GROUP,
+    {
+        "back_to_back": "rclinklab.schedule:BackToBack",
+        "fixed_rate": "rclinklab.schedule:FixedRate",
+        "rate_with_deadline": "rclinklab.schedule:RateWithDeadline",
+    },
+)
+
+transforms = Registry(
+    TRANSFORM_GROUP,
+    {
+        "offset": "rclinklab.sources.transforms:Offset",
+        "resample": "rclinklab.sources.transforms:Resample",
+        "quantize": "rclinklab.sources.transforms:Quantize",
+        "lowpass": "rclinklab.sources.transforms:LowPass",
+        "rate_limit": "rclinklab.sources.transforms:RateLimit",
+        "noise": "rclinklab.sources.transforms:Noise",
+    },
+)
+
+smoothing = Registry(
+    SMOOTHING_GROUP,
+    {
+        "pt1": "rclinklab.smoothing:PT1",
+        "pt2": "rclinklab.smoothing:PT2",
+        "pt3": "rclinklab.smoothing:PT3",
+        "feed_forward": "rclinklab.smoothing:FeedForward",
+    },
+)
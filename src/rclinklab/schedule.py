@@ -0,0 +1,130 @@
+"""When each codec sends its packets, and for how long they are on the air.
+
+Positions are in bits since the start, like everywhere in the simulator. Each codec has the link to itself, so the
+schedule only depends on its own previous packet. start and airtime are used packet by packet by the simulator,
+times gives the timing of a whole sequence of packets with known lengths at once.
+"""
+
+import math
+from abc import ABC, abstractmethod
+
+import attrs
+import numpy as np
+
+from rclinklab.base import ID, LinkLabException
+
+
+class Schedule(ABC):
+    def check(self, bitrate: int):
+        """Raise a LinkLabException if the schedule is impossible at the bitrate"""
+        pass
+
+    @abstractmethod
+    def start(self, previous: int | None, position: int, bitrate: int) -> int:
+        """Where the next packet starts, when the previous one started at previous and was received at position"""
+
+    @abstractmethod
+    def airtime(self, length: int, bitrate: int) -> int:
+        """Number of bits between the start of a packet of length bits and when it is received"""
+
+    def times(self, lengths: ID, bitrate: int) -> tuple[ID, ID]:
+        """The start and receive positions of consecutive packets with these lengths, starting from 0"""
+        starts = np.empty(len(lengths), dtype=np.int_)
+        ends = np.empty(len(lengths), dtype=np.int_)
+        previous, position = None, 0
+        for i, length in enumerate(lengths.tolist()):
+            previous = starts[i] = self.start(previous, position, bitrate)
+            position = ends[i] = previous + self.airtime(length, bitrate)
+        return starts, ends
+
+
+@attrs.frozen
+class BackToBack(Schedule):
+    """Each packet starts when the previous one is received, and is only as long as its data"""
+
+    def start(self, previous: int | None, position: int, bitrate: int) -> int:
+        return position
+
+    def airtime(self, length: int, bitrate: int) -> int:
+        return length
+
+    def times(self, lengths: ID, bitrate: int) -> tuple[ID, ID]:
+        ends = np.cumsum(lengths)
+        return ends - lengths, ends
+
+
+def _slot_start(slot, period: float):
+    return np.rint(slot * period).astype(np.int_)
+
+
+def _slot(position: int, period: float) -> int:
+    """The first slot starting at or after position"""
+    slot = math.floor(position / period)
+    return slot + 1 if round(slot * period) < position else slot
+
+
+def _latest_slot(position: int, period: float) -> int:
+    """The last slot starting at or before position"""
+    slot = _slot(position, period)
+    return slot if round(slot * period) == position else slot - 1
+
+
+@attrs.frozen
+class FixedRate(Schedule):
+    """Packets are sent in frames of max_payload bits at rate frames per second, padded if shorter.
+
+    Longer packets are split over as many frames as needed, in consecutive slots.
+    """
+
+    rate: float
+    max_payload: int
+
+    def _period(self, bitrate: int) -> float:
+        return bitrate / self.rate
+
+    def _frames(self, length):
+        return np.maximum(1, -(-np.asarray(length) // self.max_payload))
+
+    def check(self, bitrate: int):
+        if self.max_payload > self._period(bitrate):
+            raise LinkLabException(f"A frame of {self.max_payload} bits doesn't fit in a slot at {bitrate} bit/s")
+
+    def start(self, previous: int | None, position: int, bitrate: int) -> int:
+        period = self._period(bitrate)
+        return int(_slot_start(_slot(position, period), period))
+
+    def airtime(self, length: int, bitrate: int) -> int:
+        return round((int(self._frames(length)) - 1) * self._period(bitrate)) + self.max_payload
+
+    def times(self, lengths: ID, bitrate: int) -> tuple[ID, ID]:
+        period = self._period(bitrate)
+        frames = self._frames(lengths)
+        slots = np.cumsum(frames) - frames
+        starts = _slot_start(slots, period)
+        return starts, starts + np.rint((frames - 1) * period).astype(np.int_) + self.max_payload
+
+
+@attrs.frozen
+class RateWithDeadline(Schedule):
+    """A packet is due at rate packets per second, and only as long as its data.
+
+    If the previous packet is still on the air when the next is due, that one is sent as soon as possible if it's
+    at most deadline µs late, otherwise it waits for the next slot.
+    """
+
+    rate: float
+    deadline: int
+
+    def start(self, previous: int | None, position: int, bitrate: int) -> int:
+        period = bitrate / self.rate
+        due = 0 if previous is None else _latest_slot(previous, period) + 1
+        if position <= _slot_start(due, period):
+            return int(_slot_start(due, period))
+        # Slots that have passed completely while the previous packet was on the air are skipped
+        latest = _latest_slot(position, period)
+        if position - _slot_start(latest, period) <= self.deadline * bitrate / 1_000_000:
+            return position
+        return int(_slot_start(latest + 1, period))
+
+    def airtime(self, length: int, bitrate: int) -> int:
+        return length
@@ -1,16 +1,26 @@
+import copy
 import math
+import time
 from abc import ABC, abstractmethod
 from collections import defaultdict, deque
 from statistics import mean
+from typing import TYPE_CHECKING, Any
 
 import attrs
+import numpy as np
 from bitarray import bitarray
 
-from rclinklab.converters import f2i_s, i2f_s
-
 from . import base
 from .base import FD, ID, Codec, SimulatedTime, TimeService, TxSource
-from .stats import BasicStats, Stats
+from .schedule import BackToBack, Schedule
+from .stats import BasicStats, Breakdown, Stats
+
+if TYPE_CHECKING:
+    from .cache import RunCache, RunResult
+    from .checkpoint import Checkpoint
+    from .convergence import Convergence
+    from .impairments import Impairment
+    from .smoothing import Smoothing
 
 DEFAULT_BITRATE = 20_000  # bits per second
 
@@ -27,11 +37,17 @@ class TxData:
     tx_fd: FD
     tx_id: ID
     ota_data: bitarray
+    input_age: int = 0  # how old the input sampled at tx_ts was, in µs
 
 
 @attrs.define(init=False)
 class LinkPacket:
-    """Represents everything about a packet sent across the link, including the time"""
+    """Represents everything about a packet sent across the link, including the time.
+
+    The latency from the input to the flight controller is broken down in stages, all in µs: the input_age of the
+    sampled input at tx_ts, then rx_ts - tx_ts, which is the slot_wait when the schedule keeps the packet from the
+    air plus the airtime of its bits, and the decode time of the receiver.
+    """
 
     tx_ts: int
     tx_fd: FD
@@ -40,8 +56,12 @@ class LinkPacket:
     rx_id: ID
     rx_fd: FD
     rx_ts: int
+    input_age: int
+    slot_wait: int
+    airtime: int
+    decode: int
 
-    def __init__(self, tx_data: TxData, rx_ts, rx_id, rx_fd):
+    def __init__(self, tx_data: TxData, rx_ts, rx_id, rx_fd, airtime=None, decode=0):
         self.tx_ts = tx_data.tx_ts
         self.tx_fd = tx_data.tx_fd
         self.tx_id = tx_data.tx_id
@@ -49,6 +69,23 @@ class LinkPacket:
         self.rx_ts = rx_ts
         self.rx_id = rx_id
         self.rx_fd = rx_fd
+        self.input_age = tx_data.input_age
+        self.airtime = rx_ts - tx_data.tx_ts if airtime is None else airtime
+        self.slot_wait = rx_ts - tx_data.tx_ts - self.airtime
+        self.decode = decode
+
+    @property
+    def end_to_end(self) -> int:
+        """The latency from the input to the decoded values, in µs"""
+        return self.input_age + self.rx_ts - self.tx_ts + self.decode
+
+    @classmethod
+    def from_fields(cls, **fields) -> "LinkPacket":
+        """Recreate a packet from its fields, for example when loaded from storage."""
+        packet = cls.__new__(cls)
+        for name, value in fields.items():
+            setattr(packet, name, value)
+        return packet
 
 
 class PacketListener(ABC):
@@ -76,6 +113,7 @@ class PacketMetric:
     latency: int
     max_error: float
     mean_error: float
+    breakdown: tuple[int, int, int, int]  # input_age, slot_wait, airtime and decode
 
 
 class RollingStatsCollector(PacketListener):
@@ -85,7 +123,13 @@ class RollingStatsCollector(PacketListener):
 
     def add(self, codec_id: int, p: LinkPacket):
         errors = abs(p.rx_fd - p.tx_fd)
-        pm = PacketMetric(rx_ts=p.rx_ts, latency=(p.rx_ts - p.tx_ts), max_error=max(errors), mean_error=mean(errors))
+        pm = PacketMetric(
+            rx_ts=p.rx_ts,
+            latency=(p.rx_ts - p.tx_ts),
+            max_error=max(errors),
+            mean_error=mean(errors),
+            breakdown=(p.input_age, p.slot_wait, p.airtime, p.decode),
+        )
         self.metrics[codec_id].append(pm)
 
     def stats(self, codec_id) -> Stats:
@@ -97,14 +141,18 @@ class RollingStatsCollector(PacketListener):
                 break
         sum_latency = max_latency = 0
         sum_error = max_error = 0.0
+        sum_breakdown = [0, 0, 0, 0]
         for pm in codec_metrics:
             sum_latency += pm.latency
             max_latency = max(max_latency, pm.latency)
             sum_error += pm.mean_error
             max_error = max(max_error, pm.max_error)
+            for i, value in enumerate(pm.breakdown):
+                sum_breakdown[i] += value
         stats = Stats()
         stats.latency = BasicStats(max_latency, sum_latency / len(codec_metrics))
         stats.fd_error = BasicStats(max_error, sum_error / len(codec_metrics))
+        stats.breakdown = Breakdown(*(s / len(codec_metrics) for s in sum_breakdown))
         return stats
 
 
@@ -117,6 +165,14 @@ class Setup:
         bitrate: int = DEFAULT_BITRATE,
         duration: int | None = None,
         time_service: TimeService = SimulatedTime(),
+        cache: "RunCache | None" = None,
+        impairment: "Impairment | None" = None,
+        seed: int = 0,
+        schedule: Schedule = BackToBack(),
+        convergence: "Convergence | None" = None,
+        smoothing: "Smoothing | None" = None,
+        measure_decode: bool = False,
+        checkpoint: "Checkpoint | None" = None,
     ):
         self.source: TxSource = source  # type: ignore
         self.codecs: list[Codec] = codecs  # type: ignore
@@ -124,9 +180,23 @@ class Setup:
         self.bitrate: int = bitrate
         self.duration: int = duration  # type: ignore
         self.time_service: TimeService = time_service
-
-    def run(self):
+        self.cache = cache
+        self.impairment = impairment
+        self.seed = seed  # for the impairment
+        self.schedule = schedule
+        self.convergence = convergence  # stops the run before the duration when the stats have converged
+        self.smoothing = smoothing  # of the received values, rx_fd is what the flight controller uses
+        self.measure_decode = measure_decode  # the CPU time of receive, otherwise decoding takes no time
+        self.checkpoint = checkpoint  # snapshots of the state to resume an interrupted run from
+
+    def run(self) -> "RunResult | None":
+        """Run the simulation, with a cache the result is also returned."""
+        if self.convergence is not None:
+            self.convergence.reset()
+        if self.cache is not None:
+            return self.cache.run(self)
         Simulator.simulate(self)
+        return None
 
 
 class TransmitQueue:
@@ -136,8 +206,8 @@ class TransmitQueue:
     def next(self) -> tuple[int, TxData]:
         return self.queue.pop(0)
 
-    def transmit(self, data: TxData):
-        self.queue.append((data.start + len(data.ota_data), data))
+    def transmit(self, data: TxData, airtime: int):
+        self.queue.append((data.start + airtime, data))
         self.queue.sort(key=lambda e: e[0])
 
 
@@ -147,15 +217,15 @@ class Simulator:
         codec = setup.codecs[codec_id]
         tx_ts = bits_to_ts(start, setup.bitrate)
         tx_fd = source(tx_ts)
-        tx_id = f2i_s(tx_fd, codec.bits)
+        tx_id = codec.quantize(tx_fd)
         ota_data = codec.transmit(tx_id)
-        return TxData(codec_id, start, tx_ts, tx_fd, tx_id, ota_data)
+        return TxData(codec_id, start, tx_ts, tx_fd, tx_id, ota_data, input_age=source.age(tx_ts))
 
     @staticmethod
     def _receive(tx_data: TxData, setup):
         codec = setup.codecs[tx_data.codec_id]
         rx_id = codec.receive(tx_data.ota_data)
-        rx_fd = i2f_s(rx_id, codec.bits)
+        rx_fd = codec.dequantize(rx_id)
         return rx_id, rx_fd
 
     @staticmethod
@@ -167,25 +237,142 @@ class Simulator:
     def simulate(cls, setup: Setup):
         base.log.info(f"Starting simulation using {repr(setup.source)}")
 
-        duration_in_bits = setup.duration and math.ceil((setup.bitrate * setup.duration) / 1_000_000)
-        position = 0  # track position in the bitstream
-
-        queue = TransmitQueue()
-
         with setup.source.start(setup.time_service) as source:
-            # Transmit for each codec at position = 0, seeding the queue
-            for codec_id, _ in enumerate(setup.codecs):
-                queue.transmit(cls._transmit(position, source, codec_id, setup))
-            while True:
-                position, tx_data = queue.next()
-                rx_ts = bits_to_ts(position, setup.bitrate)
-                setup.time_service.wait_until(rx_ts)
-                rx_id, rx_fd = cls._receive(tx_data, setup)
-                cls._notify_listeners(
-                    tx_data.codec_id, LinkPacket(tx_data, rx_ts=rx_ts, rx_id=rx_id, rx_fd=rx_fd), setup
-                )
-
-                if duration_in_bits is not None and position >= duration_in_bits:
-                    break
-
-                queue.transmit(cls._transmit(position, source, tx_data.codec_id, setup))
+            link = Link(setup, source)
+            if setup.checkpoint is not None:
+                setup.checkpoint.resume(link)
+            while not link.done:
+                setup.time_service.wait_until(link.next_rx_ts)
+                if received := link.step():
+                    cls._notify_listeners(*received, setup)
+                if setup.checkpoint is not None:
+                    setup.checkpoint.step(link)
+            link.drain()
+        if setup.checkpoint is not None:
+            setup.checkpoint.finish()
+
+
+class Link:
+    """The state of a running simulation of a setup, advanced one received packet at a time.
+
+    This is shared by the engines, which decide when to step and who to tell about the packets.
+    """
+
+    def __init__(self, setup: Setup, source: TxSource):
+        self.setup = setup
+        self.source = source
+        self.duration_in_bits = setup.duration and math.ceil((setup.bitrate * setup.duration) / 1_000_000)
+        self.position = 0  # track position in the bitstream
+        self.queue = TransmitQueue()
+        self.done = False
+        self.impairment = copy.deepcopy(setup.impairment)  # the models can have state
+        self.rng = np.random.default_rng(setup.seed)
+        self.smoothers = None
+        if setup.smoothing is not None:
+            self.smoothers = [setup.smoothing.start(codec.channels) for codec in setup.codecs]
+        setup.schedule.check(setup.bitrate)
+        # Transmit for each codec at position = 0, seeding the queue
+        for codec_id, _ in enumerate(setup.codecs):
+            self._transmit(None, codec_id)
+
+    @property
+    def next_rx_ts(self) -> int:
+        """When the next packet has been received"""
+        return bits_to_ts(self.queue.queue[0][0], self.setup.bitrate)
+
+    def step(self) -> tuple[int, LinkPacket] | None:
+        """Receive the next packet, and unless the run is done, start transmitting the next one of the codec.
+
+        Returns None if the packet was lost.
+        """
+        self.position, tx_data = self.queue.next()
+        rx_ts = bits_to_ts(self.position, self.setup.bitrate)
+        ota_data = self._impaired(tx_data) if self.impairment is not None else tx_data.ota_data
+        received, decode = None, 0
+        if ota_data is not None:
+            # Only the receiver is timed, not the impairment model
+            begin = time.perf_counter_ns() if self.setup.measure_decode else 0
+            received = self._decode(tx_data.codec_id, ota_data)
+            decode = round((time.perf_counter_ns() - begin) / 1000) if self.setup.measure_decode else 0
+        packet = None
+        if received is not None:
+            rx_id, rx_fd = received
+            if self.smoothers is not None:
+                rx_fd = self.smoothers[tx_data.codec_id].step(rx_ts, rx_fd)
+            # The rest of rx_ts - tx_ts is spent waiting for slots, by schedules with padding or gaps
+            airtime = bits_to_ts(tx_data.start + len(tx_data.ota_data), self.setup.bitrate) - tx_data.tx_ts
+            packet = LinkPacket(tx_data, rx_ts=rx_ts, rx_id=rx_id, rx_fd=rx_fd, airtime=airtime, decode=decode)
+            if self.setup.convergence is not None:
+                self.setup.convergence.add(tx_data.codec_id, packet)
+        if self.duration_in_bits is not None and self.position >= self.duration_in_bits:
+            self.done = True
+        elif self.setup.convergence is not None and self.setup.convergence.converged:
+            self.done = True
+        else:
+            self._transmit(tx_data.start, tx_data.codec_id)
+        return None if packet is None else (tx_data.codec_id, packet)
+
+    def _transmit(self, previous: int | None, codec_id: int):
+        schedule, bitrate = self.setup.schedule, self.setup.bitrate
+        start = schedule.start(previous, self.position, bitrate)
+        if self.duration_in_bits is not None and start >= self.duration_in_bits:
+            # A slot after the end, where a Timeline has no data, the run ends when nothing is left on the air
+            self.done = not self.queue.queue
+            return
+        tx_data = Simulator._transmit(start, self.source, codec_id, self.setup)
+        self.queue.transmit(tx_data, schedule.airtime(len(tx_data.ota_data), bitrate))
+
+    def _impaired(self, tx_data: TxData) -> bitarray | None:
+        """The packet as received with the bit errors of the impairment, None if it was lost"""
+        from .impairments import flip
+
+        fate = self.impairment.apply(self.rng, np.array([len(tx_data.ota_data)]), 1)  # type: ignore[union-attr]
+        if fate.lost[0, 0]:
+            return None
+        return flip(tx_data.ota_data, fate.flips[2])
+
+    def _decode(self, codec_id: int, ota_data: bitarray) -> tuple[ID, FD] | None:
+        """The received values, None if bit errors made the packet undecodable"""
+        from .impairments import receive
+
+        codec = self.setup.codecs[codec_id]
+        rx_id = codec.receive(ota_data) if self.impairment is None else receive(codec, ota_data)
+        return None if rx_id is None else (rx_id, codec.dequantize(rx_id))
+
+    def snapshot(self) -> dict[str, Any]:
+        """Everything that changes during the run, including the codecs, listeners and convergence of the setup"""
+        return {
+            "position": self.position,
+            "queue": self.queue.queue,
+            "done": self.done,
+            "impairment": self.impairment,
+            "rng": self.rng,
+            "smoothers": self.smoothers,
+            "source": self.source,
+            "codecs": self.setup.codecs,
+            "listeners": self.setup.listeners or [],
+            "convergence": self.setup.convergence,
+        }
+
+    def restore(self, state: dict[str, Any]):
+        """Continue from a snapshot. The objects of the setup are updated in place, so references to them stay valid.
+
+        Objects that hold more than their attributes, like threads or files, restore themselves with restore_state.
+        """
+        self.position, self.queue.queue, self.done = state["position"], state["queue"], state["done"]
+        self.impairment, self.rng, self.smoothers = state["impairment"], state["rng"], state["smoothers"]
+        self.source = state["source"]
+        targets = [*self.setup.codecs, *(self.setup.listeners or []), self.setup.convergence]
+        for target, saved in zip(targets, [*state["codecs"], *state["listeners"], state["convergence"]]):
+            if target is None:
+                continue
+            if (restore_state := getattr(target, "restore_state", None)) is not None:
+                restore_state(saved)
+            else:
+                vars(target).update(vars(saved))
+
+    def drain(self):
+        """Let the codecs receive the packets still in the air, so their rx state matches the tx state if reused"""
+        for _, tx_data in self.queue.queue:
+            Simulator._receive(tx_data, self.setup)
+        self.queue.queue.clear()
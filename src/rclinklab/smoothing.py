@@ -0,0 +1,186 @@
+"""RC smoothing on the receiving side, like a flight controller filters the received commands.
+
+The flight controller runs its loop rate times per second and uses the latest received value in every iteration,
+so the filters run on that grid with the received values held in between. A packet is visible at the first loop
+iteration at or after it was received, and its smoothed value is the filter output there. The filters are linear,
+so a whole received stream is smoothed with one lfilter call over the grid, and a Smoother does the same one packet
+at a time for the simulator.
+
+Smoothing trades the steps of coarse codecs for delay. effective measures both against the source: the delay is the
+lag that maximizes the cross-correlation of the received signal with the transmitted one.
+"""
+
+import math
+from abc import ABC, abstractmethod
+from typing import ClassVar
+
+import attrs
+import numpy as np
+
+from rclinklab.base import FD, ID, LinkLabException
+
+# Loop rate of the flight controller, in iterations per second
+DEFAULT_RATE = 1000.0
+
+
+def _pt1(cutoff: float, rate: float) -> float:
+    """The gain of a PT1 filter, like pt1FilterGain in Betaflight"""
+    dt = 1 / rate
+    return dt / (dt + 1 / (2 * math.pi * cutoff))
+
+
+class Smoothing(ABC):
+    rate: float
+
+    @abstractmethod
+    def coefficients(self) -> tuple[np.ndarray, np.ndarray]:
+        """The numerator and denominator of the filter at the loop rate, for lfilter"""
+
+    def _points(self, rx_ts: ID) -> ID:
+        return np.ceil(rx_ts * self.rate / 1e6).astype(np.int_)
+
+    def start(self, channels: int) -> "Smoother":
+        return Smoother(self, channels)
+
+    def apply(self, rx_ts: ID, rx_fd: FD) -> FD:
+        """Smooth a received stream, one row per packet in the order of rx_ts, starting from zeros"""
+        from scipy.signal import lfilter
+
+        if len(rx_ts) == 0:
+            return np.empty_like(rx_fd)
+        b, a = self.coefficients()
+        points = self._points(rx_ts)
+        # The latest value received at or before each loop iteration
+        latest = np.searchsorted(points, np.arange(points[-1] + 1), side="right") - 1
+        held = np.where((latest >= 0)[:, np.newaxis], rx_fd[latest], 0.0)
+        output = lfilter(b, a, held, axis=0)
+        # A packet sees the output as if it was the last one before its iteration, only the newest input differs
+        return np.clip(output[points] + b[0] * (rx_fd - held[points]), -1.0, 1.0)
+
+
+class Smoother:
+    """The state of smoothing a stream of received packets, one packet at a time"""
+
+    def __init__(self, smoothing: Smoothing, channels: int):
+        self.smoothing = smoothing
+        self.b, self.a = smoothing.coefficients()
+        self.held = np.zeros(channels)
+        self.zi = np.zeros((max(len(self.a), len(self.b)) - 1, channels))
+        self.point = 0  # the first loop iteration that hasn't run yet
+
+    def step(self, rx_ts: int, rx_fd: FD) -> FD:
+        from scipy.signal import lfilter
+
+        point = int(self.smoothing._points(np.array([rx_ts]))[0])
+        if point > self.point:
+            held = np.broadcast_to(self.held, (point - self.point, len(self.held)))
+            _, self.zi = lfilter(self.b, self.a, held, axis=0, zi=self.zi)
+            self.point = point
+        self.held = rx_fd
+        # The output of the direct form II transposed filter in the next iteration, without running it yet
+        return np.clip(self.b[0] * rx_fd + self.zi[0], -1.0, 1.0)
+
+
+@attrs.frozen
+class PT1(Smoothing):
+    """First order low-pass filter with the cutoff frequency in Hz"""
+
+    ORDER: ClassVar[int] = 1
+
+    cutoff: float
+    rate: float = DEFAULT_RATE
+
+    def __attrs_post_init__(self):
+        if not 0 < self.cutoff < self.rate / 2:
+            raise LinkLabException(f"The cutoff must be between 0 and {self.rate / 2} Hz, got {self.cutoff}")
+
+    def coefficients(self) -> tuple[np.ndarray, np.ndarray]:
+        # Cascaded PT1 filters, with the cutoff corrected so that the whole filter has -3 dB at cutoff
+        k = _pt1(self.cutoff / math.sqrt(2 ** (1 / self.ORDER) - 1), self.rate)
+        return np.array([k**self.ORDER]), np.polynomial.polynomial.polypow([1, k - 1], self.ORDER)
+
+
+@attrs.frozen
+class PT2(PT1):
+    """Two PT1 filters in series, steeper than PT1 for the same delay"""
+
+    ORDER: ClassVar[int] = 2
+
+
+@attrs.frozen
+class PT3(PT1):
+    """Three PT1 filters in series"""
+
+    ORDER: ClassVar[int] = 3
+
+
+@attrs.frozen
+class FeedForward(Smoothing):
+    """A low-pass filter of order 1 to 3, extrapolated lead µs ahead with the slope of its output.
+
+    This wins back part of the delay of the filter on sweeps, at the cost of overshoot on steps.
+    """
+
+    cutoff: float
+    lead: float
+    order: int = 2
+    rate: float = DEFAULT_RATE
+
+    def __attrs_post_init__(self):
+        if self.order not in (1, 2, 3):
+            raise LinkLabException(f"The order must be 1, 2 or 3, got {self.order}")
+
+    def coefficients(self) -> tuple[np.ndarray, np.ndarray]:
+        b, a = {1: PT1, 2: PT2, 3: PT3}[self.order](self.cutoff, self.rate).coefficients()
+        gain = self.lead * self.rate / 1e6
+        return np.convolve(b, [1 + gain, -gain]), a
+
+
+@attrs.frozen
+class Effective:
+    """What the aircraft experiences, compared with the transmitted signal"""
+
+    latency: float  # the lag of the received signal, in µs
+    error: float  # mean absolute error
+    aligned_error: float  # mean absolute error with the lag removed, from the shape of the signal only
+
+
+def _lag(received: FD, sent: FD, max_lag: int) -> float:
+    """The lag in grid points, at most max_lag, that maximizes the cross-correlation summed over the channels"""
+    n = len(received)
+    size = 1 << (2 * n - 1).bit_length()
+    r = np.fft.rfft(received - received.mean(axis=0), size, axis=0)
+    s = np.fft.rfft(sent - sent.mean(axis=0), size, axis=0)
+    correlation = np.fft.irfft(r * np.conj(s), size, axis=0).sum(axis=1)[: max_lag + 1]
+    # Divide by the overlap, so that all lags are compared on the same scale
+    correlation /= n - np.arange(len(correlation))
+    peak = int(np.argmax(correlation))
+    if 0 < peak < len(correlation) - 1:
+        # Refine between the grid points with a parabola through the peak and its neighbours
+        left, center, right = correlation[peak - 1 : peak + 2]
+        if (curvature := left - 2 * center + right) < 0:
+            return peak + 0.5 * (left - right) / curvature
+    return float(peak)
+
+
+def effective(tx_ts: ID, tx_fd: FD, rx_ts: ID, rx_fd: FD, resolution: int = 100, max_lag: int = 100_000) -> Effective:
+    """Compare the received values, held between packets, with the transmitted ones, interpolated between packets.
+
+    Args:
+        resolution: Step in µs of the grid the signals are compared on.
+        max_lag: The largest latency that is looked for, in µs.
+    """
+    if len(rx_ts) < 2:
+        raise LinkLabException("Need at least two received packets")
+    times = np.arange(rx_ts[0], rx_ts[-1], resolution)
+
+    def sent(at: np.ndarray) -> FD:
+        return np.column_stack([np.interp(at, tx_ts, channel) for channel in tx_fd.T])
+
+    received = rx_fd[np.searchsorted(rx_ts, times, side="right") - 1]
+    lag = _lag(received, sent(times), min(max_lag // resolution, len(times) - 1)) * resolution
+    return Effective(
+        latency=lag,
+        error=float(np.abs(received - sent(times)).mean()),
+        aligned_error=float(np.abs(received - sent(times - lag)).mean()),
+    )
@@ -0,0 +1,492 @@
+"""Decode binary blackbox logs (.bbl, .bfl) as written by Betaflight, without exporting them to csv first.
+
+A file holds one log per arming, each is a text header of "H name:value" lines followed by binary frames that start
+with a byte for their type. Main frames hold the fields of one logged loop iteration: intra frames (I) on their own,
+inter frames (P) as the difference from a prediction made from the previous frames. The header lists for every field
+of every frame type how it's predicted and encoded. Slow (S), GPS (G, H) and event (E) frames are only decoded as far
+as needed to skip them.
+
+Like Blackbox Explorer, a frame is only accepted if the next byte starts another frame. After a corrupt frame the
+decoder searches for the next frame, and skips P frames until the next I frame, since their predictions would be
+wrong. The file is memory mapped and decoded in chunks of main frames, so the whole log is never in memory as text.
+"""
+
+import mmap
+from pathlib import Path
+from typing import Iterator, Sequence
+
+import attrs
+import numpy as np
+
+from rclinklab.base import ID, LinkLabException
+
+LOG_START = b"H Product:Blackbox flight data recorder by Nicholas Sherlock\n"
+
+# Number of main frames decoded at once
+CHUNK = 1 << 14
+
+# Encodings
+SIGNED_VB = 0
+UNSIGNED_VB = 1
+NEG_14BIT = 3
+TAG8_8SVB = 6
+TAG2_3S32 = 7
+TAG8_4S16 = 8
+NULL = 9
+TAG2_3SVARIABLE = 10
+
+# Predictors
+ZERO = 0
+PREVIOUS = 1
+STRAIGHT_LINE = 2
+AVERAGE_2 = 3
+MINTHROTTLE = 4
+MOTOR_0 = 5
+INC = 6
+HOME_COORD = 7
+FIXED_1500 = 8
+VBATREF = 9
+LAST_MAIN_FRAME_TIME = 10
+MINMOTOR = 11
+
+# Events, with the unsigned variable byte values that follow them
+EVENT_VALUES = {0: 1, 14: 2, 15: 1, 30: 2}  # sync beep, logging resume, disarm and flight mode
+EVENT_INFLIGHT_ADJUSTMENT = 13
+EVENT_LOGGING_RESUME = 14
+EVENT_LOG_END = 255
+LOG_END_MESSAGE = b"End of log\0"
+
+TIME_WRAP = 1 << 32
+
+
+def _sign_extend(value: int, bits: int) -> int:
+    """
+    >>> _sign_extend(0b1110, 4), _sign_extend(0b0110, 4)
+    (-2, 6)
+    """
+    return value - (1 << bits) if value & (1 << (bits - 1)) else value
+
+
+class Corrupt(Exception):
+    """A frame that can't be decoded, internal to the decoder"""
+
+
+class Stream:
+    """The primitive values of the binary frames"""
+
+    def __init__(self, data, position: int, end: int):
+        self.data = data
+        self.position = position
+        self.end = end
+
+    def byte(self) -> int:
+        if self.position >= self.end:
+            raise Corrupt("Unexpected end of the log")
+        value = self.data[self.position]
+        self.position += 1
+        return value
+
+    def unsigned_vb(self) -> int:
+        """
+        >>> Stream(b"\\xac\\x02", 0, 2).unsigned_vb()
+        300
+        """
+        result = shift = 0
+        for _ in range(5):
+            byte = self.byte()
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+        raise Corrupt("Variable byte value too long")
+
+    def signed_vb(self) -> int:
+        """Zig-zag encoded, so that small negative numbers are short too
+
+        >>> Stream(b"\\x03\\x04", 0, 2).signed_vb()
+        -2
+        """
+        value = self.unsigned_vb()
+        return (value >> 1) ^ -(value & 1)
+
+    def tag8_8svb(self, count: int) -> list[int]:
+        """A byte with a bit for each of up to eight values that are not zero, then those as signed_vb"""
+        if count == 1:
+            return [self.signed_vb()]
+        header = self.byte()
+        return [self.signed_vb() if header & (1 << i) else 0 for i in range(count)]
+
+    def _sized(self, selector: int) -> int:
+        """A little-endian value of 8, 16, 24 or 32 bits"""
+        size = selector + 1
+        value = 0
+        for i in range(size):
+            value |= self.byte() << (8 * i)
+        return _sign_extend(value, 8 * size)
+
+    def tag2_3s32(self) -> list[int]:
+        """Three values, the top bits of the first byte select if they are 2, 4, 6 or up to 32 bits each"""
+        lead = self.byte()
+        layout = lead >> 6
+        if layout == 0:
+            return [
+                _sign_extend((lead >> 4) & 0x03, 2),
+                _sign_extend((lead >> 2) & 0x03, 2),
+                _sign_extend(lead & 0x03, 2),
+            ]
+        if layout == 1:
+            byte = self.byte()
+            return [_sign_extend(lead & 0x0F, 4), _sign_extend(byte >> 4, 4), _sign_extend(byte & 0x0F, 4)]
+        if layout == 2:
+            return [
+                _sign_extend(lead & 0x3F, 6),
+                _sign_extend(self.byte() & 0x3F, 6),
+                _sign_extend(self.byte() & 0x3F, 6),
+            ]
+        return [self._sized((lead >> (2 * i)) & 0x03) for i in range(3)]
+
+    def tag2_3svariable(self) -> list[int]:
+        """Like tag2_3s32, with 5-5-4 and 8-7-7 bit layouts instead of 4 and 6 bits"""
+        lead = self.byte()
+        layout = lead >> 6
+        if layout == 0:
+            return [
+                _sign_extend((lead >> 4) & 0x03, 2),
+                _sign_extend((lead >> 2) & 0x03, 2),
+                _sign_extend(lead & 0x03, 2),
+            ]
+        if layout == 1:
+            byte = self.byte()
+            return [
+                _sign_extend((lead & 0x3E) >> 1, 5),
+                _sign_extend(((lead & 0x01) << 4) | (byte >> 4), 5),
+                _sign_extend(byte & 0x0F, 4),
+            ]
+        if layout == 2:
+            first, second = self.byte(), self.byte()
+            return [
+                _sign_extend(((lead & 0x3F) << 2) | (first >> 6), 8),
+                _sign_extend(((first & 0x3F) << 1) | (second >> 7), 7),
+                _sign_extend(second & 0x7F, 7),
+            ]
+        return [self._sized((lead >> (2 * i)) & 0x03) for i in range(3)]
+
+    def tag8_4s16(self) -> list[int]:
+        """Four values, a selector byte says if each is zero, 4, 8 or 16 bits, packed in nibbles big-endian"""
+        selector = self.byte()
+        values = []
+        buffer = 0
+        odd = False  # half of buffer is still unread
+        for _ in range(4):
+            size = selector & 0x03
+            selector >>= 2
+            if size == 0:
+                values.append(0)
+            elif size == 1:
+                if odd:
+                    values.append(_sign_extend(buffer & 0x0F, 4))
+                else:
+                    buffer = self.byte()
+                    values.append(_sign_extend(buffer >> 4, 4))
+                odd = not odd
+            elif size == 2:
+                if odd:
+                    high = (buffer & 0x0F) << 4
+                    buffer = self.byte()
+                    values.append(_sign_extend(high | (buffer >> 4), 8))
+                else:
+                    values.append(_sign_extend(self.byte(), 8))
+            elif odd:
+                first, second = self.byte(), self.byte()
+                values.append(_sign_extend(((buffer & 0x0F) << 12) | (first << 4) | (second >> 4), 16))
+                buffer = second
+            else:
+                first, second = self.byte(), self.byte()
+                values.append(_sign_extend((first << 8) | second, 16))
+        return values
+
+
+@attrs.frozen
+class FrameDefinition:
+    names: list[str]
+    signed: list[bool]
+    predictors: list[int]
+    encodings: list[int]
+
+    def read(self, stream: Stream) -> list[int]:
+        """The encoded values, before the predictions"""
+        count = len(self.names)
+        values = [0] * count
+        i = 0
+        while i < count:
+            encoding = self.encodings[i]
+            if self.predictors[i] == INC or encoding == NULL:
+                # Not stored at all
+                i += 1
+                continue
+            if encoding == SIGNED_VB:
+                group = [stream.signed_vb()]
+            elif encoding == UNSIGNED_VB:
+                group = [stream.unsigned_vb()]
+            elif encoding == NEG_14BIT:
+                group = [-_sign_extend(stream.unsigned_vb() & 0x3FFF, 14)]
+            elif encoding == TAG8_4S16:
+                group = stream.tag8_4s16()
+            elif encoding == TAG2_3S32:
+                group = stream.tag2_3s32()
+            elif encoding == TAG2_3SVARIABLE:
+                group = stream.tag2_3svariable()
+            elif encoding == TAG8_8SVB:
+                end = i
+                while end < min(i + 8, count) and self.encodings[end] == TAG8_8SVB:
+                    end += 1
+                group = stream.tag8_8svb(end - i)
+            else:
+                raise LinkLabException(f"Unknown encoding {encoding} of {self.names[i]}")
+            group = group[: count - i]
+            values[i : i + len(group)] = group
+            i += len(group)
+        return values
+
+
+@attrs.frozen
+class Header:
+    values: dict[str, str]
+    frames: dict[str, FrameDefinition]
+
+    @classmethod
+    def parse(cls, lines: Sequence[str]) -> "Header":
+        values = {}
+        for line in lines:
+            name, _, value = line[2:].partition(":")
+            values[name] = value
+        frames = {}
+        for frame_type in "ISGH":
+            if f"Field {frame_type} name" not in values:
+                continue
+            names = values[f"Field {frame_type} name"].split(",")
+            # P frames have the names and signedness of I frames
+            for definition_type in [frame_type, "P"] if frame_type == "I" else [frame_type]:
+
+                def numbers(name: str, default: int = 0) -> list[int]:
+                    text = values.get(f"Field {definition_type} {name}") or values.get(f"Field {frame_type} {name}")
+                    return [int(v) for v in text.split(",")] if text else [default] * len(names)
+
+                frames[definition_type] = FrameDefinition(
+                    names, [bool(s) for s in numbers("signed")], numbers("predictor"), numbers("encoding")
+                )
+        if "I" not in frames:
+            raise LinkLabException("The log has no main frame definition")
+        return cls(values, frames)
+
+    def number(self, name: str, default: int = 0) -> int:
+        return int(self.values.get(name, str(default)).split(",")[0])
+
+    @property
+    def p_interval(self) -> tuple[int, int]:
+        """Every denominator loop iterations the numerator first are logged.
+
+        Betaflight 4 writes the interval as one number, older firmware as a fraction. "P ratio" is the I interval
+        divided by the P interval, not an interval.
+        """
+        value = self.values.get("P interval", "1/1")
+        numerator, fraction, denominator = value.partition("/")
+        if not fraction:
+            return 1, max(int(value), 1)
+        return int(numerator), int(denominator)
+
+
+def _half(value: int) -> int:
+    """Division by two rounding towards zero, like in C"""
+    return -(-value // 2) if value < 0 else value // 2
+
+
+class LogDecoder:
+    def __init__(self, data, start: int, end: int):
+        lines = []
+        position = start
+        while data[position : position + 2] == b"H ":
+            line_end = data.find(b"\n", position, end)
+            if line_end < 0:
+                break
+            lines.append(bytes(data[position:line_end]).decode("latin-1"))
+            position = line_end + 1
+        self.header = Header.parse(lines)
+        if self.header.values.get("Data version", "2") != "2":
+            raise LinkLabException(f"Unsupported blackbox data version {self.header.values['Data version']}")
+        self.stream = Stream(data, position, end)
+        self.i_interval = max(self.header.number("I interval", 1), 1)
+        self.p_interval = self.header.p_interval
+        self.constants = {
+            MINTHROTTLE: self.header.number("minthrottle"),
+            VBATREF: self.header.number("vbatref"),
+            MINMOTOR: self.header.number("motorOutput"),
+            FIXED_1500: 1500,
+        }
+        names = self.header.frames["I"].names
+        self.motor_0 = names.index("motor[0]") if "motor[0]" in names else None
+        self.time_index = names.index("time") if "time" in names else None
+        self.iteration_index = names.index("loopIteration") if "loopIteration" in names else None
+        self.resumed: list[int] | None = None  # the iteration and time logging resumed at, until the next I frame
+
+    def _logged(self, iteration: int) -> bool:
+        numerator, denominator = self.p_interval
+        return (iteration % self.i_interval + numerator - 1) % denominator < numerator
+
+    def _skipped(self, previous: list[int] | None) -> int:
+        """Loop iterations that were intentionally not logged since the previous frame"""
+        if previous is None or self.iteration_index is None:
+            return 0
+        iteration = previous[self.iteration_index] + 1
+        count = 0
+        while not self._logged(iteration) and count < self.i_interval:
+            iteration += 1
+            count += 1
+        return count
+
+    def _predict(self, definition: FrameDefinition, values: list[int], previous, previous2, skipped: int):
+        for i, predictor in enumerate(definition.predictors):
+            if predictor == ZERO:
+                continue
+            if predictor in self.constants:
+                values[i] += self.constants[predictor]
+            elif predictor == MOTOR_0 and self.motor_0 is not None:
+                values[i] += values[self.motor_0]
+            elif previous is None:
+                continue
+            elif predictor == PREVIOUS:
+                values[i] += previous[i]
+            elif predictor == STRAIGHT_LINE:
+                values[i] += 2 * previous[i] - previous2[i]
+            elif predictor == AVERAGE_2:
+                values[i] += _half(previous[i] + previous2[i])
+            elif predictor == INC:
+                values[i] = previous[i] + skipped + 1
+        # Fields are 32 bits in the firmware, a difference may have wrapped around
+        for i, signed in enumerate(definition.signed):
+            values[i] &= 0xFFFFFFFF
+            if signed:
+                values[i] = _sign_extend(values[i], 32)
+        return values
+
+    def _skip_event(self, stream: Stream) -> bool:
+        """Returns False at the end of the log"""
+        event = stream.byte()
+        if event == EVENT_LOG_END:
+            end = stream.position + len(LOG_END_MESSAGE)
+            if bytes(stream.data[stream.position : end]) != LOG_END_MESSAGE:
+                raise Corrupt("Bad end of log")
+            stream.position = end
+            return False
+        if event == EVENT_INFLIGHT_ADJUSTMENT:
+            if stream.byte() & 0x80:
+                stream.position += 4  # a float
+            else:
+                stream.signed_vb()
+        elif event in EVENT_VALUES:
+            values = [stream.unsigned_vb() for _ in range(EVENT_VALUES[event])]
+            if event == EVENT_LOGGING_RESUME:
+                self.resumed = values
+        else:
+            raise Corrupt(f"Unknown event {event}")
+        return True
+
+    def frames(self) -> Iterator[list[int]]:
+        """The fields of every valid main frame, in the order of the I frame names"""
+        stream = self.stream
+        previous: list[int] | None = None
+        previous2: list[int] | None = None
+        time_offset = 0
+        last_time = None
+        self.resumed = None
+        while stream.position < stream.end:
+            start = stream.position
+            frame_type = chr(stream.byte())
+            values = None
+            try:
+                if frame_type in "IP":
+                    if frame_type == "P" and previous is None:
+                        raise Corrupt("P frame without an I frame")
+                    definition = self.header.frames[frame_type]
+                    skipped = self._skipped(previous) if frame_type == "P" else 0
+                    values = self._predict(
+                        definition,
+                        definition.read(stream),
+                        *((previous, previous2) if frame_type == "P" else (None, None)),
+                        skipped,
+                    )
+                elif frame_type in "SGH" and frame_type in self.header.frames:
+                    self.header.frames[frame_type].read(stream)
+                elif frame_type == "E":
+                    if not self._skip_event(stream):
+                        return
+                else:
+                    raise Corrupt(f"Unknown frame type {frame_type!r}")
+                if stream.position < stream.end and chr(stream.data[stream.position]) not in "IPSGHE":
+                    raise Corrupt("The frame is not followed by another one")
+            except Corrupt:
+                # Search for the next frame from the byte after this one started
+                stream.position = start + 1
+                previous = previous2 = None
+                continue
+            if values is None:
+                continue
+            if self.resumed is not None and frame_type == "P":
+                continue  # logging resumes with an I frame
+            self.resumed = None
+            previous2 = values if frame_type == "I" else previous
+            previous = values
+            result = list(values)
+            if self.time_index is not None:
+                time = values[self.time_index] + time_offset
+                if last_time is not None and time < last_time - TIME_WRAP // 2:
+                    time_offset += TIME_WRAP
+                    time += TIME_WRAP
+                last_time = time
+                result[self.time_index] = time
+            yield result
+
+
+def log_starts(data) -> list[int]:
+    """Where each log in a file starts"""
+    starts = []
+    position = data.find(LOG_START)
+    while position >= 0:
+        starts.append(position)
+        position = data.find(LOG_START, position + 1)
+    return starts
+
+
+def count_logs(path: Path) -> int:
+    if Path(path).stat().st_size == 0:
+        # An empty file can't be memory mapped, the flight controller leaves them when nothing was logged
+        return 0
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return len(log_starts(data))
+
+
+def decode(path: Path, fields: Sequence[str], index: int = 0, chunk_size: int = CHUNK) -> Iterator[ID]:
+    """Decode the main frames of the log with this index in the file, in chunks of one row per frame.
+
+    Raises a LinkLabException if a field is not in the log.
+    """
+    if Path(path).stat().st_size == 0:
+        raise LinkLabException(f"{path} is empty")
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        starts = log_starts(data)
+        if not 0 <= index < len(starts):
+            raise LinkLabException(f"There is no log {index} in {path}, it has {len(starts)}")
+        end = starts[index + 1] if index + 1 < len(starts) else len(data)
+        decoder = LogDecoder(data, starts[index], end)
+        names = decoder.header.frames["I"].names
+        if missing := [f for f in fields if f not in names]:
+            raise LinkLabException(f"The log has no {', '.join(missing)}")
+        columns = [names.index(f) for f in fields]
+        rows: list[list[int]] = []
+        for values in decoder.frames():
+            rows.append([values[c] for c in columns])
+            if len(rows) == chunk_size:
+                yield np.array(rows, dtype=np.int_)
+                rows = []
+        if rows:
+            yield np.array(rows, dtype=np.int_)
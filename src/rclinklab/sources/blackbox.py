@@ -1,17 +1,55 @@
 """Parse a blackbox log file exported to csv by Betaflight Blackbox Explorer
-(https://github.com/betaflight/blackbox-log-viewer).
+(https://github.com/betaflight/blackbox-log-viewer), or the binary log itself, see rclinklab.sources.bbl.
 
 Optimally disable RC smoothing and use the same logging rate as the rc link
 rate. So for example for 500Hz ELRS and 8kHz PID loop, use 1/16 logging rate.
+The smoothing can then be simulated on the receiving side, see rclinklab.smoothing.
+
+The channels default to rcCommand[0-3], other fields can be mapped to channels with columns, like
+"rcCommand[0-3] debug[0-3]" for aux channels logged through a debug mode. rcCommand[0-2] are centered at 0, all
+other fields are taken as pulse widths of 1000 - 2000 µs.
 """
 
 import csv
+import re
 from pathlib import Path
+from typing import Iterator, Sequence
 
 import numpy as np
 import pandas as pd
 
-from rclinklab.base import InterpolatedTxSource, LinkLabException
+from rclinklab.base import FD, InterpolatedTxSource, LinkLabException
+
+CHANNELS = ["rcCommand[0]", "rcCommand[1]", "rcCommand[2]", "rcCommand[3]"]
+COLUMNS = ["time", *CHANNELS]
+
+CENTERED = {"rcCommand[0]", "rcCommand[1]", "rcCommand[2]"}  # roll, pitch and yaw, the rest are like throttle
+CENTER = 1500  # µs, the middle of the pulse widths
+SCALE = 500  # µs, from the middle to the ends
+
+
+def expand(columns: str | Sequence[str]) -> list[str]:
+    """The field names of the channels, from a list or a string of names with ranges of indexes.
+
+    >>> expand("rcCommand[0-1] debug[3]")
+    ['rcCommand[0]', 'rcCommand[1]', 'debug[3]']
+    """
+    if not isinstance(columns, str):
+        return list(columns)
+    names = []
+    for name in columns.split():
+        if match := re.fullmatch(r"(.+)\[(\d+)-(\d+)\]", name):
+            field, first, last = match[1], int(match[2]), int(match[3])
+            names += [f"{field}[{i}]" for i in range(first, last + 1)]
+        else:
+            names.append(name)
+    if not names:
+        raise LinkLabException("No columns given")
+    return names
+
+
+def _offsets(columns: Sequence[str]) -> FD:
+    return np.array([0 if c in CENTERED else CENTER for c in columns], dtype=np.float64)
 
 
 def find_header_lineno(log_path) -> int:
@@ -22,19 +60,45 @@ def find_header_lineno(log_path) -> int:
     raise LinkLabException("Unexpected file format")
 
 
-def read_csv(path):
+def read_csv(path, columns: Sequence[str] = CHANNELS):
     header_line_no = find_header_lineno(path)
-    columns = ["time", "rcCommand[0]", "rcCommand[1]", "rcCommand[2]", "rcCommand[3]"]
     with open(path) as bb_log:
-        return pd.read_csv(bb_log, header=header_line_no, usecols=columns, dtype=np.float64)
+        try:
+            data = pd.read_csv(bb_log, header=header_line_no, usecols=["time", *columns], dtype=np.float64)
+        except ValueError as e:
+            raise LinkLabException(f"Can't read the columns of {path}: {e}") from e
+    return data[["time", *columns]]
 
 
 def adapt(data: pd.DataFrame):
     data["time"] -= data["time"][0]  # make timestamps start at 0
-    data["rcCommand[3]"] -= 1500  # Adjust throttle interval
-    data.iloc[:, 1:] /= 500  # Adjust range to -1.0 - 1.0
+    # Adjust the range to -1.0 - 1.0, all channels at once
+    data.iloc[:, 1:] = (data.iloc[:, 1:].to_numpy() - _offsets(list(data.columns[1:]))) / SCALE
     return data
 
 
-def parse(path: Path) -> InterpolatedTxSource:
-    return InterpolatedTxSource(adapt(read_csv(path)))
+def adapted(path: Path, index: int = 0, columns: Sequence[str] = CHANNELS) -> Iterator[FD]:
+    """The rows of adapt for the log with this index in a binary log file, in chunks, without a csv in between"""
+    from rclinklab.sources import bbl
+
+    offsets = _offsets(columns)
+    start = None
+    for chunk in bbl.decode(path, ["time", *columns], index):
+        data = chunk.astype(np.float64)
+        if start is None:
+            start = data[0, 0]
+        data[:, 0] -= start
+        data[:, 1:] = (data[:, 1:] - offsets) / SCALE
+        yield data
+
+
+def parse(path: Path, index: int = 0, columns: str | Sequence[str] = CHANNELS) -> InterpolatedTxSource:
+    """A csv export, or the log with this index in a binary log file, with one channel per column"""
+    path = Path(path)
+    names = expand(columns)
+    if path.suffix.lower() == ".csv":
+        return InterpolatedTxSource(adapt(read_csv(path, names)))
+    chunks = list(adapted(path, index, names))
+    if not chunks:
+        raise LinkLabException(f"No frames in log {index} of {path}")
+    return InterpolatedTxSource(pd.DataFrame(np.concatenate(chunks), columns=["time", *names]))
@@ -1,21 +1,21 @@
-from math import pi, sin
+from math import pi
 
 import attrs
+import numpy as np
 
-from rclinklab.base import FD, TimeService, TxSource
-from rclinklab.converters import farray
+from rclinklab.base import FD, ID, TimeService, TxSource
 
 
 @attrs.define
 class SineSource(TxSource):
-    frequency: float
+    frequency: float = 0.5
 
     def __call__(self, time: int) -> FD:
-        result = []
-        for i in range(self.channels):
-            phaseshift = i * 0.5 * pi
-            result.append(sin((2 * pi * self.frequency * time / 1e6) + phaseshift))
-        return farray(result)
+        return self.sample(np.array([time]))[0]
+
+    def sample(self, times: ID) -> FD:
+        phaseshifts = np.arange(self.channels) * 0.5 * pi
+        return np.sin((2 * pi * self.frequency * times[:, np.newaxis] / 1e6) + phaseshifts)
 
     def start(self, time_service: TimeService) -> "TxSource":
         return self
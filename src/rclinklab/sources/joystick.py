@@ -1,3 +1,4 @@
+import asyncio
 import itertools
 import time
 from collections import defaultdict, deque, namedtuple
@@ -11,7 +12,7 @@ from evdev import AbsInfo, InputEvent, ecodes
 from scipy.interpolate import interp1d
 
 from rclinklab import base
-from rclinklab.base import FD, LinkLabException, TxSource
+from rclinklab.base import FD, ID, LinkLabException, TxSource
 from rclinklab.simulate import TimeService
 
 
@@ -54,6 +55,11 @@ class InterpolatedEventStream:
     def latest(self):
         return max(c[-1].ts for c in self.events.values())
 
+    def age(self, ts: int) -> int:
+        """The time since the latest event of any axis at or before ts"""
+        newest = max((p.ts for c in self.events.values() for p in c if p.ts <= ts), default=ts)
+        return ts - newest
+
 
 class JoystickTxSource(TxSource):
 
@@ -75,6 +81,12 @@ class JoystickTxSource(TxSource):
             self.read_events()
         return self.events(ts)
 
+    def ages(self, times: ID) -> ID:
+        return np.array([self.events.age(t) for t in times.tolist()], dtype=np.int_)
+
+    def fingerprint(self) -> str | None:
+        return None
+
     def start(self, time_service: TimeService) -> "JoystickTxSource":
         self.start_ts = time_service.start_ts
         return self
@@ -92,6 +104,24 @@ class JoystickTxSource(TxSource):
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.device.close()
 
+    async def read_async(self):
+        """Read events whenever the device has some, instead of when sampling."""
+        loop = asyncio.get_running_loop()
+        failed = loop.create_future()
+
+        def read():
+            try:
+                self.read_events()
+            except LinkLabException as e:
+                if not failed.done():
+                    failed.set_exception(e)
+
+        loop.add_reader(self.device.fd, read)
+        try:
+            await failed
+        finally:
+            loop.remove_reader(self.device.fd)
+
     def read_events(self):
         while event := self.device.read_one():
             match event:
@@ -0,0 +1,250 @@
+"""Transforms wrap any source to filter it, add noise, limit how fast it changes, resample, quantize or delay it.
+
+They nest, like Noise(LowPass(parse(path), cutoff=10), std=0.01). Every transform implements sample for an array of
+timestamps with numpy and calls sample of the source it wraps once, so a batch of timestamps goes through a chain of
+transforms in one vectorized pass per transform instead of timestamp by timestamp.
+
+Transforms with state run on a fixed grid of rate points per second, which is evaluated lazily up to the latest
+timestamp asked for, never further, and interpolated in between. Only the latest HISTORY points are kept. The output
+at a timestamp only depends on the timestamp, not on the order or grouping of the calls, so transformed sources are
+reproducible and can be cached. start returns a copy with the state reset.
+"""
+
+import math
+from abc import abstractmethod
+
+import attrs
+import numpy as np
+
+from rclinklab.base import FD, ID, LinkLabException, TimeService, TxSource, digest
+
+# Number of grid points evaluated at once
+CHUNK = 1 << 12
+
+# Grid points per second of the transforms with state
+DEFAULT_RATE = 1000.0
+
+# Grid points kept behind the latest one, older timestamps can't be sampled anymore
+HISTORY = 1 << 16
+
+
+# Default pickling like Codec in rclinklab.base
+@attrs.define(getstate_setstate=False)
+class Transform(TxSource):
+    source: TxSource
+    channels: int = attrs.field(init=False)
+
+    def __attrs_post_init__(self):
+        self.channels = self.source.channels
+
+    @abstractmethod
+    def sample(self, times: ID) -> FD:
+        pass
+
+    def __call__(self, time: int) -> FD:
+        return self.sample(np.array([time]))[0]
+
+    def ages(self, times: ID) -> ID:
+        return self.source.ages(times)
+
+    def start(self, time_service: TimeService) -> "TxSource":
+        # evolve creates a new instance, so the state starts over
+        return attrs.evolve(self, source=self.source.start(time_service))  # type: ignore[misc]
+
+    async def read_async(self):
+        await self.source.read_async()
+
+    def __enter__(self):
+        self.source = self.source.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return self.source.__exit__(exc_type, exc_val, exc_tb)
+
+    def fingerprint(self) -> str | None:
+        if (source := self.source.fingerprint()) is None:
+            return None
+        params = attrs.asdict(self, recurse=False, filter=lambda a, _: a.init and a.name != "source")
+        return digest(type(self).__qualname__, repr(params), source)
+
+
+@attrs.define(getstate_setstate=False)
+class Offset(Transform):
+    """The source delayed by delay µs, it holds its first value before that"""
+
+    delay: int
+
+    def sample(self, times: ID) -> FD:
+        return self.source.sample(np.maximum(times - self.delay, 0))
+
+    def ages(self, times: ID) -> ID:
+        delayed = np.maximum(times - self.delay, 0)
+        return times - delayed + self.source.ages(delayed)
+
+
+@attrs.define(getstate_setstate=False)
+class Resample(Transform):
+    """The source sampled rate times per second and held in between, like a receiver with a lower update rate"""
+
+    rate: float
+
+    def _held(self, times: ID) -> ID:
+        return np.ceil(np.floor(np.maximum(times, 0) * self.rate / 1e6) * 1e6 / self.rate).astype(np.int_)
+
+    def sample(self, times: ID) -> FD:
+        return self.source.sample(self._held(times))
+
+    def ages(self, times: ID) -> ID:
+        held = self._held(times)
+        return times - held + self.source.ages(held)
+
+
+@attrs.define(getstate_setstate=False)
+class Quantize(Transform):
+    """The source rounded to bits of resolution, like the ADC of a gimbal or the HID report of a joystick"""
+
+    bits: int
+
+    def sample(self, times: ID) -> FD:
+        levels = 2**self.bits - 1
+        return np.rint((np.clip(self.source.sample(times), -1.0, 1.0) + 1) / 2 * levels) / levels * 2 - 1
+
+
+@attrs.define(getstate_setstate=False)
+class GridTransform(Transform):
+    """A transform with state, evaluated at the points of a grid of rate points per second"""
+
+    _grid: FD | None = attrs.field(init=False, default=None, repr=False, eq=False)
+    _first: int = attrs.field(init=False, default=0, repr=False, eq=False)  # the grid point at _grid[0]
+    _length: int = attrs.field(init=False, default=0, repr=False, eq=False)  # the grid points evaluated
+
+    @property
+    @abstractmethod
+    def grid_rate(self) -> float:
+        pass
+
+    @abstractmethod
+    def chunk(self, times: ID) -> FD:
+        """The values at the next grid points, at these timestamps, continuing the state"""
+
+    def _times(self, points: ID) -> ID:
+        return np.rint(points * 1e6 / self.grid_rate).astype(np.int_)
+
+    def _append(self, values: FD):
+        used = self._length - self._first
+        if self._grid is None or used + len(values) > len(self._grid):
+            # Make room, dropping the points more than HISTORY behind the new end
+            first = max(self._first, self._length + len(values) - HISTORY)
+            kept = self._grid[first - self._first : used] if self._grid is not None else values[:0]
+            grid = np.empty((max(2 * (len(kept) + len(values)), CHUNK), self.channels))
+            grid[: len(kept)] = kept
+            self._grid, self._first = grid, first
+        start = self._length - self._first
+        self._grid[start : start + len(values)] = values
+        self._length += len(values)
+
+    def values(self, points: ID) -> FD:
+        """The values at these grid points, evaluating the grid up to the last of them and no further.
+
+        A realtime source holds its latest value for times ahead of now, so the grid is never evaluated ahead of
+        the points asked for.
+        """
+        until = int(points.max(initial=0))
+        while self._length <= until:
+            self._append(self.chunk(self._times(np.arange(self._length, min(self._length + CHUNK, until + 1)))))
+        if len(points) and points.min() < self._first:
+            raise LinkLabException(
+                f"{type(self).__name__} only keeps {HISTORY} grid points, it can't go back to {points.min()}"
+            )
+        return self._grid[points - self._first]  # type: ignore[index]
+
+    def sample(self, times: ID) -> FD:
+        """Linear interpolation between the grid points"""
+        points = np.maximum(times, 0) * self.grid_rate / 1e6
+        lower = np.floor(points).astype(np.int_)
+        fraction = (points - lower)[:, np.newaxis]
+        # The upper point is only needed where the time is not on the grid
+        upper = np.where(fraction[:, 0] > 0, lower + 1, lower)
+        return self.values(lower) * (1 - fraction) + self.values(upper) * fraction
+
+
+@attrs.define(getstate_setstate=False)
+class LowPass(GridTransform):
+    """A first order low-pass filter with the cutoff frequency in Hz, like RC smoothing"""
+
+    cutoff: float
+    rate: float = DEFAULT_RATE
+    _zi: FD | None = attrs.field(init=False, default=None, repr=False, eq=False)
+
+    @property
+    def grid_rate(self) -> float:
+        return self.rate
+
+    def __attrs_post_init__(self):
+        super().__attrs_post_init__()
+        if not 0 < self.cutoff < self.rate / 2:
+            raise LinkLabException(f"The cutoff must be between 0 and {self.rate / 2} Hz, got {self.cutoff}")
+
+    def chunk(self, times: ID) -> FD:
+        from scipy.signal import lfilter
+
+        dt = 1 / self.rate
+        alpha = dt / (1 / (2 * math.pi * self.cutoff) + dt)
+        data = self.source.sample(times)
+        if self._zi is None:
+            # Start settled at the first value
+            self._zi = (1 - alpha) * data[:1]
+        result, self._zi = lfilter([alpha], [1, alpha - 1], data, axis=0, zi=self._zi)
+        return result
+
+
+@attrs.define(getstate_setstate=False)
+class RateLimit(GridTransform):
+    """The source can't change faster than max_rate per second, like a slew rate limit on the sticks"""
+
+    max_rate: float
+    rate: float = DEFAULT_RATE
+    _last: FD | None = attrs.field(init=False, default=None, repr=False, eq=False)
+
+    @property
+    def grid_rate(self) -> float:
+        return self.rate
+
+    def chunk(self, times: ID) -> FD:
+        data = self.source.sample(times)
+        step = self.max_rate / self.rate
+        result = np.empty_like(data)
+        last = data[0] if self._last is None else self._last
+        # Every point depends on the previous one, this only loops over the points, not the channels
+        for i, row in enumerate(data):
+            last = result[i] = last + np.clip(row - last, -step, step)
+        self._last = last
+        return result
+
+
+@attrs.define(getstate_setstate=False)
+class Noise(GridTransform):
+    """Normally distributed noise with the standard deviation std, a new value rate times per second.
+
+    The result is clipped to the range of the data.
+    """
+
+    std: float
+    seed: int = 0
+    rate: float = DEFAULT_RATE
+    _rng: np.random.Generator | None = attrs.field(init=False, default=None, repr=False, eq=False)
+
+    @property
+    def grid_rate(self) -> float:
+        return self.rate
+
+    def chunk(self, times: ID) -> FD:
+        if self._rng is None:
+            self._rng = np.random.default_rng(self.seed)
+        return self._rng.normal(0.0, self.std, size=(len(times), self.channels))
+
+    def sample(self, times: ID) -> FD:
+        # The noise is held between the grid points, the source is sampled where asked
+        lower = np.floor(np.maximum(times, 0) * self.rate / 1e6).astype(np.int_)
+        noise = self.values(lower)
+        return np.clip(self.source.sample(times) + noise, -1.0, 1.0)
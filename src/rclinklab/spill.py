@@ -0,0 +1,286 @@
+"""Collect the packets of long runs without keeping them all in memory.
+
+Packets are written to disk in chunks by a background thread, as columns (see rclinklab.columns). A chunk is either
+a compressed .npz file, or a directory with one .npy file per column that is memory mapped when read. Only the
+latest packets are kept in memory, like a Collector with a time limit.
+
+The History of a run gives the columns as views over the chunks, which only load the chunks that are indexed, at
+most CACHED_CHUNKS at a time. They are only concatenated in memory when converted to an array.
+"""
+
+import re
+import shutil
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache, partial
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterator
+
+import numpy as np
+
+from rclinklab.base import LinkLabException
+from rclinklab.columns import Columns, from_columns, select, to_columns, to_data_frame
+from rclinklab.simulate import Collector, LinkPacket
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+DEFAULT_CHUNK_SIZE = 16_384
+
+# Chunks kept loaded by History
+CACHED_CHUNKS = 4
+
+# The chunks and the temporary files they are written to
+CHUNK_NAME = re.compile(r"\.?\d{6}(\.npz)?(\.tmp)?")
+
+
+def _write(path: Path, packets: list[LinkPacket], codec_ids: list[int], compress: bool):
+    columns = to_columns(packets, codec_ids)
+    temporary = path.with_name(f".{path.name}.tmp")
+    if compress:
+        with open(temporary, "wb") as f:
+            np.savez_compressed(f, **columns)
+    else:
+        temporary.mkdir()
+        for name, values in columns.items():
+            np.save(temporary / f"{name}.npy", values)
+    temporary.rename(path)
+
+
+def _length(path: Path) -> int:
+    if path.is_dir():
+        return len(np.load(path / "codec_id.npy", mmap_mode="r"))
+    with np.load(path) as npz:
+        return len(npz["codec_id"])
+
+
+def _read(path: Path) -> Columns:
+    if path.is_dir():
+        return {f.stem: np.load(f, mmap_mode="r") for f in path.glob("*.npy")}
+    with np.load(path) as npz:
+        return dict(npz)
+
+
+def _remove_chunks(path: Path):
+    """Remove the chunks of an earlier run, but never anything else"""
+    if not path.exists():
+        return
+    entries = list(path.iterdir())
+    if other := [e.name for e in entries if not CHUNK_NAME.fullmatch(e.name)]:
+        raise LinkLabException(f"{path} is not a directory of chunks, it has {', '.join(sorted(other)[:3])}")
+    for entry in entries:
+        if entry.is_dir():
+            shutil.rmtree(entry)
+        else:
+            entry.unlink()
+
+
+class SpillingCollector(Collector):
+    def __init__(
+        self,
+        path: Path,
+        time_limit=1_000_000,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        compress: bool = True,
+        resume: bool = False,
+    ):
+        """
+        Args:
+            path: Directory for the chunks, existing chunks are removed. Other files in it raise an exception.
+            time_limit: How long to keep packets in memory in µs, all of them if None.
+            chunk_size: Number of packets per chunk.
+            compress: Write compressed chunks, otherwise they are memory mapped when read.
+            resume: Keep the existing chunks, for a run that resumes from a checkpoint.
+        """
+        super().__init__(time_limit)
+        self.path = path
+        self.resume = resume
+        self.chunk_size = chunk_size
+        self.compress = compress
+        self.chunks: list[Path] = []
+        self.lengths: list[int] = []
+        self._packets: list[LinkPacket] = []
+        self._codec_ids: list[int] = []
+        self._writes: list[Future] = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spill")
+        if not resume:
+            _remove_chunks(path)
+        path.mkdir(parents=True, exist_ok=True)
+
+    def add(self, codec_id: int, packet: LinkPacket):
+        super().add(codec_id, packet)
+        self._packets.append(packet)
+        self._codec_ids.append(codec_id)
+        if len(self._packets) >= self.chunk_size:
+            self._spill()
+
+    def _spill(self):
+        # Raise errors from earlier writes, without waiting for the ones in progress
+        for write in [w for w in self._writes if w.done()]:
+            write.result()
+            self._writes.remove(write)
+        chunk = self.path / (f"{len(self.chunks):06d}" + (".npz" if self.compress else ""))
+        self._writes.append(self._executor.submit(_write, chunk, self._packets, self._codec_ids, self.compress))
+        self.chunks.append(chunk)
+        self.lengths.append(len(self._packets))
+        self._packets, self._codec_ids = [], []
+
+    def flush(self):
+        """Write the packets that are not written yet, and wait until everything is on disk."""
+        if self._packets:
+            self._spill()
+        for write in self._writes:
+            write.result()
+        self._writes.clear()
+
+    def close(self):
+        self.flush()
+        self._executor.shutdown()
+
+    def __getstate__(self):
+        # For checkpoints, the written chunks stay on disk and the rest is in the state
+        for write in self._writes:
+            write.result()
+        return {k: v for k, v in vars(self).items() if k not in ("_writes", "_executor")}
+
+    def __setstate__(self, state):
+        vars(self).update(state, _writes=[], _executor=ThreadPoolExecutor(max_workers=1, thread_name_prefix="spill"))
+
+    def restore_state(self, saved: "SpillingCollector"):
+        """Continue from a checkpoint, with the chunks written before it"""
+        if not self.resume:
+            raise LinkLabException(
+                f"The chunks in {self.path} were removed, create the SpillingCollector with resume=True to resume"
+            )
+        self.flush()
+        # Keep the executor of this collector, the one of the snapshot is not needed
+        saved._executor.shutdown()
+        vars(self).update(vars(saved), resume=True, _executor=self._executor, _writes=[])
+
+    def history(self) -> "History":
+        """All packets so far"""
+        self.flush()
+        return History(list(self.chunks), list(self.lengths))
+
+
+class History:
+    """The packets of a run as chunks on disk, loaded when used."""
+
+    def __init__(self, chunks: list[Path], lengths: list[int] | None = None):
+        self.chunks = chunks
+        self.chunk = lru_cache(maxsize=CACHED_CHUNKS)(self._load)
+        self.lengths = lengths if lengths is not None else [_length(c) for c in chunks]
+        self.starts = np.cumsum([0, *self.lengths])
+
+    @classmethod
+    def open(cls, path: Path) -> "History":
+        return cls(sorted(p for p in path.iterdir() if not p.name.startswith(".")))
+
+    def _load(self, i: int) -> Columns:
+        return _read(self.chunks[i])
+
+    def __len__(self):
+        return int(self.starts[-1])
+
+    def __iter__(self) -> Iterator[Columns]:
+        """The columns of each chunk"""
+        return (self.chunk(i) for i in range(len(self.chunks)))
+
+    def column(self, name: str, codec_id: int | None = None) -> "Column":
+        """A column of all packets, or of the packets of one codec"""
+        if codec_id is None:
+            return Column(self, lambda c: c[name], self.lengths)
+        return Column(self, lambda c: c[name][c["codec_id"] == codec_id])
+
+    def columns(self, codec_id: int) -> dict[str, "Column"]:
+        """The columns of the packets of one codec, ota_data has the bytes of all packets like in a chunk"""
+        names = [n for n in self.chunk(0) if n != "codec_id"] if self.chunks else []
+        return {n: Column(self, partial(_selected, name=n, codec_id=codec_id)) for n in names}
+
+    def data_frame(self, codec_id: int) -> "pd.DataFrame":
+        """All packets of the codec, in memory"""
+        return to_data_frame({n: np.asarray(c) for n, c in self.columns(codec_id).items()})
+
+    def packets(self, start: int, stop: int) -> list[tuple[int, LinkPacket]]:
+        """The packets with indexes from start to stop, only the chunks they are in are loaded."""
+        result: list[tuple[int, LinkPacket]] = []
+        first = int(np.searchsorted(self.starts, start, side="right")) - 1
+        for i in range(max(first, 0), len(self.chunks)):
+            if self.starts[i] >= stop:
+                break
+            offset = self.starts[i]
+            part = _slice(self.chunk(i), max(start - offset, 0), min(stop - offset, self.lengths[i]))
+            result.extend(zip(part["codec_id"].tolist(), from_columns(part)))
+        return result
+
+
+def _selected(columns: Columns, name: str, codec_id: int) -> np.ndarray:
+    return select(columns, codec_id)[name]
+
+
+def _slice(columns: Columns, start: int, stop: int) -> Columns:
+    ends = np.cumsum((columns["ota_data_bits"] + 7) // 8)
+    begin = int(ends[start - 1]) if start > 0 else 0
+    end = int(ends[stop - 1]) if stop > 0 else 0
+    result = {k: v[start:stop] for k, v in columns.items() if k != "ota_data"}
+    result["ota_data"] = columns["ota_data"][begin:end]
+    return result
+
+
+class Column:
+    """A column over the chunks of a History, which loads the chunks as they are indexed.
+
+    Indexing with an int, a slice or an array of indexes only loads the chunks with the indexed values, np.asarray
+    concatenates all of them. parts iterates over the values of each chunk, one chunk in memory at a time.
+    """
+
+    def __init__(self, history: History, part: Callable[[Columns], np.ndarray], lengths: list[int] | None = None):
+        self.history = history
+        self.part = part
+        self._lengths = lengths
+
+    def parts(self) -> Iterator[np.ndarray]:
+        return (self.part(c) for c in self.history)
+
+    @property
+    def lengths(self) -> list[int]:
+        if self._lengths is None:
+            self._lengths = [len(p) for p in self.parts()]
+        return self._lengths
+
+    def __len__(self):
+        return sum(self.lengths)
+
+    def __iter__(self):
+        for part in self.parts():
+            yield from part
+
+    def __array__(self, dtype=None):
+        parts = list(self.parts())
+        result = np.concatenate(parts) if parts else np.empty(0)
+        return result if dtype is None else result.astype(dtype)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.take(np.arange(*key.indices(len(self))))
+        if np.ndim(key) == 0:
+            index = int(key) + (len(self) if key < 0 else 0)
+            if not 0 <= index < len(self):
+                raise IndexError(f"Index {key} is out of range for {len(self)} values")
+            return self.take(np.array([index]))[0]
+        return self.take(np.asarray(key))
+
+    def take(self, indexes: np.ndarray) -> np.ndarray:
+        """The values at the indexes, loading only the chunks they are in"""
+        starts = np.cumsum([0, *self.lengths])
+        chunks = np.searchsorted(starts, indexes, side="right") - 1
+        parts = []
+        for i in np.unique(chunks).tolist():
+            parts.append(
+                (np.flatnonzero(chunks == i), self.part(self.history.chunk(i))[indexes[chunks == i] - starts[i]])
+            )
+        if not parts:
+            return self.part(self.history.chunk(0))[:0] if self.history.chunks else np.empty(0)
+        result = np.empty((len(indexes), *parts[0][1].shape[1:]), dtype=parts[0][1].dtype)
+        for positions, values in parts:
+            result[positions] = values
+        return result
@@ -1,9 +1,13 @@
+from typing import TYPE_CHECKING
+
 import attrs
 import numpy as np
-import pandas as pd
 
 from rclinklab.utils import extract_channel_data
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 
 @attrs.define
 class BasicStats:
@@ -12,17 +16,36 @@ class BasicStats:
     mean: float
 
     @classmethod
-    def from_df(cls, data: pd.DataFrame):
-        v: np.ndarray = data.values.reshape([-1])
+    def from_df(cls, data: "pd.DataFrame"):
+        return cls.from_array(data.values)
+
+    @classmethod
+    def from_array(cls, data: np.ndarray):
+        v = data.reshape([-1])
         return cls(max=v.max(), mean=v.mean())
 
 
+@attrs.define
+class Breakdown:
+    """Mean latency of each stage from the input to the flight controller, in µs"""
+
+    input_age: float
+    slot_wait: float
+    airtime: float
+    decode: float
+
+    @property
+    def end_to_end(self) -> float:
+        return self.input_age + self.slot_wait + self.airtime + self.decode
+
+
 @attrs.define(init=False)
 class Stats:
     total_packets: int
-    packet_length_counts: pd.Series
+    packet_length_counts: "pd.Series"
     latency: BasicStats
     fd_error: BasicStats
+    breakdown: Breakdown
 
 
 def packets(rx_data, stats):
@@ -39,9 +62,45 @@ def fd_error(rx_data, stats):
     stats.fd_error = BasicStats.from_df(differences)
 
 
-def calculate(data: pd.DataFrame) -> Stats:
+def breakdown(rx_data, stats):
+    stats.breakdown = Breakdown(*(rx_data[f.name, f.name].mean() for f in attrs.fields(Breakdown)))
+
+
+def calculate(data: "pd.DataFrame") -> Stats:
     stats = Stats()
     packets(data, stats)
     latency(data, stats)
     fd_error(data, stats)
+    breakdown(data, stats)
     return stats
+
+
+@attrs.define
+class GroupStats:
+    """Stats of the channels of one group of a GroupCodec"""
+
+    latency: BasicStats  # of the packets that carried the group
+    staleness: BasicStats  # at every packet, how long ago the received values of the group were sent, in µs
+    fd_error: BasicStats
+
+
+def group_stats(rx_data: "pd.DataFrame", codec) -> list[GroupStats]:
+    """Stats per group, from the headers of the packets. Packets before a group first arrives are left out."""
+    carried = codec.groups_of(list(rx_data["ota_data", "ota_data"]))
+    rx_ts = rx_data["rx_ts", "rx_ts"].to_numpy()
+    tx_ts = rx_data["tx_ts", "tx_ts"].to_numpy()
+    errors = (extract_channel_data(rx_data, "rx_fd") - extract_channel_data(rx_data, "tx_fd")).abs().to_numpy()
+    result = []
+    for g, (a, b) in enumerate(codec.bounds):
+        latest = np.maximum.accumulate(np.where(carried[:, g], np.arange(len(rx_ts)), -1))
+        arrived = latest >= 0
+        staleness = rx_ts[arrived] - tx_ts[latest[arrived]]
+        group_errors = errors[arrived, a:b]
+        result.append(
+            GroupStats(
+                latency=BasicStats.from_array(rx_ts[carried[:, g]] - tx_ts[carried[:, g]]),
+                staleness=BasicStats.from_array(staleness),
+                fd_error=BasicStats.from_array(group_errors),
+            )
+        )
+    return result
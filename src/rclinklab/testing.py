@@ -0,0 +1,166 @@
+"""Conformance and throughput checks that any codec can be run through, by the tests here and of codec plugins.
+
+A codec is given as a factory taking channels and bits, like partial(DeltaCodec, delta_bits=5), and conformance
+creates it for several channel counts and bit depths. The inputs are random values, steps held for hold packets and
+slow ramps, made as floats and quantized by the codec, so codecs with several bit depths get valid values. Every
+codec has to give the same packets and values packet by packet as in batches, and receive values in range.
+Lossless codecs must return every value exactly, lossy ones must settle on each step before it ends and follow the
+ramp within tracking after warmup packets, as a codec that drifts away can still give values in range. A received
+value may be up to lag packets old, for codecs that send some channels only every few packets.
+
+throughput measures packets per second of both paths and the peak memory per packet of a round trip, which budget
+compares with limits. The checks raise AssertionError, so they read like asserts in tests.
+"""
+
+import copy
+import math
+import time
+import tracemalloc
+from typing import Callable, Sequence
+
+import attrs
+import numpy as np
+
+from rclinklab.base import FD, ID, Codec
+
+CodecFactory = Callable[[int, int], Codec]
+
+CHANNELS = (1, 4, 12)
+BITS = (8, 10, 12)
+TRACKING = 0.05  # largest error on the ramp of a lossy codec, of values in -1.0 - 1.0
+WARMUP = 40  # packets to reach the start of the ramp from where a codec starts
+LAG = 4  # packets
+
+
+def inputs(channels: int, packets: int = 300, hold: int = 100, seed: int = 0) -> dict[str, FD]:
+    """Floats in -1.0 - 1.0 with one row per packet"""
+    rng = np.random.default_rng(seed)
+    random = rng.uniform(-1, 1, size=(packets, channels))
+    steps = np.repeat(rng.uniform(-1, 1, size=(math.ceil(packets / hold), channels)), hold, axis=0)[:packets]
+    ramp = np.clip(
+        rng.uniform(-0.9, 0.9, size=channels) + np.cumsum(rng.normal(0, 0.002, size=(packets, channels)), axis=0),
+        -1,
+        1,
+    )
+    return {"random": random, "steps": steps, "ramp": ramp}
+
+
+def _quantize(codec: Codec, data: FD) -> ID:
+    return np.array([codec.quantize(row) for row in data], dtype=np.int_).reshape(len(data), codec.channels)
+
+
+def round_trip(codec: Codec, data: ID) -> tuple[list, ID]:
+    """The packets and the received values, packet by packet"""
+    packets = [codec.transmit(row) for row in data]
+    received = np.array([codec.receive(p) for p in packets], dtype=np.int_).reshape(len(data), codec.channels)
+    return packets, received
+
+
+def check(
+    codec: Codec,
+    data: ID,
+    lossless: bool,
+    hold: int | None = None,
+    name: str = "",
+    tracking: float | None = None,
+    warmup: int = WARMUP,
+    lag: int = LAG,
+):
+    """Check one codec instance on one input, see the module docs"""
+    label = f"{codec!r} on {name or 'the input'}"
+    batch = copy.deepcopy(codec)
+    packets, received = round_trip(codec, data)
+    assert batch.transmit_batch(data) == packets, f"{label}: transmit_batch differs from transmit"
+    assert np.array_equal(batch.receive_batch(packets), received), f"{label}: receive_batch differs from receive"
+    values = np.array([codec.dequantize(row) for row in received])
+    assert np.all(np.abs(values) <= 1.0), f"{label}: received values out of range"
+    if lossless:
+        wrong = np.flatnonzero((received != data).any(axis=1))
+        assert not len(wrong), f"{label}: packet {wrong[:1].tolist()} is not received as sent"
+    elif hold is not None:
+        ends = np.arange(hold - 1, len(data), hold)
+        unsettled = ends[(received[ends] != data[ends]).any(axis=1)]
+        assert not len(unsettled), f"{label}: not settled at the end of the step at packet {unsettled[:1].tolist()}"
+    if not lossless and tracking is not None:
+        sent = np.array([codec.dequantize(row) for row in data])
+        start = max(warmup, lag)
+        late = [np.abs(values[start:] - sent[start - k : len(sent) - k]) for k in range(lag + 1)]
+        errors = np.min(late, axis=0).max(axis=1)
+        drifted = np.flatnonzero(errors > tracking)
+        assert not len(drifted), f"{label}: off by {errors.max():.3f} at packet {(drifted[:1] + start).tolist()}"
+
+
+def conformance(
+    factory: CodecFactory,
+    lossless: bool = True,
+    channels: Sequence[int] = CHANNELS,
+    bits: Sequence[int] = BITS,
+    packets: int = 300,
+    hold: int = 100,
+    seed: int = 0,
+    tracking: float = TRACKING,
+    warmup: int = WARMUP,
+    lag: int = LAG,
+):
+    """Check a codec on all inputs at all channel counts and bit depths, with a new instance for each"""
+    for c in channels:
+        for name, data in inputs(c, packets, hold, seed).items():
+            for b in bits:
+                codec = factory(c, b)
+                settles = hold if name == "steps" else None
+                follows = tracking if name == "ramp" else None
+                label = f"{name} with {c} channels of {b} bits"
+                check(codec, _quantize(codec, data), lossless, settles, label, follows, warmup, lag)
+
+
+@attrs.frozen
+class Throughput:
+    transmit: float  # packets per second
+    receive: float
+    transmit_batch: float
+    receive_batch: float
+    memory: float  # peak bytes allocated per packet while sending and receiving packet by packet, packets kept
+
+    def __str__(self):
+        return (
+            f"transmit {self.transmit:.0f}/s, receive {self.receive:.0f}/s, batches {self.transmit_batch:.0f}/s "
+            f"and {self.receive_batch:.0f}/s, {self.memory:.0f} bytes per packet"
+        )
+
+
+def _rate(function: Callable, packets: int) -> float:
+    start = time.perf_counter()
+    function()
+    return packets / max(time.perf_counter() - start, 1e-9)
+
+
+def throughput(
+    factory: CodecFactory, channels: int = 4, bits: int = 10, packets: int = 2000, seed: int = 0
+) -> Throughput:
+    """Measure a codec on the ramp input, which is what a stick looks like most of the time"""
+    codec = factory(channels, bits)
+    data = _quantize(codec, inputs(channels, packets, seed=seed)["ramp"])
+    scalar, batch, memory = (copy.deepcopy(codec) for _ in range(3))
+    sent: list = []
+    transmit = _rate(lambda: sent.extend(scalar.transmit(row) for row in data), packets)
+    receive = _rate(lambda: [scalar.receive(p) for p in sent], packets)
+    transmit_batch = _rate(lambda: batch.transmit_batch(data), packets)
+    receive_batch = _rate(lambda: batch.receive_batch(sent), packets)
+    tracemalloc.start()
+    try:
+        round_trip(memory, data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return Throughput(transmit, receive, transmit_batch, receive_batch, memory=peak / packets)
+
+
+@attrs.frozen
+class Budget:
+    packets_per_second: float = 0.0  # the slowest of the four rates
+    bytes_per_packet: float = math.inf
+
+    def check(self, result: Throughput):
+        rate = min(result.transmit, result.receive, result.transmit_batch, result.receive_batch)
+        assert rate >= self.packets_per_second, f"{result}: slower than {self.packets_per_second:.0f} packets/s"
+        assert result.memory <= self.bytes_per_packet, f"{result}: more than {self.bytes_per_packet:.0f} bytes"
@@ -0,0 +1,155 @@
+"""A source resampled once at every bit position of a bitrate, so that sampling it is just indexing.
+
+The simulator samples the source at bits_to_ts(position), which are exactly the points of the timeline, so a run
+using the timeline gives the same result as a run using the original source. The ages of the input are kept too, if
+the source has any. With a path the samples are stored in a memory mapped .npy file, that worker processes open
+instead of evaluating the source again.
+"""
+
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+
+from rclinklab.base import (
+    FD,
+    ID,
+    LinkLabException,
+    SimulatedTime,
+    TimeService,
+    TxSource,
+    digest,
+)
+
+# Number of positions evaluated at once when creating the timeline
+CHUNK = 1 << 16
+
+
+def _times(positions: ID, bitrate: int) -> ID:
+    """Vectorized bits_to_ts"""
+    return np.rint((positions * 1_000_000) / bitrate).astype(np.int_)
+
+
+class Timeline(TxSource):
+    def __init__(
+        self,
+        data: FD,
+        bitrate: int,
+        source_fingerprint: str | None,
+        path: Path | None = None,
+        input_ages: ID | None = None,
+    ):
+        super().__init__(channels=data.shape[1])
+        self.data = data
+        self.bitrate = bitrate
+        self.source_fingerprint = source_fingerprint
+        self.path = path
+        self.input_ages = input_ages  # at every position, None if the source is always fresh
+
+    @classmethod
+    def create(cls, source: TxSource, bitrate: int, duration: int, path: Path | None = None) -> "Timeline":
+        """Sample the source at every bit position up to the duration."""
+        positions = math.ceil((bitrate * duration) / 1_000_000) + 1
+        shape = (positions, source.channels)
+        if path is None:
+            data = np.empty(shape)
+        else:
+            data = np.lib.format.open_memmap(path, mode="w+", dtype=np.float_, shape=shape)
+        input_ages = np.empty(positions, dtype=np.int_)
+        with source.start(SimulatedTime()) as s:
+            for start in range(0, positions, CHUNK):
+                times = _times(np.arange(start, min(start + CHUNK, positions)), bitrate)
+                data[start : start + len(times)] = s.sample(times)
+                input_ages[start : start + len(times)] = s.ages(times)
+        fingerprint = source.fingerprint()
+        ages = input_ages if input_ages.any() else None
+        if isinstance(data, np.memmap) and path is not None:
+            data.flush()
+            if ages is not None:
+                np.save(cls._ages_path(path), ages)
+            cls._metadata_path(path).write_text(json.dumps({"bitrate": bitrate, "fingerprint": fingerprint}))
+            return cls.open(path)
+        return cls(data, bitrate, fingerprint, input_ages=ages)
+
+    @classmethod
+    def open(cls, path: Path) -> "Timeline":
+        metadata = json.loads(cls._metadata_path(path).read_text())
+        ages_path = cls._ages_path(path)
+        ages = np.load(ages_path, mmap_mode="r") if ages_path.exists() else None
+        return cls(np.load(path, mmap_mode="r"), metadata["bitrate"], metadata["fingerprint"], path, ages)
+
+    @staticmethod
+    def _metadata_path(path: Path) -> Path:
+        return path.with_suffix(".json")
+
+    @staticmethod
+    def _ages_path(path: Path) -> Path:
+        return path.with_suffix(".ages.npy")
+
+    def __getstate__(self):
+        if self.path is not None:
+            return {"path": self.path}
+        return {**self.__dict__, "channels": self.channels}
+
+    def __setstate__(self, state):
+        if set(state) == {"path"}:
+            timeline = self.open(state["path"])
+            state = {**timeline.__dict__, "channels": timeline.channels}
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return f"Timeline(channels={self.channels}, bitrate={self.bitrate}, positions={len(self.data)})"
+
+    def fingerprint(self) -> str | None:
+        if self.source_fingerprint is None:
+            return None
+        return digest(type(self).__qualname__, self.source_fingerprint, str(self.bitrate))
+
+    def at(self, position: int) -> FD:
+        """The data at a bit position"""
+        if not 0 <= position < len(self.data):
+            raise LinkLabException(f"Position {position} is outside the timeline")
+        return np.array(self.data[position])
+
+    def __call__(self, time: int) -> FD:
+        position = round((time * self.bitrate) / 1_000_000)
+        if 0 <= position < len(self.data) and round((position * 1_000_000) / self.bitrate) == time:
+            return np.array(self.data[position])
+        return self.sample(np.array([time]))[0]
+
+    def ages(self, times: ID) -> ID:
+        """The age at the position at or before each timestamp, plus the time since then"""
+        if self.input_ages is None:
+            return super().ages(times)
+        positions = np.minimum(np.floor((times * self.bitrate) / 1_000_000).astype(np.int_), len(self.data) - 1)
+        # A timestamp that rounds up to a position is that position
+        positions += (positions + 1 < len(self.data)) & (_times(positions + 1, self.bitrate) == times)
+        if positions.min(initial=0) < 0:
+            raise LinkLabException("Timestamps are outside the timeline")
+        return self.input_ages[positions] + times - _times(positions, self.bitrate)
+
+    def sample(self, times: ID) -> FD:
+        """Look up the positions of the timestamps, interpolating linearly if they are between positions."""
+        positions = (times * self.bitrate) / 1_000_000
+        nearest = np.rint(positions).astype(np.int_)
+        exact = _times(nearest, self.bitrate) == times
+        lower = np.where(exact, nearest, np.floor(positions).astype(np.int_))
+        upper = np.where(exact, nearest, lower + 1)
+        if lower.min(initial=0) < 0 or upper.max(initial=0) >= len(self.data):
+            raise LinkLabException("Timestamps are outside the timeline")
+        lower_ts, upper_ts = _times(lower, self.bitrate), _times(upper, self.bitrate)
+        fraction = np.divide(times - lower_ts, upper_ts - lower_ts, out=np.zeros(len(times)), where=~exact)
+        below, above = self.data[lower], self.data[upper]
+        # Keep exact positions as they are, interpolation could change them by rounding
+        return np.where(exact[:, np.newaxis], below, below + (above - below) * fraction[:, np.newaxis])
+
+    def start(self, time_service: TimeService) -> "TxSource":
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
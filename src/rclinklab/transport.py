@@ -0,0 +1,269 @@
+"""Send the encoded packets over a real local transport to a receiver process, to measure what the simulation
+doesn't model: the CPU time of transmit and receive and the overhead of the transport.
+
+The link is first simulated to get the data to send and the modeled latencies. Then the sender encodes the same
+data with a fresh copy of the codec and sends it, paced at the modeled transmit times or as fast as possible, to a
+process that decodes it with another fresh copy. Both sides timestamp with the system wide monotonic clock.
+
+A frame is the packet number (uint32), the length in bits (uint16) and the packet bytes. Datagram transports send
+one frame per datagram, the pseudo terminal, a stand-in for a serial port, prefixes each frame with its length.
+"""
+
+import copy
+import multiprocessing
+import os
+import select
+import socket
+import struct
+import tempfile
+import time
+import tty
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any
+
+import attrs
+import numpy as np
+from bitarray import bitarray
+
+from rclinklab.base import Codec, LinkLabException, SimulatedTime, TxSource
+from rclinklab.simulate import DEFAULT_BITRATE, Collector, Setup
+
+FRAME_HEADER = struct.Struct("<IH")
+LENGTH = struct.Struct("<H")
+END = 0xFFFFFFFF
+
+# The receiver gives up when it hasn't got anything for this long, in case the end frame was lost
+IDLE_TIMEOUT = 2.0
+
+
+class Endpoint(ABC):
+    @abstractmethod
+    def send(self, frame: bytes):
+        pass
+
+    @abstractmethod
+    def receive(self, timeout: float) -> bytes | None:
+        """The next frame, None on timeout"""
+
+    @abstractmethod
+    def close(self):
+        pass
+
+
+class Transport(ABC):
+    """Creates the endpoints, bind is called in the receiver process and connect in the sender."""
+
+    @abstractmethod
+    def bind(self) -> tuple[Endpoint, Any]:
+        """The receiving endpoint and the address to connect to"""
+
+    @abstractmethod
+    def connect(self, address) -> Endpoint:
+        pass
+
+
+class DatagramEndpoint(Endpoint):
+    def __init__(self, sock: socket.socket, address=None):
+        self.sock = sock
+        self.address = address
+
+    def send(self, frame: bytes):
+        self.sock.sendto(frame, self.address)
+
+    def receive(self, timeout: float) -> bytes | None:
+        self.sock.settimeout(timeout)
+        try:
+            return self.sock.recv(65536)
+        except socket.timeout:
+            return None
+
+    def close(self):
+        self.sock.close()
+
+
+class UdpTransport(Transport):
+    def bind(self) -> tuple[Endpoint, Any]:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+        sock.bind(("127.0.0.1", 0))
+        return DatagramEndpoint(sock), sock.getsockname()
+
+    def connect(self, address) -> Endpoint:
+        return DatagramEndpoint(socket.socket(socket.AF_INET, socket.SOCK_DGRAM), address)
+
+
+class BoundUnixEndpoint(DatagramEndpoint):
+    """Removes the socket file and its directory when closed"""
+
+    def __init__(self, sock: socket.socket, path: Path):
+        super().__init__(sock)
+        self.path = path
+
+    def close(self):
+        super().close()
+        self.path.unlink(missing_ok=True)
+        self.path.parent.rmdir()
+
+
+class UnixTransport(Transport):
+    def bind(self) -> tuple[Endpoint, Any]:
+        path = Path(tempfile.mkdtemp(prefix="rclinklab-")) / "link"
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            sock.bind(str(path))
+        except OSError:
+            sock.close()
+            path.parent.rmdir()
+            raise
+        return BoundUnixEndpoint(sock, path), str(path)
+
+    def connect(self, address) -> Endpoint:
+        return DatagramEndpoint(socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM), address)
+
+
+class StreamEndpoint(Endpoint):
+    """Frames prefixed with their length on a file descriptor"""
+
+    def __init__(self, fd: int, keep_open: int | None = None):
+        self.fd = fd
+        self.keep_open = keep_open
+        self.buffer = b""
+
+    def send(self, frame: bytes):
+        os.write(self.fd, LENGTH.pack(len(frame)) + frame)
+
+    def receive(self, timeout: float) -> bytes | None:
+        deadline = time.monotonic() + timeout
+        while len(self.buffer) < LENGTH.size or len(self.buffer) < LENGTH.size + LENGTH.unpack_from(self.buffer)[0]:
+            if not select.select([self.fd], [], [], max(0.0, deadline - time.monotonic()))[0]:
+                return None
+            self.buffer += os.read(self.fd, 65536)
+        end = LENGTH.size + LENGTH.unpack_from(self.buffer)[0]
+        frame, self.buffer = self.buffer[LENGTH.size : end], self.buffer[end:]
+        return frame
+
+    def close(self):
+        os.close(self.fd)
+        if self.keep_open is not None:
+            os.close(self.keep_open)
+
+
+class PtyTransport(Transport):
+    """The sender writes to the terminal side of a pseudo terminal in raw mode, like to a serial port."""
+
+    def bind(self) -> tuple[Endpoint, Any]:
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        # Keep the terminal side open, otherwise reads fail between senders
+        return StreamEndpoint(master, keep_open=slave), os.ttyname(slave)
+
+    def connect(self, address) -> Endpoint:
+        return StreamEndpoint(os.open(address, os.O_WRONLY | os.O_NOCTTY))
+
+
+TRANSPORTS: dict[str, type[Transport]] = {"udp": UdpTransport, "unix": UnixTransport, "pty": PtyTransport}
+
+
+def _frame(number: int, ota_data: bitarray) -> bytes:
+    return FRAME_HEADER.pack(number, len(ota_data)) + ota_data.tobytes()
+
+
+def _receiver(transport: Transport, codec: Codec, connection):
+    """Decode frames until the end frame, then send back when each packet was decoded and the result."""
+    endpoint, address = transport.bind()
+    connection.send(address)
+    numbers, done, decode_time, rx_ids = [], [], [], []
+    while (frame := endpoint.receive(IDLE_TIMEOUT)) is not None:
+        number, bits = FRAME_HEADER.unpack_from(frame)
+        if number == END:
+            break
+        start = time.monotonic_ns()
+        ota_data = bitarray(endian="big")
+        ota_data.frombytes(frame[FRAME_HEADER.size :])
+        del ota_data[bits:]
+        rx_ids.append(codec.receive(ota_data))
+        end = time.monotonic_ns()
+        numbers.append(number)
+        done.append(end)
+        decode_time.append(end - start)
+    endpoint.close()
+    connection.send((numbers, done, decode_time, rx_ids))
+
+
+@attrs.frozen
+class TransportResult:
+    """Latencies and times in µs, means unless stated otherwise"""
+
+    codec: str
+    transport: str
+    packets: int
+    modeled_latency: float
+    measured_latency: float
+    max_measured_latency: float
+    encode_time: float
+    decode_time: float
+    throughput: float  # packets per second, limited by the pacing if paced
+    lost: int
+    mismatches: int  # packets decoded to other values than in the simulation
+
+
+def measure(
+    source: TxSource,
+    codec: Codec,
+    transport: str = "udp",
+    bitrate: int = DEFAULT_BITRATE,
+    duration: int = 1_000_000,
+    paced: bool = True,
+) -> TransportResult:
+    """Measure the latency from the start of encoding until decoded in the receiver process."""
+    if transport not in TRANSPORTS:
+        raise LinkLabException(f"Unknown transport {transport}, choose from {', '.join(TRANSPORTS)}")
+    tx_codec, rx_codec = copy.deepcopy(codec), copy.deepcopy(codec)
+    collector = Collector()
+    Setup(source, [codec], [collector], bitrate=bitrate, duration=duration, time_service=SimulatedTime()).run()
+    packets = list(collector.packets[0])
+
+    context = multiprocessing.get_context("spawn")
+    connection, child_connection = context.Pipe()
+    receiver = context.Process(target=_receiver, args=(TRANSPORTS[transport](), rx_codec, child_connection))
+    receiver.start()
+    try:
+        if not connection.poll(30):
+            raise LinkLabException("The receiver process did not start")
+        endpoint = TRANSPORTS[transport]().connect(connection.recv())
+        started, encode_time = [], []
+        start_ns = time.monotonic_ns()
+        for number, packet in enumerate(packets):
+            if paced and (delay := start_ns + packet.tx_ts * 1000 - time.monotonic_ns()) > 0:
+                time.sleep(delay / 1e9)
+            begin = time.monotonic_ns()
+            ota_data = tx_codec.transmit(packet.tx_id)
+            encode_time.append(time.monotonic_ns() - begin)
+            started.append(begin)
+            endpoint.send(_frame(number, ota_data))
+        endpoint.send(FRAME_HEADER.pack(END, 0))
+        endpoint.close()
+        if not connection.poll(IDLE_TIMEOUT + 30):
+            raise LinkLabException("The receiver process did not finish")
+        numbers, done, decode_time, rx_ids = connection.recv()
+    finally:
+        receiver.join(timeout=5)
+        if receiver.is_alive():
+            receiver.kill()
+
+    latency = (np.array(done) - np.array(started)[numbers]) / 1000
+    expected = np.array([packets[n].rx_id for n in numbers]).reshape(len(numbers), codec.channels)
+    return TransportResult(
+        codec=repr(codec),
+        transport=transport,
+        packets=len(packets),
+        modeled_latency=float(np.mean([p.rx_ts - p.tx_ts for p in packets])),
+        measured_latency=float(latency.mean()) if len(latency) else float("nan"),
+        max_measured_latency=float(latency.max()) if len(latency) else float("nan"),
+        encode_time=float(np.mean(encode_time)) / 1000,
+        decode_time=float(np.mean(decode_time)) / 1000 if decode_time else float("nan"),
+        throughput=len(numbers) / ((max(done, default=start_ns) - start_ns) / 1e9 or float("nan")),
+        lost=len(packets) - len(numbers),
+        mismatches=int((~(np.array(rx_ids).reshape(expected.shape) == expected).all(axis=1)).sum()),
+    )
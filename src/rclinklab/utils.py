@@ -1,9 +1,13 @@
+from typing import TYPE_CHECKING
+
 import attrs
 import numpy as np
-import pandas as pd
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
-def extract_channel_data(df, name) -> pd.DataFrame:
+def extract_channel_data(df, name) -> "pd.DataFrame":
     cdf = df[name].copy()
     cdf.columns = range(cdf.shape[1])
     return cdf
@@ -23,6 +27,7 @@ def attrs_to_data_frame(values):
     0  One      1.2      3.7      2.8
     1  Two      3.3      4.4      5.5
     """
+    import pandas as pd
 
     def attrs_to_multiindex(inst):
         result = []
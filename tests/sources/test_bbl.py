@@ -0,0 +1,267 @@
+import csv
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from rclinklab.base import LinkLabException
+from rclinklab.sources import bbl
+from rclinklab.sources.blackbox import COLUMNS, adapt, adapted, parse, read_csv
+
+logs = Path(__file__).parent / "../blackbox-logs"
+
+# The main fields of Betaflight 4.3 with their signedness, I and P predictors and encodings
+FIELDS: list[tuple[str, int, int, int, int, int]] = [
+    ("loopIteration", 0, 0, 1, 6, 9),
+    ("time", 0, 0, 1, 2, 0),
+    *[(f"axisP[{i}]", 1, 0, 0, 1, 0) for i in range(3)],
+    *[(f"axisI[{i}]", 1, 0, 7, 1, 7) for i in range(3)],
+    *[(f"axisD[{i}]", 1, 0, 0, 1, 0) for i in range(2)],
+    *[(f"axisF[{i}]", 1, 0, 0, 1, 0) for i in range(3)],
+    *[(f"rcCommand[{i}]", 1, 0, 0, 1, 8) for i in range(3)],
+    ("rcCommand[3]", 0, 4, 1, 1, 8),
+    *[(f"setpoint[{i}]", 1, 0, 0, 1, 8) for i in range(4)],
+    ("vbatLatest", 0, 9, 3, 1, 6),
+    ("amperageLatest", 1, 0, 0, 1, 6),
+    ("rssi", 0, 0, 1, 1, 6),
+    *[(f"gyroADC[{i}]", 1, 0, 0, 3, 0) for i in range(3)],
+    *[(f"accSmooth[{i}]", 1, 0, 0, 1, 0) for i in range(3)],
+    *[(f"debug[{i}]", 1, 0, 0, 1, 0) for i in range(4)],
+    ("motor[0]", 0, 11, 1, 3, 0),
+    *[(f"motor[{i}]", 0, 5, 0, 3, 0) for i in range(1, 4)],
+]
+NAMES = [f[0] for f in FIELDS]
+SLOW = ["flightModeFlags", "stateFlags", "failsafePhase", "rxSignalReceived", "rxFlightChannelsValid"]
+
+
+def unsigned_vb(value: int) -> bytes:
+    value &= 0xFFFFFFFF
+    result = bytearray()
+    while value >= 0x80:
+        result.append((value & 0x7F) | 0x80)
+        value >>= 7
+    return bytes(result + bytes([value]))
+
+
+def signed_vb(value: int) -> bytes:
+    return unsigned_vb((value << 1) ^ (value >> 31))
+
+
+def _fits(value: int, bits: int) -> bool:
+    return -(1 << (bits - 1)) <= value < 1 << (bits - 1)
+
+
+def tag2_3s32(values: list[int]) -> bytes:
+    if all(_fits(v, 2) for v in values):
+        return bytes([((values[0] & 3) << 4) | ((values[1] & 3) << 2) | (values[2] & 3)])
+    if all(_fits(v, 4) for v in values):
+        return bytes([0x40 | (values[0] & 0x0F), ((values[1] & 0x0F) << 4) | (values[2] & 0x0F)])
+    if all(_fits(v, 6) for v in values):
+        return bytes([0x80 | (values[0] & 0x3F), values[1] & 0x3F, values[2] & 0x3F])
+    sizes = [next(s for s in range(4) if _fits(v, 8 * (s + 1))) for v in values]
+    result = bytearray([0xC0 | sizes[0] | sizes[1] << 2 | sizes[2] << 4])
+    for value, size in zip(values, sizes):
+        result += (value & ((1 << (8 * (size + 1))) - 1)).to_bytes(size + 1, "little")
+    return bytes(result)
+
+
+def tag8_4s16(values: list[int]) -> bytes:
+    """A selector byte, then the values as 0, 1, 2 or 4 nibbles, big-endian"""
+    sizes = [0 if v == 0 else 1 if _fits(v, 4) else 2 if _fits(v, 8) else 3 for v in values]
+    nibbles = []
+    for value, size in zip(values, sizes):
+        count = [0, 1, 2, 4][size]
+        nibbles += [(value >> (4 * (count - 1 - i))) & 0x0F for i in range(count)]
+    nibbles += [0] * (len(nibbles) % 2)
+    selector = sizes[0] | sizes[1] << 2 | sizes[2] << 4 | sizes[3] << 6
+    return bytes([selector] + [nibbles[i] << 4 | nibbles[i + 1] for i in range(0, len(nibbles), 2)])
+
+
+def tag8_8svb(values: list[int]) -> bytes:
+    if len(values) == 1:
+        return signed_vb(values[0])
+    header = sum(1 << i for i, v in enumerate(values) if v)
+    return bytes([header]) + b"".join(signed_vb(v) for v in values if v)
+
+
+def encode(values: list[int], encodings: list[int], predictors: list[int]) -> bytes:
+    result = bytearray()
+    i = 0
+    while i < len(values):
+        encoding = encodings[i]
+        if predictors[i] == bbl.INC or encoding == bbl.NULL:
+            i += 1
+            continue
+        groups = {bbl.TAG2_3S32: (3, tag2_3s32), bbl.TAG8_4S16: (4, tag8_4s16)}
+        if encoding in groups:
+            count, function = groups[encoding]
+            result += function(values[i : i + count])
+        elif encoding == bbl.TAG8_8SVB:
+            count = 1
+            while i + count < len(values) and encodings[i + count] == bbl.TAG8_8SVB and count < 8:
+                count += 1
+            result += tag8_8svb(values[i : i + count])
+        elif encoding == bbl.NEG_14BIT:
+            count = 1
+            result += unsigned_vb(-values[i] & 0x3FFF)
+        else:
+            count = 1
+            result += (signed_vb if encoding == bbl.SIGNED_VB else unsigned_vb)(values[i])
+        i += count
+    return bytes(result)
+
+
+# The intervals in the header of older firmware, and of Betaflight 4 logging at 1/2 of the loop rate
+LEGACY_INTERVALS = {"I interval": "256", "P interval": "1/16"}
+BETAFLIGHT_4_INTERVALS = {"I interval": "256", "P interval": "2", "P ratio": "128"}
+
+
+def encode_log(
+    rows: list[list[int]], slow: list[int], header: dict[str, str], intervals: dict[str, str] = LEGACY_INTERVALS
+) -> bytes:
+    """A binary log like Betaflight writes it, with an I frame every 256 loop iterations and after gaps.
+
+    The header has the intervals in the legacy form of older firmware, unless other intervals are given.
+    """
+    p_interval = int(intervals["P interval"].split("/")[-1])
+    minthrottle, vbatref, minmotor = (int(header[n].split(",")[0]) for n in ["minthrottle", "vbatref", "motorOutput"])
+    lines = {
+        "Data version": "2",
+        **intervals,
+        "Field I name": ",".join(NAMES),
+        "Field I signed": ",".join(str(f[1]) for f in FIELDS),
+        "Field I predictor": ",".join(str(f[2]) for f in FIELDS),
+        "Field I encoding": ",".join(str(f[3]) for f in FIELDS),
+        "Field P predictor": ",".join(str(f[4]) for f in FIELDS),
+        "Field P encoding": ",".join(str(f[5]) for f in FIELDS),
+        "Field S name": ",".join(SLOW),
+        "Field S signed": "0,0,0,0,0",
+        "Field S predictor": "0,0,0,0,0",
+        "Field S encoding": "1,1,7,7,7",
+        "minthrottle": str(minthrottle),
+        "vbatref": str(vbatref),
+        "motorOutput": header["motorOutput"],
+    }
+    result = bytearray(bbl.LOG_START)
+    result += "".join(f"H {name}:{value}\n" for name, value in lines.items()).encode()
+    result += b"S" + encode(slow, [1, 1, 7, 7, 7], [0] * 5)
+    definitions = {
+        b"I": ([f[2] for f in FIELDS], [f[3] for f in FIELDS]),
+        b"P": ([f[4] for f in FIELDS], [f[5] for f in FIELDS]),
+    }
+    previous: list[int] = []
+    previous2: list[int] = []
+    for row in rows:
+        constants = {4: minthrottle, 9: vbatref, 11: minmotor, 5: row[NAMES.index("motor[0]")]}
+        if not previous or row[0] % 256 == 0 or row[0] - previous[0] != p_interval:
+            frame = b"I"
+            previous = previous2 = []
+        else:
+            frame = b"P"
+        predictors, encodings = definitions[frame]
+        predictions = []
+        for i, predictor in enumerate(predictors):
+            if predictor in constants:
+                predictions.append(constants[predictor])
+            elif predictor == bbl.PREVIOUS:
+                predictions.append(previous[i])
+            elif predictor == bbl.STRAIGHT_LINE:
+                predictions.append(2 * previous[i] - previous2[i])
+            elif predictor == bbl.AVERAGE_2:
+                predictions.append(int((previous[i] + previous2[i]) / 2))
+            else:
+                predictions.append(0)
+        raw = [v - p for v, p in zip(row, predictions)]
+        result += frame + encode(raw, encodings, predictors)
+        if row[0] % 4096 == 0:
+            result += b"E\x00" + unsigned_vb(row[1])  # a sync beep
+        previous2 = previous or row
+        previous = row
+    return bytes(result + b"E\xff" + bbl.LOG_END_MESSAGE)
+
+
+def _csv(name: str) -> tuple[dict[str, str], list[list[int]], list[int]]:
+    with open(logs / name) as file:
+        lines = list(csv.reader(file))
+    start = next(i for i, line in enumerate(lines) if len(line) != 2)
+    header = dict(lines[:start])
+    columns = lines[start]
+    rows = [[int(line[columns.index(n)]) for n in NAMES] for line in lines[start + 1 :]]
+    return header, rows, [int(lines[start + 1][columns.index(n)]) for n in SLOW]
+
+
+@pytest.fixture(scope="module")
+def binary(tmp_path_factory) -> Path:
+    """Both csv fixtures, encoded as two logs in one binary file"""
+    path = tmp_path_factory.mktemp("bbl") / "logs.bbl"
+    encoded = []
+    for name in ["short.bbl.csv", "tiny.bbl.csv"]:
+        header, rows, slow = _csv(name)
+        encoded.append(encode_log(rows, slow, header))
+    path.write_bytes(b"".join(encoded))
+    return path
+
+
+@pytest.mark.parametrize("index, name", [(0, "short.bbl.csv"), (1, "tiny.bbl.csv")])
+def test_decode(binary, index, name):
+    """Decoding gives all fields of the csv export, and the same adapted arrays"""
+    _, rows, _ = _csv(name)
+    assert bbl.count_logs(binary) == 2
+    assert np.array_equal(np.concatenate(list(bbl.decode(binary, NAMES, index))), rows)
+    expected = adapt(read_csv(logs / name)).to_numpy()
+    assert np.array_equal(np.concatenate(list(adapted(binary, index))), expected)
+    times = np.arange(0, int(expected[-1, 0]), 997)
+    assert np.array_equal(parse(binary, index).sample(times), parse(logs / name).sample(times))
+
+
+def test_columns(binary):
+    """Other fields as channels, the same from the binary log as from the csv export"""
+    columns = "rcCommand[0-3] motor[0-3] debug[0-1]"
+    binary_source, csv_source = parse(binary, 1, columns), parse(logs / "tiny.bbl.csv", columns=columns)
+    assert binary_source.channels == csv_source.channels == 10
+    times = np.arange(0, 2_000_000, 997)
+    assert np.array_equal(binary_source.sample(times), csv_source.sample(times))
+
+
+def test_betaflight_4_intervals(tmp_path):
+    """The P interval as one number, with a P ratio that must not be taken as the interval"""
+    header, rows, slow = _csv("tiny.bbl.csv")
+    rows = [[2 * i, *row[1:]] for i, row in enumerate(rows[:1000])]
+    path = tmp_path / "log.bbl"
+    path.write_bytes(encode_log(rows, slow, header, BETAFLIGHT_4_INTERVALS))
+    assert np.array_equal(np.concatenate(list(bbl.decode(path, NAMES))), rows)
+
+
+def test_chunks(binary):
+    chunks = list(bbl.decode(binary, COLUMNS, chunk_size=100))
+    assert [len(c) for c in chunks[:-1]] == [100] * (len(chunks) - 1)
+    assert np.array_equal(np.concatenate(chunks), np.concatenate(list(bbl.decode(binary, COLUMNS))))
+
+
+def test_corrupt(binary, tmp_path):
+    """Garbage is skipped, the P frames after it until the next I frame are lost, the rest is decoded"""
+    data = binary.read_bytes()
+    middle = data.index(b"E\xff") // 2
+    damaged = tmp_path / "damaged.bbl"
+    damaged.write_bytes(data[:middle] + b"\xff\x13\xff" + data[middle + 3 :])
+    expected = np.concatenate(list(bbl.decode(binary, NAMES)))
+    actual = np.concatenate(list(bbl.decode(damaged, NAMES)))
+    assert 0 < len(expected) - len(actual) <= 2 * 256 // 16
+    assert set(map(tuple, actual.tolist())) <= set(map(tuple, expected.tolist()))
+
+    with pytest.raises(LinkLabException):
+        list(bbl.decode(binary, ["motor[7]"]))
+    with pytest.raises(LinkLabException):
+        list(bbl.decode(binary, COLUMNS, index=2))
+
+
+def _stream(data: bytes) -> bbl.Stream:
+    return bbl.Stream(data, 0, len(data))
+
+
+def test_encodings():
+    for values in [[0, 1, -2], [7, -8, 3], [31, -32, 0], [127, -40000, 1 << 30]]:
+        assert _stream(tag2_3s32(values)).tag2_3s32() == values
+    for values in [[0, 0, 0, 0], [1, -300, 7, 100], [-8, 0, 32767, -32768], [200, 5, 0, -1]]:
+        assert _stream(tag8_4s16(values)).tag8_4s16() == values
+    assert _stream(tag8_8svb([0, 5, -70000])).tag8_8svb(3) == [0, 5, -70000]
@@ -1,7 +1,10 @@
 from pathlib import Path
 
+import numpy as np
+import pytest
 from pytest import approx
 
+from rclinklab.base import LinkLabException
 from rclinklab.sources.blackbox import parse
 
 actual = {
@@ -21,8 +24,25 @@ no_data = {
 }  # After the log has ended, the source should return 0
 
 
+log_file = Path(__file__).parent / "../blackbox-logs/tiny.bbl.csv"
+
+
 def test_blackbox():
-    log_file = Path(__file__).parent / "../blackbox-logs/tiny.bbl.csv"
     source = parse(log_file)
     for ts, v in (actual | interpolated | no_data).items():
         assert source(ts) == approx(v, abs=1e-5)
+
+
+def test_columns():
+    times = np.arange(0, 2_000_000, 10_000)
+    default = parse(log_file).sample(times)
+    # A throttle-like field is centered at 1500 µs, the sticks at 0, whatever their order
+    source = parse(log_file, columns="rcCommand[3] rcCommand[0-1]")
+    assert source.channels == 3
+    assert np.array_equal(source.sample(times), default[:, [3, 0, 1]])
+    assert np.array_equal(parse(log_file, columns=["rcCommand[2]"]).sample(times), default[:, [2]])
+
+
+def test_missing_column():
+    with pytest.raises(LinkLabException, match="rxRollAux"):
+        parse(log_file, columns="rcCommand[0-3] rxRollAux")
@@ -1,3 +1,5 @@
+import numpy as np
+
 from rclinklab.sources.functions import SineSource
 
 
@@ -9,3 +11,9 @@ def assert_channeldata(data):
 def test_sine():
     s = SineSource(frequency=1, channels=4)
     [assert_channeldata(s(ts)) for ts in range(0, 1_000_000, 100_000)]
+
+
+def test_sine_call_is_sample():
+    s = SineSource(frequency=3, channels=32)
+    times = np.arange(0, 1_000_000, 12_345)
+    assert np.allclose(np.array([s(t) for t in times.tolist()]), s.sample(times), rtol=0, atol=1e-12)
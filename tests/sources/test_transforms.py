@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+from rclinklab import registry
+from rclinklab.base import LinkLabException, SimulatedTime
+from rclinklab.codecs.rice import RiceCodec
+from rclinklab.simulate import Collector, Setup
+from rclinklab.sources.functions import SineSource
+from rclinklab.sources.transforms import (
+    CHUNK,
+    HISTORY,
+    LowPass,
+    Noise,
+    Offset,
+    Quantize,
+    RateLimit,
+    Resample,
+)
+
+sine = SineSource(channels=4, frequency=2)
+transforms = [
+    Offset(sine, delay=1234),
+    Resample(sine, rate=50),
+    Quantize(sine, bits=6),
+    LowPass(sine, cutoff=5),
+    RateLimit(sine, max_rate=5),
+    Noise(sine, std=0.05),
+    Offset(Quantize(Noise(RateLimit(LowPass(sine, cutoff=5), max_rate=5), std=0.01), bits=10), delay=1000),
+]
+
+
+@pytest.mark.parametrize("transform", transforms, ids=lambda t: type(t).__name__)
+def test_independent_of_calls(transform):
+    """The output only depends on the timestamp, not on how the source is sampled"""
+    times = np.random.default_rng(0).integers(0, 3 * CHUNK * 1000, size=2000)
+    expected = transform.start(SimulatedTime()).sample(times)
+    assert expected.shape == (len(times), 4)
+    assert (np.abs(expected) <= 1.0).all()
+    with transform.start(SimulatedTime()) as source:
+        assert np.allclose(source.sample(np.sort(times)), expected[np.argsort(times)])
+        assert np.allclose(source.sample(times[:10]), expected[:10])
+        assert np.allclose(source(int(times[-1])), expected[-1])
+
+
+def test_lowpass():
+    fast = SineSource(channels=1, frequency=50)
+    times = np.arange(500_000, 1_000_000, 100)
+    filtered = LowPass(fast, cutoff=5).sample(times)
+    # A first order filter attenuates 50 Hz to about 5 / 50 at a cutoff of 5 Hz
+    assert np.abs(filtered).max() == pytest.approx(0.1, rel=0.05)
+    with pytest.raises(LinkLabException):
+        LowPass(fast, cutoff=600)
+
+
+def test_rate_limit():
+    times = np.arange(0, 2_000_000, 1000)
+    limited = RateLimit(SineSource(channels=2, frequency=2), max_rate=5).sample(times)
+    assert np.abs(np.diff(limited, axis=0)).max() <= 5 / 1000 + 1e-12
+
+
+def test_quantize_resample_offset():
+    times = np.arange(0, 1_000_000, 37)
+    assert len(np.unique(Quantize(sine, bits=3).sample(times))) <= 8
+    held = Resample(sine, rate=10).sample(times)
+    # The value changes at every 100 ms
+    assert np.count_nonzero(np.diff(held[:, 1])) == 9
+    assert np.array_equal(Offset(sine, delay=1000).sample(times + 1000), sine.sample(times))
+
+
+def test_fingerprint():
+    assert LowPass(sine, cutoff=5).fingerprint() == LowPass(sine, cutoff=5).fingerprint()
+    assert LowPass(sine, cutoff=5).fingerprint() != LowPass(sine, cutoff=6).fingerprint()
+    assert Noise(sine, std=0.1).fingerprint() != Noise(sine, std=0.1, seed=1).fingerprint()
+    assert Noise(sine, std=0.1).fingerprint() != Noise(SineSource(channels=4), std=0.1).fingerprint()
+
+
+def test_registry_and_simulation():
+    source = registry.transforms.create("lowpass:cutoff=5", source=sine)
+    source = registry.transforms.create("noise:std=0.01", source=source)
+    assert source == Noise(LowPass(sine, cutoff=5), std=0.01)
+    collector = Collector()
+    Setup(source, [RiceCodec(channels=4, bits=10)], [collector], duration=200_000).run()
+    packets = collector.packets[0]
+    expected = source.start(SimulatedTime()).sample(np.array([p.tx_ts for p in packets]))
+    assert np.allclose([p.tx_fd for p in packets], expected)
+
+
+class Recording(SineSource):
+    """Remembers the latest timestamp it was asked for, like the now of a realtime source"""
+
+    latest = 0
+
+    def sample(self, times):
+        self.latest = max(self.latest, int(times.max(initial=0)))
+        return super().sample(times)
+
+
+@pytest.mark.parametrize("transform", [LowPass, RateLimit], ids=lambda t: t.__name__)
+def test_not_ahead(transform):
+    """A realtime source is only asked for times up to one grid point after the requested one"""
+    source = Recording(channels=2)
+    filtered = transform(source, 5)
+    for time in [0, 1500, 2000, 70_123]:
+        filtered(time)
+        assert source.latest <= time + 1000
+
+
+def test_bounded_history():
+    filtered = LowPass(sine, cutoff=5)
+    for start in range(0, 4 * HISTORY * 1000, CHUNK * 1000):
+        filtered.sample(np.arange(start, start + CHUNK * 1000, 997))
+    assert len(filtered._grid) <= 2 * (HISTORY + CHUNK)
+    with pytest.raises(LinkLabException, match="can't go back"):
+        filtered(0)
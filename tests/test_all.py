@@ -1,7 +1,10 @@
 from pathlib import Path
 
 from rclinklab.codecs.delta import DeltaCodec
+from rclinklab.codecs.linear_delta import LinearDeltaCodec
+from rclinklab.codecs.quadratic_delta import QuadraticDeltaCodec
 from rclinklab.codecs.raw import RawCodec
+from rclinklab.codecs.rice import RiceCodec
 from rclinklab.graph import graph
 from rclinklab.simulate import Collector, Setup
 from rclinklab.sources.blackbox import parse
@@ -18,7 +21,10 @@ sources = [
 
 codecs = [
     DeltaCodec(channels=channels, bits=10, delta_bits=8),
+    LinearDeltaCodec(channels=channels, bits=10, delta_bits=5),
+    QuadraticDeltaCodec(channels=channels, bits=10, delta_bits=5),
     RawCodec(channels=channels, bits=10),
+    RiceCodec(channels=channels, bits=10),
 ]
 
 
@@ -0,0 +1,79 @@
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from rclinklab.cache import RunCache
+from rclinklab.codecs.raw import RawCodec
+from rclinklab.codecs.rice import RiceCodec
+from rclinklab.columns import to_columns, to_data_frame
+from rclinklab.impairments import Bernoulli
+from rclinklab.schedule import FixedRate
+from rclinklab.simulate import Collector, RollingStatsCollector, Setup
+from rclinklab.sources.blackbox import parse
+from rclinklab.sources.functions import SineSource
+from rclinklab.sources.transforms import Offset, Resample
+from rclinklab.stats import calculate
+
+source = parse(Path(__file__).parent / "blackbox-logs/short.bbl.csv")
+
+
+def _run(setup):
+    collector = Collector()
+    rolling = RollingStatsCollector(time_limit=10_000_000)
+    setup.listeners = [collector, rolling]
+    setup.run()
+    return to_columns(collector.packets[0]), rolling.stats(0)
+
+
+def test_breakdown():
+    codec = RiceCodec(channels=4, bits=10)
+    columns, stats = _run(Setup(source, [codec], duration=500_000, schedule=FixedRate(rate=250, max_payload=64)))
+    assert np.array_equal(columns["slot_wait"] + columns["airtime"], columns["rx_ts"] - columns["tx_ts"])
+    assert (columns["slot_wait"] > 0).any()
+    assert np.array_equal(columns["airtime"], np.rint(columns["ota_data_bits"] * 1e6 / 20_000))
+    # The log has a sample every 2 ms or so
+    assert 0 < columns["input_age"].mean() < 2000
+    assert not columns["decode"].any()
+    # The pandas stats agree with the rolling ones
+    expected = calculate(to_data_frame(columns)).breakdown
+    for name in ["input_age", "slot_wait", "airtime", "decode"]:
+        assert getattr(stats.breakdown, name) == pytest.approx(getattr(expected, name))
+    assert stats.breakdown.end_to_end == pytest.approx(stats.latency.mean + stats.breakdown.input_age)
+
+
+def test_back_to_back():
+    columns, _ = _run(Setup(SineSource(channels=4), [RawCodec(channels=4, bits=10)], duration=200_000))
+    assert not columns["slot_wait"].any()
+    assert not columns["input_age"].any()
+
+
+def test_transform_ages():
+    times = np.arange(0, 1_000_000, 100)
+    assert np.array_equal(Offset(source, delay=5000).ages(times[50:]), source.ages(times[:-50]) + 5000)
+    # Holding the samples at 50 Hz makes them up to 20 ms older
+    ages = Resample(SineSource(channels=4), rate=50).ages(times)
+    assert ages.max() == 19_900
+    assert ages.min() == 0
+
+
+def test_measured_decode(tmp_path):
+    cache = RunCache(tmp_path)
+    setup = Setup(source, [RiceCodec(channels=4, bits=10)], duration=200_000, cache=cache, measure_decode=True)
+    columns, stats = _run(setup)
+    assert stats.breakdown.decode > 0
+    assert cache.key(setup) is None
+
+
+class SlowChannel(Bernoulli):
+    def apply(self, *args, **kwargs):
+        time.sleep(0.002)
+        return super().apply(*args, **kwargs)
+
+
+def test_decode_excludes_impairment():
+    """Only the receiver is timed, not the impairment model"""
+    codecs = [RawCodec(channels=4, bits=10)]
+    columns, _ = _run(Setup(source, codecs, duration=50_000, impairment=SlowChannel(0.1), measure_decode=True))
+    assert len(columns["decode"]) and columns["decode"].max() < 2000
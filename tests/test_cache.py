@@ -0,0 +1,73 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from rclinklab.cache import RunCache
+from rclinklab.codecs.delta import DeltaCodec
+from rclinklab.codecs.rice import RiceCodec
+from rclinklab.columns import to_columns, to_data_frame
+from rclinklab.simulate import Collector, Setup, Simulator
+from rclinklab.sources.blackbox import parse
+from rclinklab.sources.functions import SineSource
+from rclinklab.utils import attrs_to_data_frame
+
+
+def _run(cache, source, codecs):
+    collector = Collector()
+    result = Setup(source=source, codecs=codecs, listeners=[collector], duration=200_000, cache=cache).run()
+    return result, {i: to_columns(p) for i, p in collector.packets.items()}
+
+
+def _assert_columns_equal(a, b):
+    assert a.keys() == b.keys()
+    for k in a:
+        assert np.array_equal(a[k], b[k])
+
+
+def test_cache(tmp_path, mocker):
+    cache = RunCache(tmp_path)
+    source = parse(Path(__file__).parent / "blackbox-logs/short.bbl.csv")
+    first, first_packets = _run(cache, source, [DeltaCodec(channels=4, bits=10, delta_bits=5)])
+
+    simulate = mocker.spy(Simulator, "simulate")
+    codec = DeltaCodec(channels=4, bits=10, delta_bits=5)
+    second, second_packets = _run(cache, source, [codec])
+    assert simulate.call_count == 0
+    for codec_id, columns in first_packets.items():
+        _assert_columns_equal(columns, second_packets[codec_id])
+        _assert_columns_equal(columns, second.codec_columns(codec_id))
+    assert second.stats[0].latency == first.stats[0].latency
+    # The codec state is restored, so the codec can be used for a following run
+    assert np.array_equal(codec.rx_state.history, first.codecs[0].rx_state.history)
+    _run(cache, source, [codec])
+    assert simulate.call_count == 1
+
+    # Changing anything in the setup is a different run
+    _run(cache, SineSource(frequency=1, channels=4), [DeltaCodec(channels=4, bits=10, delta_bits=5)])
+    _run(cache, source, [RiceCodec(channels=4, bits=10)])
+    assert simulate.call_count == 3
+
+
+def test_cache_eviction(tmp_path):
+    cache = RunCache(tmp_path)
+    for frequency in range(3):
+        _run(cache, SineSource(frequency=frequency, channels=2), [RiceCodec(channels=2, bits=10)])
+    files = sorted(tmp_path.glob("*.run"), key=lambda f: f.stat().st_mtime)
+    assert len(files) == 3
+    cache.max_size = sum(f.stat().st_size for f in files[1:])
+    cache.evict()
+    assert sorted(tmp_path.glob("*.run")) == sorted(files[1:])
+
+
+def test_columns_data_frame():
+    collector = Collector()
+    setup = Setup(
+        source=SineSource(frequency=1, channels=2),
+        codecs=[RiceCodec(channels=2, bits=10)],
+        listeners=[collector],
+        duration=50_000,
+    )
+    setup.run()
+    packets = collector.packets[0]
+    pd.testing.assert_frame_equal(attrs_to_data_frame(packets), to_data_frame(to_columns(packets)))
@@ -0,0 +1,105 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from rclinklab.base import LinkLabException
+from rclinklab.checkpoint import Checkpoint
+from rclinklab.codecs.delta import DeltaCodec
+from rclinklab.codecs.raw import RawCodec
+from rclinklab.codecs.rice import RiceCodec
+from rclinklab.columns import to_columns
+from rclinklab.impairments import Bernoulli
+from rclinklab.simulate import Collector, Link, Setup
+from rclinklab.smoothing import PT1
+from rclinklab.sources.functions import SineSource
+from rclinklab.sources.transforms import LowPass, Noise
+from rclinklab.spill import SpillingCollector
+
+
+class Crash(Exception):
+    pass
+
+
+def _setup(tmp_path, checkpoint=None, resume=False):
+    source = Noise(LowPass(SineSource(channels=4, frequency=3), cutoff=20), std=0.02)
+    return Setup(
+        source,
+        [DeltaCodec(channels=4, bits=10, delta_bits=5), RawCodec(channels=4, bits=9)],
+        [Collector(), SpillingCollector(tmp_path / "spill", time_limit=100_000, chunk_size=500, resume=resume)],
+        duration=2_000_000,
+        impairment=Bernoulli(0.05),
+        smoothing=PT1(cutoff=50),
+        checkpoint=checkpoint,
+    )
+
+
+def _columns(setup):
+    collector, spilling = setup.listeners
+    history = spilling.history()
+    return [to_columns(collector.packets[i]) for i in range(2)] + [history.columns(i) for i in range(2)]
+
+
+def test_resume(tmp_path, monkeypatch):
+    uninterrupted = _setup(tmp_path / "a")
+    uninterrupted.run()
+    expected = _columns(uninterrupted)
+
+    checkpoint = Checkpoint(tmp_path / "run.snapshot", every=300_000)
+    step = Link.step
+    steps = 0
+
+    def crashing(self):
+        nonlocal steps
+        steps += 1
+        if steps == 1500:
+            raise Crash()
+        return step(self)
+
+    with monkeypatch.context() as m:
+        m.setattr(Link, "step", crashing)
+        with pytest.raises(Crash):
+            _setup(tmp_path / "b", checkpoint).run()
+    assert checkpoint.path.exists()
+
+    # A new process would start with new objects
+    resumed = _setup(tmp_path / "b", Checkpoint(tmp_path / "run.snapshot", every=300_000), resume=True)
+    resumed.run()
+    assert not checkpoint.path.exists()
+    for e, a in zip(expected, _columns(resumed)):
+        assert e.keys() == a.keys()
+        for name in e:
+            assert np.array_equal(e[name], a[name]), name
+    assert resumed.codecs == uninterrupted.codecs
+    assert np.array_equal(resumed.codecs[0].rx_state.history, uninterrupted.codecs[0].rx_state.history)
+
+
+def test_other_run(tmp_path):
+    checkpoint = Checkpoint(tmp_path / "run.snapshot", every=100_000)
+    setup = _setup(tmp_path, checkpoint)
+    link = Link(setup, setup.source.start(setup.time_service))
+    checkpoint.resume(link)
+    checkpoint.write(link)
+    setup.duration = 1_000_000
+    with pytest.raises(LinkLabException, match="another run"):
+        setup.run()
+    with pytest.raises(LinkLabException, match="deterministic"):
+        Setup(SineSource(channels=4), [RiceCodec(channels=4, bits=10)], duration=None, checkpoint=checkpoint).run()
+
+
+def test_spilling_needs_resume(tmp_path):
+    setup = _setup(tmp_path)
+    link = Link(setup, setup.source.start(setup.time_service))
+    for _ in range(1000):
+        link.step()
+    state = pickle.loads(pickle.dumps(link.snapshot()))
+    # A new collector without resume removed the chunks of the run it would continue
+    fresh = _setup(tmp_path)
+    with pytest.raises(LinkLabException, match="resume=True"):
+        Link(fresh, fresh.source.start(fresh.time_service)).restore(state)
+    resumed = _setup(tmp_path, resume=True)
+    spilling = resumed.listeners[1]
+    executor = spilling._executor
+    Link(resumed, resumed.source.start(resumed.time_service)).restore(state)
+    assert spilling._executor is executor
+    assert spilling.chunks == setup.listeners[1].chunks
@@ -0,0 +1,65 @@
+import copy
+from functools import partial
+
+import numpy as np
+import pytest
+
+from rclinklab.codecs.delta import DeltaCodec
+from rclinklab.codecs.groups import round_robin
+from rclinklab.codecs.linear_delta import LinearDeltaCodec
+from rclinklab.codecs.quadratic_delta import QuadraticDeltaCodec
+from rclinklab.codecs.raw import RawCodec
+from rclinklab.codecs.rice import RiceCodec
+from rclinklab.testing import Budget, Throughput, check, conformance, inputs, throughput
+
+lossless = [RawCodec, RiceCodec]
+# With 8 delta bits, the delta codecs cross the whole range of 12 bits within the 100 packets of a step
+lossy = [
+    partial(DeltaCodec, delta_bits=8),
+    partial(LinearDeltaCodec, delta_bits=8),
+    partial(QuadraticDeltaCodec, delta_bits=8),
+    round_robin,
+]
+
+
+@pytest.mark.parametrize("factory", lossless)
+def test_lossless(factory):
+    conformance(factory, lossless=True)
+
+
+@pytest.mark.parametrize("factory", lossy)
+def test_lossy(factory):
+    conformance(factory, lossless=False)
+
+
+def test_drifting():
+    # With 2 delta bits the codec never catches up with the ramp
+    codec = DeltaCodec(channels=4, bits=12, delta_bits=2)
+    ramp = np.array([codec.quantize(row) for row in inputs(4)["ramp"]])
+    check(copy.deepcopy(codec), ramp, lossless=False)
+    with pytest.raises(AssertionError, match="off by"):
+        check(codec, ramp, lossless=False, tracking=0.05)
+
+
+def test_broken_batch():
+    class Broken(RawCodec):
+        def transmit_batch(self, data):
+            return super().transmit_batch(data)[::-1]
+
+    with pytest.raises(AssertionError, match="transmit_batch differs"):
+        conformance(Broken)
+
+
+@pytest.mark.parametrize("factory", [*lossless, *lossy])
+def test_throughput(factory):
+    # Far below what any of them does, so that this only fails if a codec becomes a lot slower
+    Budget(packets_per_second=1000, bytes_per_packet=10_000).check(throughput(factory))
+
+
+def test_budget():
+    result = Throughput(transmit=100.0, receive=1e6, transmit_batch=1e6, receive_batch=1e6, memory=50.0)
+    Budget(packets_per_second=100, bytes_per_packet=50).check(result)
+    with pytest.raises(AssertionError, match="slower"):
+        Budget(packets_per_second=101).check(result)
+    with pytest.raises(AssertionError, match="bytes"):
+        Budget(bytes_per_packet=49).check(result)
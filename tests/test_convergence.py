@@ -0,0 +1,80 @@
+import math
+
+import numpy as np
+import pytest
+
+from rclinklab.base import LinkLabException
+from rclinklab.cache import RunCache
+from rclinklab.codecs.raw import RawCodec
+from rclinklab.codecs.rice import RiceCodec
+from rclinklab.convergence import BatchMeans, Convergence
+from rclinklab.optimize import Candidate, Optimizer
+from rclinklab.simulate import Collector, Setup
+from rclinklab.sources.functions import SineSource
+
+
+def test_batch_means():
+    values = np.random.default_rng(0).normal(size=64 * 20)
+    batch_means = BatchMeans(batch_size=64)
+    assert math.isinf(batch_means.half_width())
+    completed = [batch_means.add(v) for v in values.tolist()]
+    assert sum(completed) == 20
+    means = values.reshape(20, 64).mean(axis=1)
+    assert batch_means.mean == pytest.approx(means.mean())
+    assert batch_means.half_width() == pytest.approx(1.959964 * means.std(ddof=1) / math.sqrt(20))
+
+
+def _run(convergence, duration=5_000_000, cache=None):
+    collector = Collector()
+    Setup(
+        source=SineSource(channels=4),
+        codecs=[RiceCodec(channels=4, bits=10)],
+        listeners=[collector],
+        duration=duration,
+        cache=cache,
+        convergence=convergence,
+    ).run()
+    return collector.packets[0]
+
+
+def test_early_stop():
+    convergence = Convergence(rtol=0.05, min_duration=200_000)
+    packets = _run(convergence)
+    assert convergence.converged
+    assert 200_000 <= convergence.effective_duration < 5_000_000
+    assert packets[-1].rx_ts == convergence.effective_duration
+    # Never stops before min_duration, and a tolerance that can't be met runs for the whole duration
+    assert _run(Convergence(rtol=0.05, min_duration=1_000_000))[-1].rx_ts >= 1_000_000
+    convergence = Convergence(rtol=0.0)
+    _run(convergence, duration=500_000)
+    assert not convergence.converged
+    with pytest.raises(LinkLabException):
+        Convergence(metrics=["jitter"])
+
+
+def test_reused():
+    convergence = Convergence(rtol=0.05, min_duration=200_000)
+    first = _run(convergence)
+    assert len(_run(convergence)) == len(first)
+    assert convergence.effective_duration == first[-1].rx_ts
+
+
+def test_cached(tmp_path):
+    cache = RunCache(tmp_path)
+    first = Convergence(rtol=0.05, min_duration=200_000)
+    packets = _run(first, cache=cache)
+    second = Convergence(rtol=0.05, min_duration=200_000)
+    assert len(_run(second, cache=cache)) == len(packets)
+    assert second.effective_duration == first.effective_duration
+    # Another tolerance is another run
+    assert len(list(tmp_path.glob("*.run"))) == 1
+    _run(Convergence(rtol=0.1, min_duration=200_000), cache=cache)
+    assert len(list(tmp_path.glob("*.run"))) == 2
+
+
+def test_optimizer():
+    candidate = Candidate(RawCodec, (("bits", 8),))
+    evaluation = Optimizer(SineSource(channels=4), rtol=0.05).evaluate(candidate, 3_000_000)
+    assert evaluation.effective_duration < evaluation.duration
+    evaluation = Optimizer(SineSource(channels=4)).evaluate(candidate, 300_000)
+    assert evaluation.effective_duration == evaluation.duration
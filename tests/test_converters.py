@@ -0,0 +1,26 @@
+import numpy as np
+
+from rclinklab.converters import f2i, f2i_s, farray, i2f, i2f_s, iarray, quantizer
+
+
+def test_i2f_s_identical():
+    for bits in [1, 4, 8, 10, 16, 17, 24]:
+        values = iarray(range(2**bits))[:: max(1, 2 ** (bits - 10))]
+        expected = farray(i2f(v, bits) for v in values.tolist())
+        assert np.array_equal(i2f_s(values, bits), expected)
+
+
+def test_f2i_s_identical():
+    rng = np.random.default_rng(0)
+    for bits in [1, 4, 8, 10, 16, 17, 24]:
+        # Include values that quantize to exactly x.5 to check rounding
+        halves = (np.arange(2 ** min(bits, 10)) + 0.5) / (2**bits - 1) * 2 - 1
+        values = np.concatenate([rng.uniform(-1.0, 1.0, 1000), halves, [-1.0, 0.0, 1.0]])
+        expected = iarray(f2i(v, bits) for v in values.tolist())
+        assert np.array_equal(f2i_s(values, bits), expected)
+
+
+def test_quantizer_shared():
+    assert quantizer(10) is quantizer(10)
+    assert quantizer(10).table is not None
+    assert quantizer(24).table is None
@@ -0,0 +1,82 @@
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from rclinklab import corpus
+from rclinklab.cache import RunCache
+from rclinklab.codecs.raw import RawCodec
+from rclinklab.codecs.rice import RiceCodec
+from rclinklab.corpus import Log, find_logs, load, pooled, run
+from rclinklab.sources.bbl import LOG_START
+
+codecs = [RawCodec(channels=4, bits=8), RiceCodec(channels=4, bits=10)]
+
+
+@pytest.fixture
+def directory(tmp_path) -> Path:
+    logs = Path(__file__).parent / "blackbox-logs"
+    shutil.copy(logs / "tiny.bbl.csv", tmp_path)
+    (tmp_path / "more").mkdir()
+    shutil.copy(logs / "short.bbl.csv", tmp_path / "more")
+    (tmp_path / "notes.txt").write_text("not a log")
+    return tmp_path
+
+
+def test_corpus(directory, tmp_path_factory):
+    logs = find_logs(directory)
+    assert [log.name(directory) for log in logs] == ["more/short.bbl.csv", "tiny.bbl.csv"]
+
+    serial = list(run(logs, codecs, duration=500_000, workers=1))
+    assert [r.log for r in serial] == logs
+    assert [r.flight_time for r in serial] == [500_000, 500_000]
+    assert list(run(logs, codecs, duration=500_000, workers=2)) == serial
+
+    cache = RunCache(tmp_path_factory.mktemp("cache") / "runs")
+    assert list(run(logs, codecs, duration=500_000, cache=cache, workers=1)) == serial
+    assert len(list((cache.path.parent / "logs").glob("*.npy"))) == 2
+    assert list(run(logs, codecs, duration=500_000, cache=cache, workers=1)) == serial
+
+
+def test_log_cache(directory, tmp_path, monkeypatch):
+    log = Log(directory / "tiny.bbl.csv")
+    data = load(log, tmp_path)
+    (cached,) = tmp_path.glob("*.npy")
+    np.save(cached, data[:1])
+    assert len(load(log, tmp_path)) == 1
+    # Logs cached by another version of the decoder are read again
+    monkeypatch.setattr(corpus, "LOG_VERSION", corpus.LOG_VERSION + 1)
+    assert np.array_equal(load(log, tmp_path), data)
+
+
+def test_pooled(directory):
+    short, tiny = run(find_logs(directory), codecs, workers=1)
+    assert short.flight_time > tiny.flight_time
+    raw, rice = pooled([short, tiny])
+    weight = short.flight_time / (short.flight_time + tiny.flight_time)
+    assert rice.error == pytest.approx(weight * short.codecs[1].error + (1 - weight) * tiny.codecs[1].error)
+    assert raw.packets == short.codecs[0].packets + tiny.codecs[0].packets
+    assert rice.max_latency == max(short.codecs[1].max_latency, tiny.codecs[1].max_latency)
+    assert raw.latency == pytest.approx(1600)
+    assert str(Log(directory / "log.bbl", 2)).endswith("log.bbl#2")
+
+
+def test_bad_logs(directory):
+    """Empty files are skipped, logs that can't be read fail without stopping the others"""
+    (directory / "empty.bbl").touch()
+    (directory / "old.bbl").write_bytes(LOG_START + b"H Data version:1\nH Field I name:loopIteration,time\n")
+    (directory / "flight.gps.csv").write_text('"Product","x"\n"time","lat","lon"\n1,2,3\n')
+    logs = find_logs(directory)
+    assert [log.name(directory) for log in logs] == [
+        "flight.gps.csv",
+        "more/short.bbl.csv",
+        "old.bbl#0",
+        "tiny.bbl.csv",
+    ]
+    for workers in [1, 2]:
+        gps, short, old, tiny = run(logs, codecs, duration=500_000, workers=workers)
+        assert gps.failed and "rcCommand" in gps.error
+        assert old.failed and "version 1" in old.error
+        assert not short.failed and not tiny.failed
+        assert pooled([gps, short, old, tiny]) == pooled([short, tiny])
@@ -1,24 +1,29 @@
+import numpy as np
 import pytest
 
 from rclinklab.codecs.delta import DeltaCodec
+from rclinklab.codecs.linear_delta import LinearDeltaCodec
+from rclinklab.codecs.quadratic_delta import QuadraticDeltaCodec
 from rclinklab.converters import iarray
 
-# TODO convert to generalized codec-tester
+delta_codecs = [DeltaCodec, LinearDeltaCodec, QuadraticDeltaCodec]
 
 
 def _send_and_receive(data, codec):
     return codec.receive(codec.transmit(data))
 
 
-def test_delta():
-    codec = DeltaCodec(bits=10, channels=1, delta_bits=6)
+@pytest.mark.parametrize("codec_class", delta_codecs)
+def test_delta(codec_class):
+    codec = codec_class(bits=10, channels=1, delta_bits=6)
     for value in [0, 10, 20, 0]:
         data = iarray([value])
         assert data == _send_and_receive(data, codec)
 
 
-def test_delta_overflow_converges():
-    codec = DeltaCodec(bits=8, channels=1, delta_bits=3)
+@pytest.mark.parametrize("codec_class", delta_codecs)
+def test_delta_overflow_converges(codec_class):
+    codec = codec_class(bits=8, channels=1, delta_bits=3)
     _send_and_receive(iarray([0]), codec)
     data = iarray([100])
     packets = 50
@@ -26,3 +31,26 @@ def test_delta_overflow_converges():
         if data == _send_and_receive(data, codec):
             return
     pytest.fail(f"Did not converge within {packets} packets")
+
+
+@pytest.mark.parametrize("codec_class", delta_codecs)
+def test_delta_batch(codec_class):
+    rng = np.random.default_rng(0)
+    ramp = np.clip(np.cumsum(rng.integers(-5, 6, size=(2000, 3)), axis=0) + 500, 0, 1023)
+    for data in [rng.integers(0, 1024, size=(200, 3)), ramp]:
+        single = codec_class(bits=10, channels=3, delta_bits=5)
+        batch = codec_class(bits=10, channels=3, delta_bits=5)
+        packets = [single.transmit(row) for row in data]
+        assert packets == batch.transmit_batch(data)
+        assert np.array_equal(np.array([single.receive(p) for p in packets]), batch.receive_batch(packets))
+
+
+def test_prediction_needs_fewer_bits():
+    """Following a ramp, the predictive codecs should be exact where plain delta coding has to saturate."""
+    data = iarray(range(0, 1000, 20)).reshape(-1, 1)
+    errors = {}
+    for codec_class in delta_codecs:
+        codec = codec_class(bits=10, channels=1, delta_bits=4)
+        errors[codec_class] = np.abs(codec.receive_batch(codec.transmit_batch(data)) - data)[10:].max()
+    assert errors[DeltaCodec] > 0
+    assert errors[LinearDeltaCodec] == errors[QuadraticDeltaCodec] == 0
@@ -0,0 +1,72 @@
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pytest
+
+from rclinklab import feed
+from rclinklab.base import LinkLabException
+from rclinklab.codecs.raw import RawCodec
+from rclinklab.feed import FeedReader, FeedWriter
+from rclinklab.simulate import Collector, Setup
+from rclinklab.sources.functions import SineSource
+
+channels = 4
+
+
+def _read(name, queue):
+    with FeedReader(name) as reader:
+        reader.position = 0
+        records = reader.read()
+        queue.put((records["rx_ts"].tolist(), records["rx_fd"].tolist(), reader.lost))
+
+
+def test_feed():
+    collector = Collector()
+    with FeedWriter(channels) as writer:
+        setup = Setup(SineSource(channels), [RawCodec(channels, bits=8)], [writer, collector], duration=100_000)
+        setup.run()
+        # Read from another process
+        context = multiprocessing.get_context("spawn")
+        queue = context.Queue()
+        process = context.Process(target=_read, args=(writer.name, queue))
+        process.start()
+        rx_ts, rx_fd, lost = queue.get(timeout=30)
+        process.join()
+    packets = collector.packets[0]
+    assert lost == 0
+    assert rx_ts == [p.rx_ts for p in packets]
+    assert np.array_equal(rx_fd, [p.rx_fd for p in packets])
+
+
+def test_lost():
+    setup = Setup(SineSource(channels), [RawCodec(channels, bits=8)], duration=100_000)
+    with FeedWriter(channels, capacity=16) as writer, FeedReader(writer.name) as reader:
+        setup.listeners = [writer]
+        setup.run()
+        records = reader.read()
+        assert len(records) == 16
+        assert reader.lost == writer.written - 16
+        assert records["seq"].tolist() == list(range(writer.written - 15, writer.written + 1))
+        assert len(reader.read()) == 0
+
+
+def test_not_a_feed(monkeypatch):
+    closed = []
+
+    class Tracked(SharedMemory):
+        def close(self):
+            closed.append(self.name)
+            super().close()
+
+    monkeypatch.setattr(feed, "SharedMemory", Tracked)
+    other = SharedMemory(create=True, size=4096)
+    try:
+        # The traceback keeps the reader alive, so it wasn't closed by garbage collection
+        with pytest.raises(LinkLabException, match="not a version") as error:
+            FeedReader(other.name)
+        assert closed == [other.name]
+        del error
+    finally:
+        other.close()
+        other.unlink()
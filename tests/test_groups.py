@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from rclinklab import registry
+from rclinklab.base import LinkLabException
+from rclinklab.codecs.groups import Group, GroupCodec, round_robin
+from rclinklab.codecs.raw import RawCodec
+from rclinklab.impairments import Bernoulli, monte_carlo
+from rclinklab.simulate import Collector, Setup
+from rclinklab.sources.functions import SineSource
+from rclinklab.stats import calculate, group_stats
+from rclinklab.utils import attrs_to_data_frame
+
+groups = [Group(4, 10), Group(2, 1, period=2), Group(3, 4, period=3, phase=1)]
+
+
+def _data(codec, packets=50):
+    rng = np.random.default_rng(0)
+    return codec.quantize(rng.uniform(-1, 1, size=(packets, codec.channels)))
+
+
+def test_round_trip():
+    codec = GroupCodec(groups)
+    assert (codec.channels, codec.slots, codec.header_bits) == (9, 6, 3)
+    data = _data(codec)
+    last = np.zeros(codec.channels, dtype=np.int_)
+    for i, row in enumerate(data):
+        packet = codec.transmit(row)
+        carried = codec.included(i % 6)
+        assert len(packet) == 3 + 40 + 2 * carried[1] + 12 * carried[2]
+        received = codec.receive(packet)
+        for group, (a, b), included in zip(groups, codec.bounds, carried):
+            expected = row[a:b] if included else last[a:b]
+            assert np.array_equal(received[a:b], expected)
+        last = received
+
+
+def test_batch():
+    single, batch = GroupCodec(groups), GroupCodec(groups)
+    data = _data(single, 100)
+    packets = [single.transmit(row) for row in data]
+    assert batch.transmit_batch(data[:37]) + batch.transmit_batch(data[37:]) == packets
+    # Lost packets, the receiver follows the slots from the headers
+    kept = [p for i, p in enumerate(packets) if i % 7 != 3]
+    expected = np.array([single.receive(p) for p in kept])
+    assert np.array_equal(np.vstack([batch.receive_batch(kept[:20]), batch.receive_batch(kept[20:])]), expected)
+
+
+def test_quantize_per_group():
+    codec = GroupCodec([Group(1, 10), Group(1, 1)])
+    assert codec.quantize(np.array([1.0, 1.0])).tolist() == [1023, 1]
+    assert codec.dequantize(np.array([0, 1])).tolist() == [-1.0, 1.0]
+    # The channels are on the last axis, also for an array of packets
+    codec = GroupCodec(groups)
+    data = _data(codec, 6)
+    assert np.array_equal(codec.dequantize(data), np.array([codec.dequantize(row) for row in data]))
+    with pytest.raises(LinkLabException):
+        codec.receive(codec.transmit(data[0])[:-2])
+    with pytest.raises(LinkLabException):
+        Group(2, 2, period=2, phase=2)
+
+
+def test_round_robin():
+    assert round_robin(4) == GroupCodec([Group(4, 10)])
+    codec = registry.codecs.create("round_robin:aux_period=3", channels=12)
+    assert [(g.channels, g.period, g.phase) for g in codec.groups] == [(4, 1, 0), (3, 3, 0), (3, 3, 1), (2, 3, 2)]
+
+
+def test_simulation():
+    """The aux channels only take a few bits, so the sticks get through faster than with all channels raw"""
+    source = SineSource(channels=12, frequency=1)
+    codecs = [RawCodec(channels=12, bits=10), round_robin(12, aux_period=4)]
+    collector = Collector()
+    Setup(source, codecs, [collector], duration=1_000_000).run()
+    raw, grouped = (attrs_to_data_frame(collector.packets[i]) for i in range(2))
+    sticks, *aux = group_stats(grouped, codecs[1])
+    assert sticks.latency.mean < calculate(raw).latency.mean / 2
+    assert sticks.staleness == sticks.latency
+    packet_interval = np.diff(grouped["rx_ts", "rx_ts"]).mean()
+    for stats in aux:
+        # Held for the four packets of the round, up to three of them after the one that carried it
+        assert stats.staleness.mean == pytest.approx(sticks.latency.mean + 1.5 * packet_interval, rel=0.1)
+        assert stats.fd_error.mean > sticks.fd_error.mean
+
+
+def test_monte_carlo():
+    codec = round_robin(8)
+    perfect = monte_carlo(Setup(SineSource(channels=8), [codec], duration=200_000), Bernoulli(0.0), seeds=2)[0]
+    assert all(s.lost == s.corrupted == 0 for s in perfect)
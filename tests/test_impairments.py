@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from rclinklab.codecs.delta import DeltaCodec
+from rclinklab.codecs.raw import RawCodec
+from rclinklab.codecs.rice import RiceCodec
+from rclinklab.impairments import (
+    Bernoulli,
+    BitErrors,
+    Bursts,
+    Combined,
+    GilbertElliott,
+    monte_carlo,
+)
+from rclinklab.simulate import Collector, Setup
+from rclinklab.sources.functions import SineSource
+
+channels = 4
+lengths = np.full(100_000, 40)
+
+
+def test_bernoulli():
+    fate = Bernoulli(0.1).apply(np.random.default_rng(0), lengths, seeds=3)
+    assert fate.lost.shape == (3, len(lengths))
+    assert fate.lost.mean() == pytest.approx(0.1, abs=0.005)
+
+
+def test_gilbert_elliott():
+    model = GilbertElliott(to_bad=0.01, to_good=0.2)
+    rng = np.random.default_rng(0)
+    # In two batches, the state carries over
+    lost = np.hstack([model.apply(rng, lengths[:1000], 20).lost, model.apply(rng, lengths, 20).lost])
+    assert lost.mean() == pytest.approx(0.01 / 0.21, rel=0.1)
+    # Lengths of the runs of lost packets, which are the bad states
+    edges = np.diff(np.pad(lost, ((0, 0), (1, 1))).astype(int), axis=1)
+    bursts = np.flatnonzero(edges.ravel() == -1) - np.flatnonzero(edges.ravel() == 1)
+    assert bursts.mean() == pytest.approx(1 / 0.2, rel=0.1)
+
+
+def test_bit_errors():
+    rng = np.random.default_rng(0)
+    fate = BitErrors(1e-3, crc=True).apply(rng, lengths, 2)
+    assert fate.lost.mean() == pytest.approx(1 - (1 - 1e-3) ** 40, rel=0.1)
+    fate = BitErrors(1e-3, crc=False).apply(rng, lengths, 2)
+    assert not fate.lost.any()
+    seeds, packets, bits = fate.flips
+    assert len(bits) == pytest.approx(2 * 40 * len(lengths) * 1e-3, rel=0.1)
+    assert (bits < 40).all() and set(seeds.tolist()) == {0, 1}
+
+
+def test_bursts():
+    fate = Bursts(0.01, length=8, crc=False).apply(np.random.default_rng(0), lengths, 1)
+    _, packets, bits = fate.flips
+    for p in np.unique(packets):
+        assert bits[packets == p].max() - bits[packets == p].min() < 8
+
+
+def setup(codec):
+    return Setup(SineSource(channels, frequency=5), [codec], duration=1_000_000)
+
+
+def test_monte_carlo():
+    impairment = Combined([GilbertElliott(to_bad=0.02, to_good=0.3), BitErrors(1e-3, crc=False)])
+    codecs = [
+        lambda: RawCodec(channels, bits=10),
+        lambda: DeltaCodec(channels, bits=10, delta_bits=5),
+        lambda: RiceCodec(channels, bits=10),
+    ]
+    for codec in codecs:
+        stats = monte_carlo(setup(codec()), impairment, seeds=8, seed=1)[0]
+        assert stats == monte_carlo(setup(codec()), impairment, seeds=8, seed=1)[0]
+        assert len(stats) == 8
+        assert all(s.lost > 0 and s.max_age > s.mean_age for s in stats)
+        perfect = monte_carlo(setup(codec()), Bernoulli(0.0), seeds=1)[0][0]
+        assert perfect.lost == perfect.corrupted == 0
+        assert np.mean([s.mean_error for s in stats]) > perfect.mean_error
+
+
+def test_setup_impairment():
+    collector = Collector()
+    codec = DeltaCodec(channels, bits=10, delta_bits=5)
+    Setup(SineSource(channels), [codec], [collector], duration=1_000_000, impairment=Bernoulli(0.2), seed=3).run()
+    received = len(collector.packets[0])
+    perfect = Collector()
+    Setup(SineSource(channels), [DeltaCodec(channels, bits=10, delta_bits=5)], [perfect], duration=1_000_000).run()
+    assert received == pytest.approx(0.8 * len(perfect.packets[0]), rel=0.1)
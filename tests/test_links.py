@@ -0,0 +1,67 @@
+import time
+
+import numpy as np
+import pytest
+
+from rclinklab import links
+from rclinklab.base import LinkLabException, SimulatedTime
+from rclinklab.codecs.delta import DeltaCodec
+from rclinklab.codecs.raw import RawCodec
+from rclinklab.simulate import Collector, LinkPacket, Setup
+from rclinklab.sources.functions import SineSource
+
+channels = 4
+
+
+def setups(source, duration):
+    return [
+        Setup(source, [RawCodec(channels, bits=10)], [Collector()], bitrate=20_000, duration=duration),
+        Setup(source, [DeltaCodec(channels, bits=10, delta_bits=5)], [Collector()], bitrate=5_000, duration=duration),
+    ]
+
+
+def packets(setup) -> list[LinkPacket]:
+    return list(setup.listeners[0].packets[0])
+
+
+def test_same_as_simulator():
+    source = SineSource(channels=channels, frequency=2)
+    expected = setups(source, 200_000)
+    for setup in expected:
+        setup.run()
+    actual = setups(source, 200_000)
+    links.simulate(actual, SimulatedTime())
+    for e, a in zip(expected, actual):
+        assert [p.rx_ts for p in packets(e)] == [p.rx_ts for p in packets(a)]
+        assert np.array_equal([p.rx_id for p in packets(e)], [p.rx_id for p in packets(a)])
+
+
+class AsyncCollector(links.AsyncPacketListener):
+    def __init__(self):
+        self.received: list[tuple[int, float]] = []
+        self.start = time.monotonic()
+
+    async def add(self, codec_id, packet):
+        self.received.append((packet.rx_ts, time.monotonic() - self.start))
+
+
+def test_realtime():
+    listener = AsyncCollector()
+    realtime = setups(SineSource(channels=channels), 100_000)
+    realtime[1].listeners.append(listener)
+    links.simulate(realtime)
+    assert packets(realtime[0])[-1].rx_ts >= 100_000
+    assert packets(realtime[1])[-1].rx_ts >= 100_000
+    # Packets are not delivered before their time, with the 50 ms margin for input events
+    for rx_ts, elapsed in listener.received:
+        assert elapsed >= (rx_ts - 50_000) / 1_000_000 - 0.005
+
+
+class FailingSource(SineSource):
+    async def read_async(self):
+        raise LinkLabException("Input events where dropped from kernel buffer")
+
+
+def test_source_error():
+    with pytest.raises(LinkLabException):
+        links.simulate(setups(FailingSource(channels=channels), None))
@@ -0,0 +1,35 @@
+from rclinklab.codecs.delta import DeltaCodec
+from rclinklab.codecs.raw import RawCodec
+from rclinklab.optimize import (
+    Candidate,
+    Evaluation,
+    Optimizer,
+    grid,
+    pareto_front,
+    pareto_ranks,
+)
+from rclinklab.sources.functions import SineSource
+
+
+def _evaluation(latency, error):
+    return Evaluation(Candidate(RawCodec, (("bits", 8),)), duration=0, latency=latency, error=error)
+
+
+def test_pareto():
+    evaluations = [_evaluation(1, 5), _evaluation(2, 2), _evaluation(3, 3), _evaluation(5, 1), _evaluation(5, 2)]
+    assert pareto_ranks(evaluations) == [0, 0, 1, 0, 1]
+    assert pareto_front(evaluations) == [evaluations[0], evaluations[1], evaluations[3]]
+
+
+def test_optimizer():
+    optimizer = Optimizer(SineSource(frequency=1, channels=2), min_duration=50_000, max_duration=200_000, eta=2)
+    assert optimizer.durations() == [50_000, 100_000, 200_000]
+    candidates = grid(RawCodec, bits=[6, 8, 10]) + grid(DeltaCodec, bits=[10], delta_bits=[3, 6])
+    front = optimizer.search(candidates)
+    assert front
+    assert all(e.duration == 200_000 for e in front)
+    evaluated = len(optimizer.memo)
+    assert evaluated == 5 + 3 + 2
+    # Repeating the search is only lookups
+    assert optimizer.search(candidates) == front
+    assert len(optimizer.memo) == evaluated
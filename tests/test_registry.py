@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from rclinklab import registry
+from rclinklab.base import LinkLabException
+from rclinklab.codecs.delta import DeltaCodec
+from rclinklab.sources.functions import SineSource
+
+
+def test_create():
+    codec = registry.codecs.create("delta:bits=10,delta_bits=5", channels=4)
+    assert codec == DeltaCodec(channels=4, bits=10, delta_bits=5)
+    # Arguments in the spec override the defaults
+    assert registry.sources.create("sine:channels=2", channels=4) == SineSource(channels=2)
+
+
+def test_defaults_only_if_accepted():
+    path = Path(__file__).parent / "blackbox-logs/short.bbl.csv"
+    source = registry.sources.create(f"blackbox:path={path}", channels=8)
+    assert source.channels == 4
+
+
+@pytest.mark.parametrize("spec", ["delta:bits", "delta:bits=10,=3", "unknown", "delta:bits=10"])
+def test_invalid_spec(spec):
+    with pytest.raises(LinkLabException):
+        registry.codecs.create(spec, channels=4)
+
+
+def test_missing_dependency():
+    entries = registry.Registry("rclinklab.test", {"missing": "rclinklab_not_installed:Codec"})
+    with pytest.raises(LinkLabException, match="needs rclinklab_not_installed"):
+        entries.load("missing")
+
+
+def test_lazy_imports():
+    code = "import sys, rclinklab.cli; print(*(m for m in ('pandas', 'scipy', 'evdev', 'psutil') if m in sys.modules))"
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, env=env)
+    assert result.stdout.strip() == ""
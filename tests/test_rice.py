@@ -0,0 +1,51 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from rclinklab.base import LinkLabException
+from rclinklab.codecs.raw import RawCodec
+from rclinklab.codecs.rice import RiceCodec
+from rclinklab.simulate import Collector, Setup
+from rclinklab.sources.blackbox import parse
+from rclinklab.stats import calculate
+from rclinklab.utils import attrs_to_data_frame
+
+
+@pytest.mark.parametrize("bits", [1, 4, 10, 16])
+def test_rice_lossless(bits):
+    rng = np.random.default_rng(0)
+    noise = rng.integers(0, 2**bits, size=(300, 4))
+    walk = np.clip(np.cumsum(rng.integers(-3, 4, size=(1000, 4)), axis=0) + 2 ** (bits - 1), 0, 2**bits - 1)
+    steps = np.repeat(rng.integers(0, 2**bits, size=(20, 4)), 30, axis=0)
+    for data in [noise, walk, steps]:
+        codec = RiceCodec(channels=4, bits=bits)
+        for row in data:
+            assert np.array_equal(row, codec.receive(codec.transmit(row)))
+
+
+def test_rice_small_changes_are_short():
+    codec = RiceCodec(channels=4, bits=10)
+    data = np.full(4, 512)
+    codec.receive(codec.transmit(data))
+    for _ in range(100):
+        packet = codec.transmit(data)
+        codec.receive(packet)
+    assert len(packet) == 4
+
+
+def test_rice_truncated():
+    codec = RiceCodec(channels=4, bits=10)
+    packet = codec.transmit(np.array([1000, 3, 500, 7]))
+    with pytest.raises(LinkLabException):
+        codec.receive(packet[:-3])
+
+
+def test_rice_latency():
+    source = parse(Path(__file__).parent / "blackbox-logs/short.bbl.csv")
+    codecs = [RawCodec(channels=4, bits=10), RiceCodec(channels=4, bits=10)]
+    collector = Collector()
+    Setup(source=source, codecs=codecs, listeners=[collector], duration=1_000_000).run()
+    raw, rice = (calculate(attrs_to_data_frame(collector.packets[i])) for i in range(2))
+    assert rice.latency.mean < raw.latency.mean / 2
+    assert rice.fd_error.max == raw.fd_error.max
@@ -0,0 +1,60 @@
+"""Wide channel sets, like the 16 channels of CRSF, should not cost much more per packet than the 4 sticks.
+
+The timing benchmark depends on the machine, so it only runs with pytest -m benchmark.
+"""
+
+import time
+
+import pytest
+
+from rclinklab.codecs.delta import DeltaCodec
+from rclinklab.codecs.raw import RawCodec
+from rclinklab.codecs.rice import RiceCodec
+from rclinklab.simulate import PacketListener, Setup
+from rclinklab.sources.functions import SineSource
+from rclinklab.view import View
+
+
+class Counter(PacketListener):
+    def __init__(self):
+        self.packets = 0
+
+    def add(self, codec_id, packet):
+        self.packets += 1
+
+
+def cost(factory, channels, packets=300, repeat=3):
+    """The least µs per packet of a simulation, which has the least noise from the machine"""
+    times = []
+    for _ in range(repeat):
+        counter = Counter()
+        # Long enough for about the same number of packets whatever the packet size, at 50 µs per bit
+        duration = packets * (channels * 10 + 32) * 50
+        setup = Setup(SineSource(channels=channels), [factory(channels)], [counter], duration=duration)
+        start = time.perf_counter()
+        setup.run()
+        times.append((time.perf_counter() - start) / counter.packets * 1e6)
+    return min(times)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize(
+    "factory",
+    [
+        lambda channels: RawCodec(channels=channels, bits=10),
+        lambda channels: DeltaCodec(channels=channels, bits=10, delta_bits=5),
+        lambda channels: RiceCodec(channels=channels, bits=10),
+    ],
+)
+def test_sublinear(factory):
+    """8 times the channels at less than twice the cost per packet"""
+    narrow, wide = cost(factory, 4), cost(factory, 32)
+    assert wide < 2 * narrow, f"{narrow:.1f} µs per packet with 4 channels, {wide:.1f} µs with 32"
+
+
+@pytest.mark.parametrize("channels, compact", [(4, False), (8, False), (16, True), (32, True)])
+def test_compact_view(channels, compact):
+    source = SineSource(channels=channels)
+    view = View(Setup(source, [RawCodec(channels=channels, bits=10)], []))
+    assert view.compact == compact
+    view.update_channels(source(300_000))
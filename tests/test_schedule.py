@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from rclinklab.base import LinkLabException
+from rclinklab.codecs.raw import RawCodec
+from rclinklab.codecs.rice import RiceCodec
+from rclinklab.schedule import BackToBack, FixedRate, RateWithDeadline, Schedule
+from rclinklab.simulate import Collector, Setup
+from rclinklab.sources.functions import SineSource
+from rclinklab.timeline import Timeline
+
+channels = 4
+schedules = [BackToBack(), FixedRate(rate=500, max_payload=32), FixedRate(rate=333, max_payload=48)]
+schedules += [RateWithDeadline(rate=500, deadline=500), RateWithDeadline(rate=1000, deadline=0)]
+
+
+@pytest.mark.parametrize("schedule", schedules)
+def test_times(schedule):
+    """The batch path gives the same result as the scalar path"""
+    lengths = np.random.default_rng(0).integers(1, 100, size=1000)
+    starts, ends = schedule.times(lengths, bitrate=20_000)
+    expected_starts, expected_ends = Schedule.times(schedule, lengths, bitrate=20_000)
+    assert np.array_equal(starts, expected_starts)
+    assert np.array_equal(ends, expected_ends)
+    assert (starts[1:] >= ends[:-1]).all()
+
+
+def test_fixed_rate():
+    schedule = FixedRate(rate=500, max_payload=32)
+    starts, ends = schedule.times(np.array([10, 32, 70, 5]), bitrate=20_000)
+    # 40 bits per slot, the 70 bit packet uses three slots
+    assert starts.tolist() == [0, 40, 80, 200]
+    assert ends.tolist() == [32, 72, 192, 232]
+    with pytest.raises(LinkLabException):
+        FixedRate(rate=1000, max_payload=32).check(bitrate=20_000)
+
+
+def test_rate_with_deadline():
+    lengths = np.array([50, 10, 10])
+    # 40 bits per slot, the second packet is 10 bits late
+    assert RateWithDeadline(rate=500, deadline=500).times(lengths, 20_000)[0].tolist() == [0, 50, 80]
+    assert RateWithDeadline(rate=500, deadline=0).times(lengths, 20_000)[0].tolist() == [0, 80, 120]
+
+
+def run(schedule, codec):
+    collector = Collector()
+    Setup(SineSource(channels), [codec], [collector], duration=500_000, schedule=schedule).run()
+    return list(collector.packets[0])
+
+
+def test_simulation():
+    packets = run(FixedRate(rate=250, max_payload=64), RawCodec(channels, bits=10))
+    assert {p.rx_ts - p.tx_ts for p in packets} == {3200}
+    assert set(np.diff([p.tx_ts for p in packets]).tolist()) == {4000}
+    # Padding to the frame size adds latency compared to back to back
+    back_to_back = run(BackToBack(), RawCodec(channels, bits=10))
+    assert np.mean([p.rx_ts - p.tx_ts for p in back_to_back]) == 2000
+    # Variable length packets are late at most the deadline
+    packets = run(RateWithDeadline(rate=2000, deadline=100), RiceCodec(channels, bits=10))
+    assert all((p.tx_ts % 500 <= 100) for p in packets)
+
+
+@pytest.mark.parametrize(
+    "schedule, duration",
+    [(FixedRate(rate=333, max_payload=40), 501_000), (RateWithDeadline(rate=290, deadline=0), 503_300)],
+)
+def test_timeline_slots(schedule, duration):
+    """A slot can start after the end of the timeline, no packet is sent there"""
+    packets = []
+    for source in SineSource(channels), Timeline.create(SineSource(channels), 20_000, duration):
+        collector = Collector()
+        Setup(source, [RawCodec(channels, bits=10)], [collector], duration=duration, schedule=schedule).run()
+        packets.append([p.tx_ts for p in collector.packets[0]])
+    assert packets[0] == packets[1]
+    assert packets[1][-1] <= duration
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from scipy.signal import freqz
+
+from rclinklab.cache import RunCache
+from rclinklab.codecs.raw import RawCodec
+from rclinklab.columns import to_columns
+from rclinklab.impairments import Bernoulli, monte_carlo
+from rclinklab.optimize import Candidate, Optimizer
+from rclinklab.simulate import Collector, Setup
+from rclinklab.smoothing import PT1, PT2, PT3, FeedForward, effective
+from rclinklab.sources.functions import SineSource
+
+filters = [PT1(cutoff=30), PT2(cutoff=30), PT3(cutoff=30, rate=2000), FeedForward(cutoff=30, lead=5000)]
+
+
+@pytest.mark.parametrize("smoothing", filters, ids=repr)
+def test_step_equals_apply(smoothing):
+    """Smoothing packet by packet gives the same as smoothing the whole stream"""
+    rng = np.random.default_rng(0)
+    # Several packets between loop iterations, and iterations without packets
+    rx_ts = np.cumsum(rng.integers(100, 3000, size=500))
+    rx_fd = rng.uniform(-1, 1, size=(500, 3))
+    smoother = smoothing.start(channels=3)
+    stepped = np.array([smoother.step(ts, fd) for ts, fd in zip(rx_ts.tolist(), rx_fd)])
+    assert np.allclose(stepped, smoothing.apply(rx_ts, rx_fd))
+
+
+@pytest.mark.parametrize("smoothing", filters[:3], ids=repr)
+def test_cutoff(smoothing):
+    b, a = smoothing.coefficients()
+    _, response = freqz(b, a, worN=[0, 30], fs=smoothing.rate)
+    assert abs(response[0]) == pytest.approx(1.0)
+    # The gain formula is only exact for cutoffs far below the loop rate, like in Betaflight
+    assert abs(response[1]) == pytest.approx(1 / np.sqrt(2), rel=0.1)
+
+
+def test_effective_latency():
+    tx_ts = np.arange(0, 2_000_000, 2000)
+    tx_fd = np.sin(2 * np.pi * 2 * tx_ts[:, np.newaxis] / 1e6 + np.arange(4) * 0.5 * np.pi)
+    result = effective(tx_ts, tx_fd, tx_ts + 7300, tx_fd)
+    # Holding the received values between packets adds half the packet interval
+    assert result.latency == pytest.approx(7300 + 1000, abs=200)
+    assert result.aligned_error < result.error / 10
+
+
+def _effective(smoothing, bits=6):
+    collector = Collector()
+    source = SineSource(channels=4, frequency=2)
+    Setup(source, [RawCodec(channels=4, bits=bits)], [collector], duration=2_000_000, smoothing=smoothing).run()
+    columns = to_columns(collector.packets[0])
+    return effective(columns["tx_ts"], columns["tx_fd"], columns["rx_ts"], columns["rx_fd"])
+
+
+def test_simulation():
+    none, pt2, feed_forward = (
+        _effective(None),
+        _effective(PT2(cutoff=30)),
+        _effective(FeedForward(cutoff=30, lead=4000)),
+    )
+    # Smoothing adds delay, the feed forward wins part of it back
+    assert pt2.latency - none.latency > 5000
+    assert none.latency < feed_forward.latency < pt2.latency - 3000
+
+
+def test_cache_and_monte_carlo(tmp_path):
+    cache = RunCache(tmp_path)
+    for smoothing in [None, PT1(cutoff=30), PT1(cutoff=20)]:
+        Setup(
+            SineSource(channels=2), [RawCodec(channels=2, bits=8)], duration=100_000, cache=cache, smoothing=smoothing
+        ).run()
+    assert len(list(tmp_path.glob("*.run"))) == 3
+
+    setup = Setup(SineSource(channels=2), [RawCodec(channels=2, bits=8)], duration=200_000, smoothing=PT1(cutoff=30))
+    smoothed = monte_carlo(setup, Bernoulli(0.1), seeds=3)[0]
+    setup.smoothing = None
+    raw = monte_carlo(setup, Bernoulli(0.1), seeds=3)[0]
+    assert [s.lost for s in smoothed] == [s.lost for s in raw]
+    assert [s.mean_error for s in smoothed] != [s.mean_error for s in raw]
+
+
+def test_optimizer():
+    candidate = Candidate(RawCodec, (("bits", 6),))
+    plain = Optimizer(SineSource(channels=4, frequency=2)).evaluate(candidate, 1_000_000)
+    smoothed = Optimizer(SineSource(channels=4, frequency=2), smoothing=PT2(cutoff=30)).evaluate(candidate, 1_000_000)
+    assert smoothed.latency > plain.latency + 5000
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from rclinklab.base import LinkLabException
+from rclinklab.codecs.delta import DeltaCodec
+from rclinklab.codecs.raw import RawCodec
+from rclinklab.columns import select, to_columns
+from rclinklab.simulate import Collector, Setup
+from rclinklab.sources.functions import SineSource
+from rclinklab.spill import History, SpillingCollector
+
+channels = 4
+
+
+def run(collector):
+    codecs = [RawCodec(channels, bits=10), DeltaCodec(channels, bits=10, delta_bits=5)]
+    Setup(SineSource(channels, frequency=3), codecs, [collector], duration=500_000).run()
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_history(tmp_path, compress):
+    expected = Collector()
+    run(expected)
+    collector = SpillingCollector(tmp_path / "run", time_limit=10_000, chunk_size=100, compress=compress)
+    run(collector)
+    collector.close()
+    history = collector.history()
+    assert len(history) == sum(len(p) for p in expected.packets.values())
+    assert len(collector.chunks) == -(-len(history) // 100)
+    # Only the latest packets are kept in memory
+    assert all(p[-1].rx_ts - p[0].rx_ts < 10_000 for p in collector.packets.values())
+    for codec_id, packets in expected.packets.items():
+        columns = history.columns(codec_id)
+        for name, values in select(to_columns(packets, [codec_id] * len(packets)), codec_id).items():
+            assert np.array_equal(columns[name], values), name
+        assert np.array_equal(history.column("rx_ts", codec_id), [p.rx_ts for p in packets])
+    reopened = History.open(tmp_path / "run")
+    assert reopened.lengths == history.lengths
+    # A range across chunks
+    packets = reopened.packets(150, 420)
+    assert [p.rx_ts for _, p in packets] == history.column("rx_ts")[150:420].tolist()
+    assert packets[0][1].ota_data == history.packets(150, 151)[0][1].ota_data
+    for codec_id, expected_packets in expected.packets.items():
+        ota_data = [p.ota_data for c, p in reopened.packets(0, len(reopened)) if c == codec_id]
+        assert ota_data == [p.ota_data for p in expected_packets]
+
+
+def test_lazy_column(tmp_path):
+    collector = SpillingCollector(tmp_path / "run", chunk_size=100, compress=False)
+    run(collector)
+    collector.close()
+    history = History.open(tmp_path / "run")
+    column = history.column("rx_ts")
+    expected = np.asarray(column)
+    assert len(column) == len(expected) and history.chunk.cache_info().currsize == 4
+    history.chunk.cache_clear()
+    # Only the chunks with the indexed values are loaded
+    assert np.array_equal(column[250:260], expected[250:260])
+    assert column[-1] == expected[-1] and column[5] == expected[5]
+    assert history.chunk.cache_info().misses == 3
+    assert np.array_equal(column[::7], expected[::7])
+    assert np.array_equal(column[np.array([420, 3])], expected[[420, 3]])
+    assert np.array_equal(np.concatenate(list(column.parts())), expected)
+    selected = history.column("tx_fd", 1)
+    assert np.array_equal(selected[10:20], np.asarray(selected)[10:20])
+    with pytest.raises(IndexError):
+        column[len(column)]
+
+
+def test_only_removes_chunks(tmp_path):
+    SpillingCollector(tmp_path / "run", chunk_size=100).close()
+    (tmp_path / "run" / "000000.npz").touch()
+    SpillingCollector(tmp_path / "run", chunk_size=100).close()
+    assert not any((tmp_path / "run").iterdir())
+    (tmp_path / "results.csv").touch()
+    with pytest.raises(LinkLabException, match="results.csv"):
+        SpillingCollector(tmp_path)
+    assert (tmp_path / "results.csv").exists()
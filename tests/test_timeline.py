@@ -0,0 +1,53 @@
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from rclinklab.base import LinkLabException
+from rclinklab.codecs.rice import RiceCodec
+from rclinklab.columns import to_columns
+from rclinklab.simulate import Collector, Setup, bits_to_ts
+from rclinklab.sources.blackbox import parse
+from rclinklab.timeline import Timeline
+
+source = parse(Path(__file__).parent / "blackbox-logs/tiny.bbl.csv")
+
+
+def _run(s):
+    collector = Collector()
+    Setup(source=s, codecs=[RiceCodec(channels=4, bits=10)], listeners=[collector], duration=500_000).run()
+    return to_columns(collector.packets[0])
+
+
+def test_timeline(tmp_path):
+    timeline = Timeline.create(source, bitrate=30_000, duration=500_000, path=tmp_path / "timeline.npy")
+    for position in [0, 1, 7, 1000, 15_000]:
+        ts = bits_to_ts(position, 30_000)
+        assert np.array_equal(timeline(ts), source(ts))
+        assert np.array_equal(timeline.at(position), source(ts))
+    assert timeline(499_990) == pytest.approx(source(499_990))
+    with pytest.raises(LinkLabException):
+        timeline(600_000)
+
+    # Pickling only sends the path
+    copy = pickle.loads(pickle.dumps(timeline))
+    assert isinstance(copy.data, np.memmap)
+    assert copy.channels == 4
+    assert copy.fingerprint() == timeline.fingerprint()
+
+
+def test_timeline_run():
+    expected = _run(source)
+    actual = _run(Timeline.create(source, bitrate=20_000, duration=500_000))
+    for name, column in expected.items():
+        assert np.array_equal(column, actual[name])
+
+
+def test_timeline_ages(tmp_path):
+    """The input ages of a blackbox log survive the timeline, also through the file"""
+    assert _run(source)["input_age"].any()
+    timeline = Timeline.create(source, bitrate=20_000, duration=500_000, path=tmp_path / "timeline.npy")
+    assert np.array_equal(_run(source)["input_age"], _run(pickle.loads(pickle.dumps(timeline)))["input_age"])
+    times = np.arange(0, 500_000, 7)
+    assert np.array_equal(timeline.ages(times), source.ages(times))
@@ -0,0 +1,40 @@
+import pytest
+
+from rclinklab.base import LinkLabException
+from rclinklab.codecs.delta import DeltaCodec
+from rclinklab.codecs.rice import RiceCodec
+from rclinklab.sources.functions import SineSource
+from rclinklab.transport import TRANSPORTS, measure
+
+channels = 4
+
+
+@pytest.mark.parametrize("transport", TRANSPORTS)
+def test_transports(transport):
+    codec = DeltaCodec(channels, bits=10, delta_bits=5)
+    result = measure(SineSource(channels, frequency=2), codec, transport, duration=200_000, paced=False)
+    assert result.packets > 0
+    assert result.lost == 0
+    assert result.mismatches == 0
+    assert result.measured_latency > 0
+    assert result.modeled_latency == 1000  # 20 bits at 20 kbit/s
+
+
+def test_unix_cleanup(tmp_path, monkeypatch):
+    # The receiver process is spawned, so it creates the socket in this temporary directory
+    monkeypatch.setenv("TMPDIR", str(tmp_path))
+    result = measure(SineSource(channels), RiceCodec(channels, bits=10), "unix", duration=50_000, paced=False)
+    assert result.lost == 0
+    assert not list(tmp_path.iterdir())
+
+
+def test_paced():
+    result = measure(SineSource(channels), RiceCodec(channels, bits=10), "udp", duration=100_000)
+    assert result.lost == result.mismatches == 0
+    # Paced at the modeled transmit times, so it takes at least the duration
+    assert result.throughput <= result.packets / 0.09
+
+
+def test_unknown_transport():
+    with pytest.raises(LinkLabException):
+        measure(SineSource(channels), RiceCodec(channels, bits=10), "carrier pigeon")